@@ -0,0 +1,140 @@
+"""
+Load tests the read-only API views against their async versions (served under /api/async/) on a running instance of
+Corpora, reporting requests per second and latency percentiles for each.
+
+Each endpoint is hit by a number of concurrent clients, first at its usual URL and then at its /api/async/ URL, for
+the same number of requests. When authenticating with a token, the token's scholar must have the IP the requests
+come from (as seen by nginx in X-Real-IP) registered, just as for any other API request.
+
+Run from the app directory:
+
+    python -m benchmarks.api_load --base-url http://nginx --corpus 5f623f2a52023c009d73108e --content-type Document \\
+        --content-id 5f623f2a52023c009d73108f --suggest-query joh --pattern "Document->Person" --concurrency 50
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import aiohttp
+
+
+def get_endpoints(args):
+    ct_path = "corpus/{0}/{1}/".format(args.corpus, args.content_type)
+    endpoints = {
+        'search': (ct_path, {'q': args.search_query}),
+        'last_updated': (ct_path + 'last-updated/', {}),
+    }
+    if args.content_id:
+        endpoints['content'] = ("{0}{1}/".format(ct_path, args.content_id), {})
+        endpoints['network_json'] = ("{0}{1}/network-json/".format(ct_path, args.content_id), {})
+    if args.suggest_query:
+        endpoints['suggest'] = (ct_path + 'suggest/', {'q': args.suggest_query})
+    if args.pattern:
+        endpoints['pattern_count'] = (ct_path + 'pattern-count/', {'pattern': args.pattern})
+
+    if args.endpoint:
+        endpoints = {name: endpoint for name, endpoint in endpoints.items() if name in args.endpoint}
+    return endpoints
+
+
+async def run_load(url, params, headers, num_requests, concurrency):
+    latencies = []
+    errors = 0
+    remaining = [num_requests]
+
+    async def client(session):
+        nonlocal errors
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                async with session.get(url, params=params, headers=headers) as resp:
+                    await resp.read()
+                    if resp.status != 200:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*[client(session) for client_index in range(0, concurrency)])
+        elapsed = time.perf_counter() - started
+
+    return summarize(latencies, errors, elapsed)
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'requests_per_sec': round(len(latencies) / elapsed, 2),
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'p50_ms': round(latencies[int(len(latencies) * 0.5)], 3),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 3),
+    }
+
+
+async def run_suite(args):
+    results = {}
+    headers = {}
+    if args.token:
+        headers['Authorization'] = "Token {0}".format(args.token)
+
+    for name, (path, params) in get_endpoints(args).items():
+        results[name] = {}
+        for variant, api_path in [('sync', 'api/'), ('async', 'api/async/')]:
+            url = "{0}/{1}{2}".format(args.base_url.rstrip('/'), api_path, path)
+
+            # warm up caches and connection pools before measuring
+            await run_load(url, params, headers, args.concurrency, args.concurrency)
+            results[name][variant] = await run_load(url, params, headers, args.requests, args.concurrency)
+
+            print("{0} ({1}): {2} req/s, p99 {3} ms, {4} errors".format(
+                name,
+                variant,
+                results[name][variant]['requests_per_sec'],
+                results[name][variant]['p99_ms'],
+                results[name][variant]['errors']
+            ))
+
+        if results[name]['sync']['requests_per_sec']:
+            results[name]['async_speedup'] = round(
+                results[name]['async']['requests_per_sec'] / results[name]['sync']['requests_per_sec'], 2
+            )
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare throughput and tail latency of the sync and async read-only API views.")
+    parser.add_argument('--base-url', default='http://nginx', help="Base URL of the Corpora instance.")
+    parser.add_argument('--token', default=None, help="API token to authenticate with. Omit to test an open access corpus anonymously.")
+    parser.add_argument('--corpus', required=True, help="ID of the corpus to query.")
+    parser.add_argument('--content-type', required=True, help="Name of the content type to query.")
+    parser.add_argument('--content-id', default=None, help="ID of content to retrieve and build a network for.")
+    parser.add_argument('--search-query', default='*', help="General query for the search endpoint.")
+    parser.add_argument('--suggest-query', default=None, help="Prefix for the suggest endpoint.")
+    parser.add_argument('--pattern', default=None, help="Graph pattern for the pattern-count endpoint.")
+    parser.add_argument('--endpoint', action='append', default=[], help="Only test this endpoint. Can be given more than once.")
+    parser.add_argument('--requests', type=int, default=1000, help="Number of requests to make to each endpoint.")
+    parser.add_argument('--concurrency', type=int, default=50, help="Number of concurrent clients.")
+    parser.add_argument('--output', default=None, help="Path to write the results to as JSON.")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run_suite(args))
+    print(json.dumps(results, indent=4))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as results_out:
+            json.dump(results, results_out, indent=4)
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,93 @@
+"""
+Compares the cost of serializing and compressing an API response: the standard library's json module against
+manager.serialization.dumps (orjson, when it's installed), and gzip against brotli (when it's installed).
+
+The response is a synthetic page of search results shaped like the content API's, with ObjectIds, datetimes, and
+cross-reference fields in each record.
+
+Run from the app directory:
+
+    python -m benchmarks.api_serialization --records 1000 --repeat 20
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+
+def build_page(num_records, rng):
+    start = datetime(1850, 1, 1)
+    records = []
+    for record_index in range(0, num_records):
+        record_id = ObjectId()
+        records.append({
+            'id': str(record_id),
+            '_id': record_id,
+            'uri': "/corpus/{0}/Document/{1}".format(ObjectId(), record_id),
+            'label': "Document {0}".format(record_index),
+            'title': " ".join(rng.choice(['letter', 'to', 'from', 'the', 'editor', 'regarding', 'matters', 'of', 'state']) for word in range(0, 12)),
+            'published': start + timedelta(days=rng.randrange(0, 36500)),
+            'last_updated': datetime.now(),
+            'pages': rng.randrange(1, 400),
+            'author': [
+                {
+                    'id': str(ObjectId()),
+                    'label': "Person {0}".format(rng.randrange(0, 5000)),
+                    'uri': "/corpus/x/Person/{0}".format(ObjectId())
+                } for author in range(0, rng.randrange(1, 4))
+            ],
+        })
+
+    return {
+        'meta': {'content_type': 'Document', 'total': num_records * 10, 'page': 1, 'page_size': num_records, 'num_pages': 10},
+        'records': records
+    }
+
+
+def stdlib_dumps(obj):
+    return json.dumps(obj, default=str).encode('utf-8')
+
+
+def time_calls(func, repeat):
+    timings = []
+    result = None
+    for iteration in range(0, repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, {
+        'mean_ms': round(statistics.mean(timings), 3),
+        'min_ms': round(min(timings), 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark API response serialization and compression.")
+    parser.add_argument('--records', type=int, default=1000, help="Number of records in the page of results.")
+    parser.add_argument('--repeat', type=int, default=20, help="Number of times each step is timed.")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    from manager import serialization
+
+    page = build_page(args.records, random.Random(args.seed))
+    results = {'orjson': serialization.orjson is not None, 'brotli': serialization.brotli is not None}
+
+    body, results['stdlib_json'] = time_calls(lambda: stdlib_dumps(page), args.repeat)
+    body, results['dumps'] = time_calls(lambda: serialization.dumps(page), args.repeat)
+    results['body_bytes'] = len(body)
+
+    for encoding in ['gzip', 'br'] if serialization.brotli else ['gzip']:
+        compressed, results[encoding] = time_calls(lambda: serialization.compress(body, encoding), args.repeat)
+        results[encoding]['bytes'] = len(compressed)
+
+    print(json.dumps(results, indent=4))
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,71 @@
+"""
+Compares two benchmark result files written by benchmarks.run and flags regressions.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+
+Exits with a non-zero status if any measurement in the candidate is worse than the baseline by more than the threshold
+percentage (for wall time and allocations) or makes more queries per operation.
+"""
+import sys
+import json
+import argparse
+
+
+def load_measurements(path):
+    with open(path, 'r', encoding='utf-8') as results_in:
+        results = json.load(results_in)
+    return {measurement['name']: measurement for measurement in results['benchmarks']}
+
+
+def percent_change(old, new):
+    if not old:
+        return 0.0 if not new else 100.0
+    return ((new - old) / old) * 100
+
+
+def compare(baseline, candidate, threshold):
+    regressions = []
+    rows = []
+
+    for name, new in candidate.items():
+        old = baseline.get(name)
+        if not old:
+            rows.append("{0:<28} (new)".format(name))
+            continue
+
+        time_change = percent_change(old['wall_time_per_operation_ms'], new['wall_time_per_operation_ms'])
+        alloc_change = percent_change(old['alloc_peak_bytes'], new['alloc_peak_bytes'])
+        rows.append("{0:<28} time {1:>+8.1f}%   peak alloc {2:>+8.1f}%".format(name, time_change, alloc_change))
+
+        if time_change > threshold:
+            regressions.append("{0}: wall time per operation up {1:.1f}%".format(name, time_change))
+        if alloc_change > threshold:
+            regressions.append("{0}: peak allocations up {1:.1f}%".format(name, alloc_change))
+
+        for service, queries in new['queries_per_operation'].items():
+            old_queries = old['queries_per_operation'].get(service, 0)
+            if queries > old_queries:
+                regressions.append("{0}: {1} queries per operation up from {2} to {3}".format(name, service, old_queries, queries))
+
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0, help="Allowed percent increase in time and allocations.")
+    args = parser.parse_args(argv)
+
+    rows, regressions = compare(load_measurements(args.baseline), load_measurements(args.candidate), args.threshold)
+    print("\n".join(rows))
+
+    if regressions:
+        print("\nREGRESSIONS:")
+        print("\n".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
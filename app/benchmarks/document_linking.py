@@ -0,0 +1,63 @@
+"""
+Reports the number of Neo4J calls made per imported page when linking a document's pages and page files.
+
+Run from the app directory with: python -m benchmarks.document_linking [num_pages] [files_per_page]
+"""
+import sys
+import json
+from benchmarks import harness
+
+
+def build_pages(num_pages, files_per_page):
+    from corpus import File
+    from plugins.document.content import Page
+
+    pages = []
+    for page_num in range(0, num_pages):
+        ref_no = str(page_num + 1)
+        page = Page(ref_no=ref_no)
+        for file_num in range(0, files_per_page):
+            file = File(
+                path="/corpora/benchmark/files/document/pages/{0}/page_{0}_{1}.png".format(ref_no, file_num),
+                description="PNG Image",
+                extension="png"
+            )
+            page.files[file.key] = file
+        pages.append(page)
+    return pages
+
+
+def link_per_page(pages, doc_uri):
+    from corpus import run_neo
+
+    # mirrors the previous behavior: one MERGE for each page and another for each of its files
+    for page in pages:
+        page_uri = "{0}/page/{1}".format(doc_uri, page.ref_no)
+        run_neo('MERGE (p:_Page { uri: $page_uri })', {'page_uri': page_uri})
+        for file_key, file in page.files.items():
+            file._do_linking(content_type='_Page', content_uri=page_uri)
+
+
+def link_batched(pages, doc_uri):
+    from plugins.document.content import PageLinker
+
+    linker = PageLinker('Document', doc_uri)
+    for page in pages:
+        linker.add_page(page)
+    linker.flush()
+
+
+if __name__ == '__main__':
+    harness.setup()
+
+    num_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    files_per_page = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    doc_uri = "/corpus/000000000000000000000000/Document/000000000000000000000001"
+    pages = build_pages(num_pages, files_per_page)
+
+    print(json.dumps({
+        'num_pages': num_pages,
+        'files_per_page': files_per_page,
+        'per_page': harness.measure('link_per_page', lambda: link_per_page(pages, doc_uri), num_pages),
+        'batched': harness.measure('link_batched', lambda: link_batched(pages, doc_uri), num_pages),
+    }, indent=4))
@@ -0,0 +1,120 @@
+"""
+Generators for synthetic corpora used by the benchmarks.
+
+A synthetic corpus has three content types: Person, Place, and Work. Each Work cross-references a number of People
+(set by xref_density) and a single Place, which exercises the cross-reference handling in labeling, indexing,
+linking, and export.
+"""
+import random
+from corpus import Corpus
+
+
+PERSON_SCHEMA = {
+    'name': 'Person',
+    'plural_name': 'People',
+    'fields': [
+        {'name': 'name', 'type': 'keyword', 'label': 'Name'},
+        {'name': 'birth_year', 'type': 'number', 'label': 'Birth Year'},
+    ],
+    'templates': {
+        'Label': {'template': '{{ Person.name }}', 'mime_type': 'text/html'}
+    }
+}
+
+PLACE_SCHEMA = {
+    'name': 'Place',
+    'plural_name': 'Places',
+    'fields': [
+        {'name': 'name', 'type': 'keyword', 'label': 'Name'},
+        {'name': 'region', 'type': 'keyword', 'label': 'Region'},
+    ],
+    'templates': {
+        'Label': {'template': '{{ Place.name }}', 'mime_type': 'text/html'}
+    }
+}
+
+WORK_SCHEMA = {
+    'name': 'Work',
+    'plural_name': 'Works',
+    'fields': [
+        {'name': 'title', 'type': 'text', 'label': 'Title'},
+        {'name': 'year', 'type': 'number', 'label': 'Year'},
+        {'name': 'genre', 'type': 'keyword', 'label': 'Genre'},
+        {'name': 'summary', 'type': 'large_text', 'label': 'Summary', 'in_lists': False},
+        {'name': 'authors', 'type': 'cross_reference', 'cross_reference_type': 'Person', 'multiple': True, 'label': 'Authors'},
+        {'name': 'place', 'type': 'cross_reference', 'cross_reference_type': 'Place', 'label': 'Place of Publication'},
+    ],
+    'templates': {
+        'Label': {'template': '{{ Work.title }} ({{ Work.year }})', 'mime_type': 'text/html'}
+    }
+}
+
+GENRES = ['Novel', 'Poetry', 'Drama', 'Essay', 'Letter', 'Sermon', 'Treatise', 'Chronicle']
+WORDS = [
+    'amber', 'bright', 'cloud', 'distant', 'ember', 'falcon', 'garden', 'harbor', 'iron', 'jasmine', 'kingdom',
+    'lantern', 'meadow', 'night', 'orchard', 'pilgrim', 'quiet', 'river', 'silver', 'tempest', 'umber', 'valley',
+    'winter', 'yarrow', 'zephyr'
+]
+
+
+def make_phrase(rng, num_words):
+    return ' '.join(rng.choice(WORDS) for word in range(0, num_words)).capitalize()
+
+
+def create_corpus(name='Benchmark Corpus'):
+    corpus = Corpus()
+    corpus.name = name
+    corpus.description = "Synthetic corpus for benchmarking"
+    corpus.save()
+
+    for schema in [PERSON_SCHEMA, PLACE_SCHEMA, WORK_SCHEMA]:
+        corpus.save_content_type(schema)
+
+    return corpus
+
+
+def make_work_bundle(rng, person_ids, place_ids, xref_density):
+    """
+    Build a content bundle for a Work, in the form submitted by the edit content form.
+    """
+
+    num_authors = min(len(person_ids), max(0, int(rng.gauss(xref_density, xref_density / 2.0) + 0.5)))
+    return {
+        'title': {'value': make_phrase(rng, 4)},
+        'year': {'value': rng.randint(1500, 1900)},
+        'genre': {'value': rng.choice(GENRES)},
+        'summary': {'value': make_phrase(rng, 60)},
+        'authors': [{'value': person_id} for person_id in rng.sample(person_ids, num_authors)],
+        'place': {'value': rng.choice(place_ids)},
+    }
+
+
+def populate_people_and_places(corpus, size, seed=0):
+    rng = random.Random(seed)
+    person_ids = []
+    place_ids = []
+
+    for person_index in range(0, max(1, size // 2)):
+        person = corpus.get_content('Person')
+        person.name = "{0} {1}".format(make_phrase(rng, 1), make_phrase(rng, 1))
+        person.birth_year = rng.randint(1450, 1880)
+        person.save()
+        person_ids.append(str(person.id))
+
+    for place_index in range(0, max(1, size // 10)):
+        place = corpus.get_content('Place')
+        place.name = make_phrase(rng, 2)
+        place.region = rng.choice(WORDS)
+        place.save()
+        place_ids.append(str(place.id))
+
+    return person_ids, place_ids
+
+
+def set_work_fields(corpus, work, bundle):
+    work.title = bundle['title']['value']
+    work.year = bundle['year']['value']
+    work.genre = bundle['genre']['value']
+    work.summary = bundle['summary']['value']
+    work.authors = [corpus.get_content_dbref('Person', author['value']) for author in bundle['authors']]
+    work.place = corpus.get_content_dbref('Place', bundle['place']['value'])
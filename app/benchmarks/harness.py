@@ -0,0 +1,379 @@
+"""
+Local stand-ins and measurement helpers for running Corpora's hot paths outside of the docker stack.
+
+Calling setup() configures Django with placeholder environment settings and then swaps out each backing service:
+
+    - MongoDB: mongomock, or an ephemeral mongod if CRP_BENCH_MONGO_HOST is set (i.e. mongodb://localhost:27017)
+    - Elasticsearch: a client whose transport records every request and answers from an in-memory document store
+    - Neo4J: a driver whose sessions record every cypher query and return no rows
+    - Huey: immediate mode, so tasks run inline
+    - Redis: fakeredis, when installed
+
+measure() then runs an operation against those stand-ins and reports wall time, queries per operation, and memory
+allocations.
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import tracemalloc
+from collections import namedtuple, Counter
+
+
+BENCHMARK_ENVIRONMENT = {
+    'CRP_HOST': 'localhost',
+    'CRP_USE_SSL': 'no',
+    'CRP_MONGO_DB': 'corpora_benchmarks',
+    'CRP_MONGO_USER': 'benchmarks',
+    'CRP_MONGO_PWD': 'benchmarks',
+    'CRP_MONGO_HOST': 'localhost',
+    'CRP_MONGO_POOLSIZE': '10',
+    'CRP_ELASTIC_HOST': 'http://benchmarks-elastic:9200',
+}
+
+recorders = {}
+
+
+class NeoRecorder(object):
+    """
+    Stands in for the Neo4J driver configured in settings.NEO4J. Sessions record each cypher query along with the
+    number of rows passed in list parameters (i.e. for UNWIND), and return no results.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.unwound_rows = 0
+
+    def reset(self):
+        self.queries = 0
+        self.unwound_rows = 0
+
+    def session(self):
+        return NeoSession(self)
+
+    def close(self):
+        pass
+
+
+class NeoSession(object):
+    def __init__(self, recorder):
+        self.recorder = recorder
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+    def run(self, cypher, **params):
+        self.recorder.queries += 1
+        for param in params.values():
+            if isinstance(param, list):
+                self.recorder.unwound_rows += len(param)
+        return []
+
+    def close(self):
+        pass
+
+
+class MongoRecorder(object):
+    """
+    Counts the commands sent to MongoDB, either through pymongo's command monitoring (for a real mongod) or by
+    wrapping mongomock's collection methods.
+    """
+
+    mongomock_methods = [
+        'find', 'find_one', 'insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one', 'delete_one',
+        'delete_many', 'bulk_write', 'aggregate', 'count_documents', 'estimated_document_count', 'distinct',
+        'find_one_and_update', 'find_one_and_replace', 'find_one_and_delete'
+    ]
+
+    def __init__(self):
+        self.commands = Counter()
+
+    def reset(self):
+        self.commands = Counter()
+
+    @property
+    def queries(self):
+        return sum(self.commands.values())
+
+    # pymongo CommandListener interface
+    def started(self, event):
+        self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def wrap_mongomock(self):
+        from mongomock.collection import Collection
+
+        for method_name in self.mongomock_methods:
+            if hasattr(Collection, method_name):
+                setattr(Collection, method_name, self.make_counted_method(method_name, getattr(Collection, method_name)))
+
+    def make_counted_method(self, method_name, method):
+        recorder = self
+
+        def counted_method(*args, **kwargs):
+            recorder.commands[method_name] += 1
+            return method(*args, **kwargs)
+
+        return counted_method
+
+
+RecordedResponse = namedtuple('RecordedResponse', ['meta', 'body'])
+
+
+class ElasticRecorder(object):
+    """
+    Backs the recording Elasticsearch transport. Documents sent by index, update, and bulk requests are kept in memory
+    so that searches return realistic hits.
+    """
+
+    def __init__(self):
+        self.requests = Counter()
+        self.bytes_sent = 0
+        self.indexes = {}
+
+    def reset(self):
+        self.requests = Counter()
+        self.bytes_sent = 0
+
+    @property
+    def queries(self):
+        return sum(self.requests.values())
+
+    def handle(self, method, target, body):
+        path = target.split('?')[0]
+        parts = [part for part in path.split('/') if part]
+        payload = None
+        if body:
+            self.bytes_sent += len(body)
+            if not parts or parts[-1] != '_bulk':
+                payload = json.loads(body)
+
+        endpoint = parts[-1] if parts and parts[-1].startswith('_') else (parts[-2] if len(parts) > 1 else 'index')
+        self.requests['{0} {1}'.format(method, endpoint)] += 1
+
+        if parts and parts[-1] == '_bulk':
+            return 200, self.handle_bulk(parts, body)
+
+        if not parts:
+            return 200, {'version': {'number': '8.15.0'}, 'tagline': 'You Know, for Search'}
+
+        index = parts[0]
+        if len(parts) == 1:
+            if method == 'HEAD':
+                return (200 if index in self.indexes else 404), None
+            elif method == 'PUT':
+                self.indexes[index] = {}
+            elif method == 'DELETE':
+                self.indexes.pop(index, None)
+            return 200, {'acknowledged': True}
+
+        docs = self.indexes.setdefault(index, {})
+        action = parts[1]
+
+        if action in ['_doc', '_create'] and len(parts) > 2:
+            if method == 'DELETE':
+                docs.pop(parts[2], None)
+                return 200, {'_index': index, '_id': parts[2], 'result': 'deleted'}
+            docs[parts[2]] = payload
+            return 201, {'_index': index, '_id': parts[2], '_version': 1, 'result': 'created'}
+
+        if action == '_update' and len(parts) > 2:
+            docs.setdefault(parts[2], {}).update((payload or {}).get('doc', {}))
+            return 200, {'_index': index, '_id': parts[2], 'result': 'updated'}
+
+        if action == '_search':
+            start = (payload or {}).get('from', 0)
+            size = (payload or {}).get('size', 10)
+            hits = [
+                {'_index': index, '_id': doc_id, '_score': 1.0, '_source': doc, 'sort': [doc_id]}
+                for doc_id, doc in list(docs.items())[start:start + size]
+            ]
+            return 200, {
+                'took': 1,
+                'timed_out': False,
+                'hits': {'total': {'value': len(docs), 'relation': 'eq'}, 'max_score': 1.0, 'hits': hits}
+            }
+
+        if action == '_count':
+            return 200, {'count': len(docs)}
+
+        if action == '_delete_by_query':
+            doc_ids = (payload or {}).get('query', {}).get('ids', {}).get('values', [])
+            deleted = len([docs.pop(doc_id) for doc_id in doc_ids if doc_id in docs])
+            return 200, {'deleted': deleted, 'failures': []}
+
+        return 200, {'acknowledged': True}
+
+    def handle_bulk(self, parts, body):
+        items = []
+        lines = [json.loads(line) for line in body.decode('utf-8').split('\n') if line.strip()]
+        line_index = 0
+        while line_index < len(lines):
+            op, meta = list(lines[line_index].items())[0]
+            index = meta.get('_index', parts[0] if len(parts) > 1 else None)
+            docs = self.indexes.setdefault(index, {})
+            line_index += 1
+
+            if op == 'delete':
+                docs.pop(meta.get('_id'), None)
+            else:
+                source = lines[line_index]
+                line_index += 1
+                if op == 'update':
+                    docs.setdefault(meta.get('_id'), {}).update(source.get('doc', {}))
+                else:
+                    docs[meta.get('_id')] = source
+
+            items.append({op: {'_index': index, '_id': meta.get('_id'), 'status': 200, 'result': 'ok'}})
+
+        return {'took': 1, 'errors': False, 'items': items}
+
+
+def make_recording_node_class(recorder):
+    from elastic_transport import BaseNode, ApiResponseMeta, HttpHeaders
+
+    class RecordingNode(BaseNode):
+        def perform_request(self, method, target, body=None, headers=None, request_timeout=None, **kwargs):
+            start = time.perf_counter()
+            status, response = recorder.handle(method, target, body)
+            meta = ApiResponseMeta(
+                status=status,
+                http_version='1.1',
+                headers=HttpHeaders({
+                    'content-type': 'application/vnd.elasticsearch+json;compatible-with=8',
+                    'x-elastic-product': 'Elasticsearch'
+                }),
+                duration=time.perf_counter() - start,
+                node=self.config
+            )
+            return RecordedResponse(meta, json.dumps(response).encode('utf-8') if response is not None else b'')
+
+        def close(self):
+            pass
+
+    return RecordingNode
+
+
+def setup():
+    if recorders:
+        return recorders
+
+    app_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if app_path not in sys.path:
+        sys.path.insert(0, app_path)
+
+    for env_var, value in BENCHMARK_ENVIRONMENT.items():
+        os.environ.setdefault(env_var, value)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'corpora.settings')
+
+    import django
+    django.setup()
+
+    import mongoengine
+    from django.conf import settings
+    from elasticsearch import Elasticsearch
+    from elasticsearch_dsl import connections
+
+    mongo = MongoRecorder()
+    mongoengine.disconnect_all()
+    if os.environ.get('CRP_BENCH_MONGO_HOST'):
+        mongoengine.connect(settings.MONGO_DB, host=os.environ['CRP_BENCH_MONGO_HOST'], event_listeners=[mongo])
+    else:
+        import mongomock
+        mongo.wrap_mongomock()
+        mongoengine.connect(settings.MONGO_DB, host='mongodb://localhost', mongo_client_class=mongomock.MongoClient)
+
+    elastic = ElasticRecorder()
+    connections.add_connection('default', Elasticsearch(
+        os.environ['CRP_ELASTIC_HOST'],
+        node_class=make_recording_node_class(elastic)
+    ))
+
+    neo = NeoRecorder()
+    settings.NEO4J = neo
+
+    settings.HUEY.immediate = True
+
+    try:
+        import redis
+        import fakeredis
+        redis.Redis = fakeredis.FakeRedis
+    except ImportError:
+        pass
+
+    # keep corpus and content files out of /corpora
+    from corpus import Corpus
+    files_root = tempfile.mkdtemp(prefix='corpora_benchmarks_')
+
+    def make_benchmark_corpus_path(corpus):
+        corpus_path = "{0}/{1}".format(files_root, corpus.id)
+        os.makedirs("{0}/files".format(corpus_path), exist_ok=True)
+        return corpus_path
+
+    Corpus._make_path = make_benchmark_corpus_path
+
+    recorders.update({
+        'mongo': mongo,
+        'elastic': elastic,
+        'neo': neo
+    })
+    return recorders
+
+
+def measure(name, operation, operations=1):
+    """
+    Run an operation once against the stand-ins and report its cost.
+
+    Args:
+        name (str): The name to report the measurement under.
+        operation (callable): A function taking no arguments that performs the work being measured.
+        operations (int): How many logical operations (i.e. content saves) the call performs, for per-operation stats.
+
+    Returns:
+        A dictionary of measurements.
+    """
+
+    for recorder in recorders.values():
+        recorder.reset()
+
+    tracemalloc.start()
+    alloc_start = tracemalloc.get_traced_memory()[0]
+
+    start = time.perf_counter()
+    operation()
+    elapsed = time.perf_counter() - start
+
+    alloc_end, alloc_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    operations = max(operations, 1)
+    measurement = {
+        'name': name,
+        'operations': operations,
+        'wall_time_seconds': round(elapsed, 6),
+        'wall_time_per_operation_ms': round((elapsed / operations) * 1000, 4),
+        'alloc_net_bytes': alloc_end - alloc_start,
+        'alloc_peak_bytes': alloc_peak - alloc_start,
+        'queries': {},
+        'queries_per_operation': {}
+    }
+
+    for service, recorder in recorders.items():
+        measurement['queries'][service] = recorder.queries
+        measurement['queries_per_operation'][service] = round(recorder.queries / operations, 3)
+
+    measurement['mongo_commands'] = dict(recorders['mongo'].commands)
+    measurement['elastic_requests'] = dict(recorders['elastic'].requests)
+    measurement['elastic_bytes_sent'] = recorders['elastic'].bytes_sent
+    measurement['neo_unwound_rows'] = recorders['neo'].unwound_rows
+
+    return measurement
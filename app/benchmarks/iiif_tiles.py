@@ -0,0 +1,108 @@
+"""
+Compares IIIF tile latency for page images served from their original files and from pyramidal TIFF derivatives.
+
+For each image a derivative is written alongside it (as make_page_image_derivatives does), and then the same
+random tiles are requested from the image server at several scale factors for both the original and the derivative,
+bypassing the image server's caches. The images must be somewhere the image server can read them.
+
+Run from the app directory:
+
+    python -m benchmarks.iiif_tiles /corpora/some/page_1.png /corpora/some/page_2.png --tiles 50
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+import requests
+from PIL import Image
+from benchmarks import harness
+
+
+def identifier_for(path):
+    # mirrors how get_image hands file paths to the image server
+    return path[1:].replace('/', '$!$')
+
+
+def pick_tiles(width, height, tile_size, num_tiles, rng):
+    tiles = []
+    scale_factors = [1, 2, 4, 8]
+    for tile_index in range(0, num_tiles):
+        scale_factor = scale_factors[tile_index % len(scale_factors)]
+        region_size = tile_size * scale_factor
+        x = rng.randrange(0, max(1, width - region_size))
+        y = rng.randrange(0, max(1, height - region_size))
+        tiles.append((x, y, min(region_size, width - x), min(region_size, height - y), tile_size))
+    return tiles
+
+
+def time_tiles(iiif_base, identifier, tiles):
+    latencies = []
+    for x, y, w, h, tile_size in tiles:
+        url = "{0}/{1}/{2},{3},{4},{5}/{6},/0/default.jpg".format(iiif_base, identifier, x, y, w, h, tile_size)
+        start = time.perf_counter()
+        resp = requests.get(url, params={'cache': 'false'})
+        latencies.append((time.perf_counter() - start) * 1000)
+        if resp.status_code != 200:
+            raise Exception("Tile request failed with status {0}: {1}".format(resp.status_code, url))
+    return latencies
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    return {
+        'tiles': len(latencies),
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'p50_ms': round(latencies[int(len(latencies) * 0.5)], 3),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark IIIF tile latency for original page images vs. pyramidal derivatives.")
+    parser.add_argument('images', nargs='+', help="Paths of page images to test.")
+    parser.add_argument('--iiif-base', default='http://iiif:8182/iiif/2', help="Base URL of the image server's IIIF endpoint.")
+    parser.add_argument('--tiles', type=int, default=40, help="Number of tiles to request per image.")
+    parser.add_argument('--tile-size', type=int, default=512, help="Tile size for the derivative and tile requests.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--keep', action='store_true', help="Keep the derivatives after the run.")
+    args = parser.parse_args(argv)
+
+    harness.setup()
+    from corpus.field_types.pyramid import make_pyramidal_derivative
+
+    rng = random.Random(args.seed)
+    original_latencies = []
+    derivative_latencies = []
+
+    for image_path in args.images:
+        derivative_path = "{0}.pyramid.tif".format(os.path.splitext(image_path)[0])
+
+        start = time.perf_counter()
+        make_pyramidal_derivative(image_path, derivative_path, tile_size=args.tile_size)
+        derivative_ms = (time.perf_counter() - start) * 1000
+
+        with Image.open(image_path) as image:
+            width, height = image.size
+
+        tiles = pick_tiles(width, height, args.tile_size, args.tiles, rng)
+        original_latencies += time_tiles(args.iiif_base, identifier_for(image_path), tiles)
+        derivative_latencies += time_tiles(args.iiif_base, identifier_for(derivative_path), tiles)
+
+        print("{0}: {1}x{2}, derivative written in {3:.1f} ms".format(image_path, width, height, derivative_ms))
+
+        if not args.keep:
+            os.remove(derivative_path)
+
+    results = {
+        'original': summarize(original_latencies),
+        'derivative': summarize(derivative_latencies),
+    }
+    print(json.dumps(results, indent=4))
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,163 @@
+"""
+Runs the benchmark suite against a synthetic corpus and writes the results as JSON.
+
+Run from the app directory:
+
+    python -m benchmarks.run --size 1000 --xref-density 3 --output benchmarks/results/my_branch.json
+
+Results from two runs can then be compared with:
+
+    python -m benchmarks.compare benchmarks/results/main.json benchmarks/results/my_branch.json
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from benchmarks import harness
+
+
+def get_git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except:
+        return None
+
+
+def run_suite(size, xref_density, searches, seed):
+    from manager.utilities import process_content_bundle, stream_content_export
+    from manager.tasks import adjust_content_slice, reindex_content, export_content_type_data
+    from benchmarks import fixtures
+
+    rng = random.Random(seed)
+    results = []
+
+    corpus = fixtures.create_corpus("Benchmark Corpus {0}".format(datetime.now().timestamp()))
+    person_ids, place_ids = fixtures.populate_people_and_places(corpus, size, seed)
+
+    # Content.save
+    work_ids = []
+
+    def save_works():
+        for work_index in range(0, size):
+            work = corpus.get_content('Work')
+            fixtures.set_work_fields(corpus, work, fixtures.make_work_bundle(rng, person_ids, place_ids, xref_density))
+            work.save()
+            work_ids.append(str(work.id))
+
+    results.append(harness.measure('content_save', save_works, size))
+
+    # process_content_bundle, as when editing content through the edit form
+    num_edits = min(size, 200)
+
+    def edit_works():
+        for work_id in work_ids[:num_edits]:
+            work = corpus.get_content('Work', work_id)
+            process_content_bundle(
+                corpus,
+                'Work',
+                work,
+                fixtures.make_work_bundle(rng, person_ids, place_ids, xref_density),
+                None
+            )
+
+    results.append(harness.measure('process_content_bundle', edit_works, num_edits))
+
+    # Corpus.search_content
+    def search_works():
+        for search_index in range(0, searches):
+            corpus.search_content(
+                'Work',
+                page=(search_index % 5) + 1,
+                page_size=50,
+                general_query=rng.choice(fixtures.WORDS),
+                fields_filter={'genre': rng.choice(fixtures.GENRES)} if search_index % 2 else {}
+            )
+
+    results.append(harness.measure('search_content', search_works, searches))
+
+    # adjust_content, as run by the Adjust Content job for a reindex and relabel
+    def adjust_works():
+        errors = adjust_content_slice(corpus, 'Work', 0, size, True, True, False, False)
+        if errors:
+            print("\n\n".join(errors))
+
+    results.append(harness.measure('adjust_content_slice', adjust_works, size))
+
+    # bulk reindexing of specific content, as used by content deletion cleanup
+    def bulk_reindex_works():
+        errors = reindex_content(corpus, 'Work', work_ids, relabel=True)
+        if errors:
+            print("\n\n".join(errors))
+
+    results.append(harness.measure('reindex_content', bulk_reindex_works, size))
+
+    # the JSON and CSV dumps made by export_corpus
+    export_path = tempfile.mkdtemp(prefix='corpora_benchmark_export_')
+
+    def export_works():
+        export_content_type_data(corpus, 'Work', export_path, export_path, True)
+
+    results.append(harness.measure('export_content_type_data', export_works, size))
+
+    # the on-demand export view's streaming exporter
+    def stream_export_works():
+        for exported_content in stream_content_export(corpus, 'Work', csv_format=True):
+            pass
+
+    results.append(harness.measure('stream_content_export', stream_export_works, size))
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Corpora's save, search, reindex, and export paths.")
+    parser.add_argument('--size', type=int, default=500, help="Number of Works to create (People and Places scale with it).")
+    parser.add_argument('--xref-density', type=float, default=3, help="Average number of People referenced by each Work.")
+    parser.add_argument('--searches', type=int, default=100, help="Number of searches to run.")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed for the synthetic corpus.")
+    parser.add_argument('--output', default=None, help="Path of a JSON file to write results to.")
+    args = parser.parse_args(argv)
+
+    harness.setup()
+
+    run = {
+        'run': {
+            'timestamp': datetime.now().isoformat(),
+            'git_commit': get_git_commit(),
+            'python': platform.python_version(),
+            'mongo': 'mongod' if os.environ.get('CRP_BENCH_MONGO_HOST') else 'mongomock',
+            'size': args.size,
+            'xref_density': args.xref_density,
+            'searches': args.searches,
+            'seed': args.seed,
+        },
+        'benchmarks': run_suite(args.size, args.xref_density, args.searches, args.seed)
+    }
+
+    if args.output:
+        output_dir = os.path.dirname(args.output)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as results_out:
+            json.dump(run, results_out, indent=4)
+
+    for measurement in run['benchmarks']:
+        print("{name:<28} {wall_time_per_operation_ms:>10.3f} ms/op   mongo {mongo:>7}/op   es {elastic:>7}/op   neo {neo:>7}/op   peak {peak:>10} bytes".format(
+            name=measurement['name'],
+            wall_time_per_operation_ms=measurement['wall_time_per_operation_ms'],
+            mongo=measurement['queries_per_operation']['mongo'],
+            elastic=measurement['queries_per_operation']['elastic'],
+            neo=measurement['queries_per_operation']['neo'],
+            peak=measurement['alloc_peak_bytes']
+        ))
+
+    return run
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -6,6 +6,7 @@ from huey import PriorityRedisHuey
 from neo4j import GraphDatabase
 from rest_framework.parsers import FileUploadParser
 from elasticsearch_dsl import connections
+from manager.metrics import MongoCommandListener, InstrumentedNode
 
 
 # Basic Django config
@@ -40,6 +41,23 @@ DEFAULT_USER_LNAME = os.environ.get('CRP_DEFAULT_USER_LNAME', 'McCorpus')
 DEFAULT_USER_EMAIL = os.environ.get('CRP_DEFAULT_USER_EMAIL', 'corpora@{0}'.format(ALLOWED_HOSTS[0]))
 REDIS_HOST = os.environ.get('CRP_REDIS_HOST', 'redis')
 REDIS_CACHE_EXPIRY_SECONDS = os.environ.get('CRP_REDIS_CACHE_EXPIRY_SECONDS', 1800)
+AGGREGATION_CACHE_TERMS_SECONDS = int(os.environ.get('CRP_AGGREGATION_CACHE_TERMS_SECONDS', 600))
+AGGREGATION_CACHE_GEO_SECONDS = int(os.environ.get('CRP_AGGREGATION_CACHE_GEO_SECONDS', 3600))
+CONTENT_VIEW_SHARD_SIZE = int(os.environ.get('CRP_CONTENT_VIEW_SHARD_SIZE', 50000))
+CONTENT_VIEW_CHANGE_DELAY = int(os.environ.get('CRP_CONTENT_VIEW_CHANGE_DELAY', 2))
+CONTENT_VERSION_SETTLE_DELAY = int(os.environ.get('CRP_CONTENT_VERSION_SETTLE_DELAY', 2))
+PAGE_QUERY_MAX_CONTENT = int(os.environ.get('CRP_PAGE_QUERY_MAX_CONTENT', 100000))
+SUGGESTION_CACHE_SECONDS = int(os.environ.get('CRP_SUGGESTION_CACHE_SECONDS', 30))
+NETWORK_CACHE_SECONDS = int(os.environ.get('CRP_NETWORK_CACHE_SECONDS', 600))
+SCHOLAR_PREFERENCE_FLUSH_DELAY = int(os.environ.get('CRP_SCHOLAR_PREFERENCE_FLUSH_DELAY', 5))
+PATTERN_COUNT_CACHE_SECONDS = int(os.environ.get('CRP_PATTERN_COUNT_CACHE_SECONDS', 3600))
+PATTERN_COUNT_SYNC_LIMIT = int(os.environ.get('CRP_PATTERN_COUNT_SYNC_LIMIT', 100000))
+PATTERN_COUNT_JOB_SECONDS = int(os.environ.get('CRP_PATTERN_COUNT_JOB_SECONDS', 600))
+ASYNC_API = os.environ.get('CRP_ASYNC_API', 'no') == 'yes'
+API_AUTH_CACHE_SECONDS = int(os.environ.get('CRP_API_AUTH_CACHE_SECONDS', 300))
+CORPUS_CACHE_SECONDS = int(os.environ.get('CRP_CORPUS_CACHE_SECONDS', 300))
+CAPTCHA_POOL_SIZE = int(os.environ.get('CRP_CAPTCHA_POOL_SIZE', 200))
+CAPTCHA_TOKEN_TTL = int(os.environ.get('CRP_CAPTCHA_TOKEN_TTL', 900))
 
 if '.' not in DEFAULT_USER_EMAIL:
     DEFAULT_USER_EMAIL += '.com'
@@ -74,6 +92,8 @@ INSTALLED_APPS += [
 ]
 
 MIDDLEWARE = [
+    'manager.middleware.MetricsMiddleware',
+    'manager.middleware.CompressionMiddleware',
     'manager.middleware.ChunkedTransferMiddleware',
     'manager.middleware.SiteMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -169,16 +189,19 @@ connect(
     username=MONGO_USER,
     password=MONGO_PWD,
     authentication_source=MONGO_AUTH_SOURCE,
-    maxpoolsize=MONGO_POOLSIZE
+    maxpoolsize=MONGO_POOLSIZE,
+    event_listeners=[MongoCommandListener()]
 )
 
 
 # Neo4j config
 NEO4J = None
+NEO4J_HOST = os.environ.get('CRP_NEO4J_HOST')
+NEO4J_PWD = os.environ.get('CRP_NEO4J_PWD')
 try:
     NEO4J = GraphDatabase.driver(
-        "bolt://{0}".format(os.environ['CRP_NEO4J_HOST']),
-        auth=('neo4j', os.environ['CRP_NEO4J_PWD'])
+        "bolt://{0}".format(NEO4J_HOST),
+        auth=('neo4j', NEO4J_PWD)
     )
     with NEO4J.session() as test_session:
         test_session.run("MATCH (n) RETURN count(n) as count")
@@ -189,10 +212,12 @@ except:
 
 
 # Elasticsearch config
+ELASTIC_HOST = os.environ['CRP_ELASTIC_HOST']
 connections.configure(
     default={
-        'hosts': os.environ['CRP_ELASTIC_HOST'],
+        'hosts': ELASTIC_HOST,
         'timeout': 60,
+        'node_class': InstrumentedNode,
     },
 )
 
@@ -243,6 +268,10 @@ INVALID_FIELD_NAMES = [
 ]
 
 VALID_IMAGE_EXTENSIONS = ['png', 'jpg', 'jpeg', 'tiff', 'tif']
+IIIF_DERIVATIVES = os.environ.get('CRP_IIIF_DERIVATIVES', 'false').lower() == 'true'
+IIIF_DERIVATIVE_TILE_SIZE = int(os.environ.get('CRP_IIIF_DERIVATIVE_TILE_SIZE', 512))
+IIIF_INFO_CACHE_SECONDS = int(os.environ.get('CRP_IIIF_INFO_CACHE_SECONDS', 86400))
+PAGE_IMPORT_WORKERS = int(os.environ.get('CRP_PAGE_IMPORT_WORKERS', os.cpu_count() or 1))
 
 
 # REST Framework config
@@ -285,9 +314,24 @@ HUEY = PriorityRedisHuey('corpora', host='redis')
 NUM_HUEY_WORKERS = os.environ.get('CRP_HUEY_WORKERS')
 NUM_JOBS_PER_MINUTE = int(os.environ.get('CRP_NUM_JOBS_PER_MINUTE', 200))
 JOB_TIMEOUT_SECS = int(os.environ.get('CRP_JOB_TIMEOUT_SECS', 86400))
-
-# Max job provenance count for content
+JOB_MAX_RESUME_TRIES = int(os.environ.get('CRP_JOB_MAX_RESUME_TRIES', 3))
+
+# Request and task metrics config
+METRICS_ENABLED = os.environ.get('CRP_METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_TOKEN = os.environ.get('CRP_METRICS_TOKEN', None)
+SLOW_REQUEST_SECONDS = float(os.environ.get('CRP_SLOW_REQUEST_SECONDS', 2))
+SLOW_QUERY_MS = int(os.environ.get('CRP_SLOW_QUERY_MS', 1000))
+SLOW_QUERY_LOG_SIZE = int(os.environ.get('CRP_SLOW_QUERY_LOG_SIZE', 5000))
+
+# API response compression config
+COMPRESSION_ENABLED = os.environ.get('CRP_COMPRESSION_ENABLED', 'true').lower() == 'true'
+COMPRESSION_MIN_BYTES = int(os.environ.get('CRP_COMPRESSION_MIN_BYTES', 1024))
+COMPRESSION_THREAD_BYTES = int(os.environ.get('CRP_COMPRESSION_THREAD_BYTES', 65536))
+
+# Job provenance retention: the max number of completed tasks kept for each piece of content, and the number of days
+# completed tasks are kept for (0 keeps them until they're displaced by newer ones)
 MAX_CONTENT_PROVENANCE = int(os.environ.get('CRP_MAX_CONTENT_PROVENANCE', 10))
+PROVENANCE_RETENTION_DAYS = int(os.environ.get('CRP_PROVENANCE_RETENTION_DAYS', 0))
 
 # iPython Notebook config
 NOTEBOOK_ARGUMENTS = [
@@ -7,12 +7,33 @@ from django.conf import settings
 from manager import views as manager_views
 
 
+# the read-only API endpoints are served by the async versions of their views when CRP_ASYNC_API is "yes"
+read_only_api_views = {
+    'content': manager_views.api_content,
+    'suggest': manager_views.api_suggest,
+    'pattern_count': manager_views.api_pattern_count,
+    'last_updated': manager_views.api_last_updated,
+    'network_json': manager_views.api_network_json,
+}
+async_read_only_api_views = {
+    'content': manager_views.api_content_async,
+    'suggest': manager_views.api_suggest_async,
+    'pattern_count': manager_views.api_pattern_count_async,
+    'last_updated': manager_views.api_last_updated_async,
+    'network_json': manager_views.api_network_json_async,
+}
+if settings.ASYNC_API:
+    read_only_api_views = async_read_only_api_views
+
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', manager_views.corpora),
     path('scholar', manager_views.scholar),
     path('scholars', manager_views.scholars),
     path('backups', manager_views.backups),
+    path('metrics', manager_views.metrics),
+    path('slow-queries', manager_views.slow_queries),
     path('backups/download/<str:backup_id>/', manager_views.download_backup),
     path('export/download/<str:corpus_id>/', manager_views.download_export),
     path('export/<str:corpus_id>/<str:content_type>/', manager_views.export),
@@ -72,17 +93,24 @@ urlpatterns += [
     path('api/corpus/<str:corpus_id>/content-view/<str:content_view_id>/', manager_views.api_content_view),
     path('api/corpus/<str:corpus_id>/content-group/', manager_views.api_content_group),
 
-    path('api/corpus/<str:corpus_id>/<str:content_type>/', manager_views.api_content),
+    path('api/corpus/<str:corpus_id>/<str:content_type>/', read_only_api_views['content']),
     path('api/corpus/<str:corpus_id>/<str:content_type>/files/', manager_views.api_content_files),
-    path('api/corpus/<str:corpus_id>/<str:content_type>/suggest/', manager_views.api_suggest),
-    path('api/corpus/<str:corpus_id>/<str:content_type>/pattern-count/', manager_views.api_pattern_count),
-    path('api/corpus/<str:corpus_id>/<str:content_type>/last-updated/', manager_views.api_last_updated),
+    path('api/corpus/<str:corpus_id>/<str:content_type>/suggest/', read_only_api_views['suggest']),
+    path('api/corpus/<str:corpus_id>/<str:content_type>/pattern-count/', read_only_api_views['pattern_count']),
+    path('api/corpus/<str:corpus_id>/<str:content_type>/last-updated/', read_only_api_views['last_updated']),
 
-    path('api/corpus/<str:corpus_id>/<str:content_type>/<str:content_id>/', manager_views.api_content),
+    path('api/corpus/<str:corpus_id>/<str:content_type>/<str:content_id>/', read_only_api_views['content']),
     path('api/corpus/<str:corpus_id>/<str:content_type>/<str:content_id>/files/', manager_views.api_content_files),
-    path('api/corpus/<str:corpus_id>/<str:content_type>/<str:content_id>/network-json/', manager_views.api_network_json),
+    path('api/corpus/<str:corpus_id>/<str:content_type>/<str:content_id>/network-json/', read_only_api_views['network_json']),
     path('api/scholar/preference/<str:content_type>/<str:preference>/', manager_views.api_scholar_preference),
     path('api/publish/<str:corpus_id>/<str:event_type>/', manager_views.api_publish),
 
+    path('api/async/corpus/<str:corpus_id>/<str:content_type>/', async_read_only_api_views['content']),
+    path('api/async/corpus/<str:corpus_id>/<str:content_type>/suggest/', async_read_only_api_views['suggest']),
+    path('api/async/corpus/<str:corpus_id>/<str:content_type>/pattern-count/', async_read_only_api_views['pattern_count']),
+    path('api/async/corpus/<str:corpus_id>/<str:content_type>/last-updated/', async_read_only_api_views['last_updated']),
+    path('api/async/corpus/<str:corpus_id>/<str:content_type>/<str:content_id>/', async_read_only_api_views['content']),
+    path('api/async/corpus/<str:corpus_id>/<str:content_type>/<str:content_id>/network-json/', async_read_only_api_views['network_json']),
+
     path('events/<channel>/', include(django_eventstream.urls), {}),
 ]
@@ -61,7 +61,7 @@ from .language_settings import REGISTRY as lang_settings
 # Here is where the proper import statements commence:
 import logging
 from .scholar import Scholar
-from .corpus import Corpus, CorpusBackup, CorpusBackupAutomation
+from .corpus import Corpus, CorpusBackup, CorpusBackupAutomation, SlowQuery
 from .content_type import ContentType, ContentTemplate, ContentTypeGroupMember, ContentTypeGroup
 from .field import Field, FieldRenderer, FIELD_LANGUAGES, FIELD_TYPES
 from .field_types.file import File
@@ -71,8 +71,8 @@ from .job import Task, CompletedTask, Job, JobTracker, JobSite, Process
 from .content import Content, ContentView, ContentDeletion
 from .utilities import (
     ensure_connection, get_corpus, parse_date_string,
-    search_corpora, search_scholars, run_neo,
-    ensure_neo_indexes, get_network_json, publish_message,
+    search_corpora, search_scholars, run_neo, async_run_neo,
+    ensure_neo_indexes, get_network_json, build_network_json, publish_message,
     get_field_value_from_path
 )
 
@@ -0,0 +1,104 @@
+import zlib
+
+
+class OrdinalBitmap(object):
+    """
+    A set of non-negative integers (content ordinals) stored as a bitmap, where bit n is set when n is a member.
+
+    Content of a given type is assigned a dense integer ordinal (see Corpus.ensure_content_ordinals), so a bitmap over
+    those ordinals holds membership for millions of content instances in a fraction of the space a list of their IDs
+    would take, and compresses well with zlib for storage.
+
+    Examples:
+        >>> members = OrdinalBitmap([1, 5, 9])
+        >>> members.add(12)
+        >>> 5 in members
+        True
+        >>> list(members & OrdinalBitmap([5, 12, 20]))
+        [5, 12]
+        >>> OrdinalBitmap.from_bytes(members.to_bytes()) == members
+        True
+    """
+
+    def __init__(self, ordinals=None):
+        self.bits = bytearray()
+        if ordinals:
+            self.update(ordinals)
+
+    def add(self, ordinal):
+        byte_index = ordinal >> 3
+        if byte_index >= len(self.bits):
+            self.bits.extend(bytes(byte_index - len(self.bits) + 1))
+        self.bits[byte_index] |= 1 << (ordinal & 7)
+
+    def update(self, ordinals):
+        for ordinal in ordinals:
+            self.add(ordinal)
+
+    def discard(self, ordinal):
+        byte_index = ordinal >> 3
+        if byte_index < len(self.bits):
+            self.bits[byte_index] &= ~(1 << (ordinal & 7)) & 0xFF
+
+    def __contains__(self, ordinal):
+        byte_index = ordinal >> 3
+        return byte_index < len(self.bits) and bool(self.bits[byte_index] & (1 << (ordinal & 7)))
+
+    def __len__(self):
+        return int.from_bytes(self.bits, 'little').bit_count()
+
+    def __bool__(self):
+        return any(self.bits)
+
+    def __iter__(self):
+        return self.iter_range(0, len(self.bits) << 3)
+
+    def iter_range(self, start, stop):
+        """
+        Yield the members within [start, stop) in ascending order. Both start and stop must be multiples of 8.
+        """
+
+        byte_offset = start >> 3
+        for byte_index, byte in enumerate(self.bits[byte_offset:stop >> 3], start=byte_offset):
+            # skip over empty bytes
+            if byte:
+                for bit in range(0, 8):
+                    if byte & (1 << bit):
+                        yield (byte_index << 3) + bit
+
+    def any_in_range(self, start, stop):
+        return any(self.bits[start >> 3:stop >> 3])
+
+    @property
+    def upper_bound(self):
+        # every member is less than this bound
+        return len(self.bits.rstrip(b'\x00')) << 3
+
+    def __eq__(self, other):
+        return isinstance(other, OrdinalBitmap) and self.bits.rstrip(b'\x00') == other.bits.rstrip(b'\x00')
+
+    def _combine(self, other, operation):
+        length = max(len(self.bits), len(other.bits))
+        combined = operation(int.from_bytes(self.bits, 'little'), int.from_bytes(other.bits, 'little'))
+        result = OrdinalBitmap()
+        result.bits = bytearray(combined.to_bytes(length, 'little'))
+        return result
+
+    def __and__(self, other):
+        return self._combine(other, lambda a, b: a & b)
+
+    def __or__(self, other):
+        return self._combine(other, lambda a, b: a | b)
+
+    def __sub__(self, other):
+        return self._combine(other, lambda a, b: a & ~b)
+
+    def to_bytes(self):
+        return zlib.compress(bytes(self.bits.rstrip(b'\x00')))
+
+    @classmethod
+    def from_bytes(cls, data):
+        bitmap = cls()
+        if data:
+            bitmap.bits = bytearray(zlib.decompress(data))
+        return bitmap
@@ -4,17 +4,20 @@ import json
 import re
 import traceback
 import mongoengine
+import redis
 from typing import TYPE_CHECKING
 from bson import ObjectId
 from datetime import datetime
 from django.conf import settings
 from django.template import Template, Context
 from django.utils.text import slugify
-from elasticsearch_dsl import Search, Index
+from elasticsearch_dsl import Search, Index, Q
 from elasticsearch_dsl.connections import get_connection
 from .utilities import run_neo, parse_graph_steps, build_cypher_from_graph_steps
 from .field_types.file import File
-from .job import CompletedTask
+from .bitmap import OrdinalBitmap
+from .suggestions import make_suggestion_actions, make_suggestion_deletions, index_suggestions
+from .provenance import delete_provenance
 from .scholar import Scholar
 
 
@@ -34,11 +37,12 @@ class Content(mongoengine.Document):
         corpus_id (str): ID of the parent Corpus.
         content_type (str): Name of the ContentType.
         last_updated (datetime): Timestamp of last modification.
-        provenance (list[CompletedTask]): Audit trail of operations.
         field_intensities (dict): Weights for cross-reference relationships.
         path (str): File system path for associated files.
         label (str): Computed display label from template.
         uri (str): Unique resource identifier.
+        ordinal (int): Dense, per content type integer assigned by Corpus.ensure_content_ordinals, used to store
+            ContentView membership as a bitmap.
 
     Note:
         This is an abstract base class. Actual content classes are generated
@@ -59,11 +63,11 @@ class Content(mongoengine.Document):
     corpus_id = mongoengine.StringField(required=True)
     content_type = mongoengine.StringField(required=True)
     last_updated = mongoengine.DateTimeField(default=datetime.now())
-    provenance = mongoengine.EmbeddedDocumentListField(CompletedTask)
     field_intensities = mongoengine.DictField(default={})
     path = mongoengine.StringField()
     label = mongoengine.StringField()
     uri = mongoengine.StringField()
+    ordinal = mongoengine.IntField()
 
     def get_intensity(self, field_name, value):
         if hasattr(self, field_name):
@@ -158,6 +162,32 @@ class Content(mongoengine.Document):
             print(traceback.format_exc())
             return False
 
+    @classmethod
+    def get_auxiliary_collections(cls):
+        """
+        List any extra MongoDB collections (beyond the content type's own) that store data for this content type.
+
+        Content types that keep part of their data in separate collections (i.e. Document pages) should override
+        this so those collections get dropped, backed up, and restored along with the content type's collection.
+
+        Returns:
+            A list of collection names.
+        """
+
+        return []
+
+    @classmethod
+    def delete_auxiliary_content(cls, content_ids):
+        """
+        Remove any data kept in auxiliary collections for content that is being deleted in bulk, i.e. without
+        calling delete() on each instance.
+
+        Args:
+            content_ids (list): The ObjectIds of the content being deleted.
+        """
+
+        pass
+
     @classmethod
     def _pre_save(cls, sender, document, **kwargs):
         document.last_updated = datetime.now()
@@ -210,6 +240,14 @@ class Content(mongoengine.Document):
             if do_linking:
                 self._do_linking()
 
+            ContentView.queue_changes(self._corpus, self.content_type, [{
+                'id': str(self.id),
+                'uri': self.uri,
+                'ordinal': self.ordinal,
+                'action': 'save',
+                'neighbors': getattr(self, '_unlinked_uris', [])
+            }])
+
     def delete(self, track_deletions=True, unindex=True, unlink=True, **kwargs):
         """
         Delete content with cleanup.
@@ -233,30 +271,44 @@ class Content(mongoengine.Document):
 
     @classmethod
     def _pre_delete(cls, sender, document, **kwargs):
+        neighbors = []
         if (document._unlink):
-            # delete Neo4J node
-            run_neo(
+            # delete Neo4J node, keeping track of what it was linked to for maintaining content views
+            results = run_neo(
                 '''
                     MATCH (d:{content_type} {{ uri: $content_uri }})
+                    OPTIONAL MATCH (d) -- (neighbor)
+                    WITH d, collect(distinct neighbor.uri) AS neighbors
                     DETACH DELETE d
+                    RETURN neighbors
                 '''.format(content_type=document.content_type),
                 {
                     'content_uri': document.uri
                 }
             )
+            if results:
+                neighbors = [uri for uri in results[0].value() if uri]
+            document._corpus.bump_graph_version()
 
         if (document._unindex):
             # delete from ES index
             es_index = "corpus-{0}-{1}".format(document.corpus_id, document.content_type.lower())
             Search(index=es_index).query("match", _id=str(document.id)).delete()
+            index_suggestions(document.corpus_id, make_suggestion_deletions(document.corpus_id, document._ct, [str(document.id)]))
+            document._corpus.bump_content_version(document.content_type)
+
+        delete_provenance(document._corpus, document.content_type, [document.id])
 
         # determine if deletion cleanup needed
         if hasattr(document, '_track_deletions') and document._track_deletions:
-            # mark any relevant content views as needs_refresh
-            cvs = ContentView.objects(corpus=document._corpus, status='populated', relevant_cts=document.content_type)
-            for cv in cvs:
-                cv.set_status('needs_refresh')
-                cv.save()
+            # remove this content from any relevant content views
+            ContentView.queue_changes(document._corpus, document.content_type, [{
+                'id': str(document.id),
+                'uri': document.uri,
+                'ordinal': document.ordinal,
+                'action': 'delete',
+                'neighbors': neighbors
+            }])
 
             reffing_cts = document._corpus.get_referencing_content_type_fields(document.content_type)
             if reffing_cts or document.path:
@@ -363,7 +415,7 @@ class Content(mongoengine.Document):
                 else:
                     setattr(self, field_name, new_file)
 
-    def _do_indexing(self, field_list=[]):
+    def _make_index_obj(self, field_list=[]):
         index_obj = {}
         for field in self._ct.fields:
             if field.in_lists and (len(field_list) == 0 or field.name in field_list):
@@ -441,6 +493,11 @@ class Content(mongoengine.Document):
         if len(field_list) == 0 or 'uri' in field_list:
             index_obj['uri'] = self.uri
 
+        return index_obj
+
+    def _do_indexing(self, field_list=[]):
+        index_obj = self._make_index_obj(field_list)
+
         try:
             if len(field_list) == 0:
                 get_connection().index(
@@ -458,6 +515,19 @@ class Content(mongoengine.Document):
             print("Error indexing {0} with ID {1}:".format(self.content_type, self.id))
             print(traceback.format_exc())
 
+        try:
+            suggestion_errors = index_suggestions(
+                self.corpus_id,
+                make_suggestion_actions(self.corpus_id, self._ct, str(self.id), index_obj, field_list)
+            )
+            if suggestion_errors:
+                print("Error indexing suggestions for {0} with ID {1}: {2}".format(self.content_type, self.id, json.dumps(suggestion_errors, default=str)))
+        except:
+            print("Error indexing suggestions for {0} with ID {1}:".format(self.content_type, self.id))
+            print(traceback.format_exc())
+
+        self._corpus.bump_content_version(self.content_type)
+
     def _do_linking(self):
         # here we're making sure the node exists
         run_neo(
@@ -477,16 +547,18 @@ class Content(mongoengine.Document):
 
         # here we're deleting all outbound relationships (they will be rebuilt below as necessary);
         # this is to ensure changed or deleted cross references are reflected in the graph (no stale
-        # relationships)
-        run_neo(
+        # relationships). what they pointed to is kept for maintaining content views.
+        unlinked = run_neo(
             '''
-                MATCH (d:{content_type} {{ uri: $content_uri }}) -[rel]-> ()
+                MATCH (d:{content_type} {{ uri: $content_uri }}) -[rel]-> (neighbor)
                 DELETE rel
+                RETURN distinct neighbor.uri
             '''.format(content_type=self.content_type),
             {
                 'content_uri': self.uri,
             }
         )
+        self._unlinked_uris = [res.value() for res in unlinked or [] if res.value()]
 
         nodes = {}
         for field in self._ct.fields:
@@ -567,6 +639,8 @@ class Content(mongoengine.Document):
                         }
                     )
 
+        self._corpus.bump_graph_version()
+
     def to_dict(self, ref_only=False):
         content_dict = {
             'corpus_id': self.corpus_id,
@@ -578,8 +652,6 @@ class Content(mongoengine.Document):
         }
 
         if not ref_only:
-            content_dict['provenance'] = [prov.to_dict() for prov in self.provenance]
-
             for field in self._ct.fields:
                 content_dict[field.name] = field.get_dict_value(getattr(self, field.name), self.uri, self.field_intensities)
 
@@ -610,11 +682,30 @@ class Content(mongoengine.Document):
                 json.dump(self.to_dict(), crystal_out, indent=4)
 
     meta = {
-        'abstract': True
+        'abstract': True,
+        # documents saved before provenance was moved to its own collection (see corpus.provenance) may still have
+        # it embedded until migrated
+        'strict': False
     }
 
 
 class ContentView(mongoengine.Document):
+    """
+    A named subset of a content type's content, defined by a search filter and/or a graph path (a pattern of
+    association in Neo4J), that can be used to filter searches and explored as a supernode in the graph.
+
+    Membership is stored as a compressed bitmap over the content type's ordinals (see Corpus.ensure_content_ordinals),
+    and mirrored into the content_view Elasticsearch index as a set of "shard" documents. Each shard holds the IDs of
+    the members whose ordinals fall within a range settings.CONTENT_VIEW_SHARD_SIZE wide, so that each can be used in
+    a terms lookup, and so that a change in membership only requires rewriting the shards it falls in.
+
+    Once populated, a view is maintained incrementally: saving or deleting content of any of the view's relevant
+    content types queues a change event (see queue_changes), and the process_content_view_changes task re-evaluates
+    the view's search filter and graph path for only the content those changes could affect.
+    """
+
+    CHANGE_QUEUE = '/content_view/changes'
+
     corpus = mongoengine.ReferenceField('Corpus')
     created_by = mongoengine.ReferenceField(Scholar)
     name = mongoengine.StringField(unique_with='corpus')
@@ -623,7 +714,10 @@ class ContentView(mongoengine.Document):
     search_filter = mongoengine.StringField()
     graph_path = mongoengine.StringField()
     es_document_id = mongoengine.StringField()
+    es_shards = mongoengine.ListField(mongoengine.IntField())
     neo_super_node_uri = mongoengine.StringField()
+    membership = mongoengine.BinaryField()
+    member_count = mongoengine.IntField()  # None for views populated before membership was kept as a bitmap
     status = mongoengine.StringField()
     status_date = mongoengine.DateTimeField(default=datetime.now())
 
@@ -631,10 +725,34 @@ class ContentView(mongoengine.Document):
         self.status = status
         self.status_date = datetime.now()
 
+    @property
+    def members(self):
+        return OrdinalBitmap.from_bytes(self.membership)
+
+    @property
+    def shard_span(self):
+        # shards must start on a byte boundary of the membership bitmap
+        return max(8, (settings.CONTENT_VIEW_SHARD_SIZE // 8) * 8)
+
+    def get_shard_id(self, shard):
+        return "{0}-{1}".format(self.es_document_id, shard)
+
+    def get_search_criteria(self):
+        if self.search_filter:
+            search_dict = json.loads(self.search_filter)
+
+            # determine if this search filter has any actual criteria specified
+            if 'general_query' in search_dict and search_dict['general_query'] != '*':
+                return search_dict
+
+            for criteria in search_dict.keys():
+                if criteria.startswith('fields_') and search_dict[criteria]:
+                    return search_dict
+        return None
+
     def populate(self):
         valid_spec = True
-        filtered_with_graph_path = False
-        es_conn = get_connection()
+        members = None
         index = Index('content_view')
 
         if index.exists() and \
@@ -642,20 +760,20 @@ class ContentView(mongoengine.Document):
                 self.corpus and \
                 self.target_ct in self.corpus.content_types:
 
-            ids = []
-
             if not self.es_document_id or not self.neo_super_node_uri:
                 name_slug = slugify(self.name).replace('-', '_')
                 view_identifier = "corpus_{0}_{1}".format(self.corpus.id, name_slug)
                 self.es_document_id = view_identifier
                 self.neo_super_node_uri = "/contentview/{0}".format(view_identifier)
             else:
-                run_neo("MATCH (supernode:ContentView { uri: $cv_uri }) DETACH DELETE supernode", {'cv_uri': self.neo_super_node_uri})
+                run_neo("MATCH (supernode:_ContentView { uri: $cv_uri }) DETACH DELETE supernode", {'cv_uri': self.neo_super_node_uri})
 
             self.relevant_cts = [self.target_ct]
             self.set_status("populating")
             self.save()
 
+            self.corpus.ensure_content_ordinals(self.target_ct)
+
             if self.graph_path:
                 graph_steps = parse_graph_steps(self.corpus, self.graph_path)
 
@@ -664,34 +782,12 @@ class ContentView(mongoengine.Document):
                         if graph_steps[step_index]['ct'] not in self.relevant_cts:
                             self.relevant_cts.append(graph_steps[step_index]['ct'])
 
-                    cypher = build_cypher_from_graph_steps(self.corpus.id, self.target_ct, graph_steps)
-                    count_cypher = cypher + "\nRETURN count(distinct target)"
-                    data_cypher = cypher + "\nRETURN distinct target.uri"
-
-                    print(count_cypher)
+                    cypher, cypher_params = build_cypher_from_graph_steps(self.corpus.id, self.target_ct, graph_steps)
+                    data_cypher = cypher + "\nRETURN distinct target.id"
 
                     try:
-                        count_results = run_neo(count_cypher, {})
-                        count = count_results[0].value()
-
-                        print(count)
-
-                        if count <= 60000:
-                            data_results = run_neo(data_cypher, {})
-                            ids = [res.value().split('/')[-1] for res in data_results]
-                            es_conn.index(
-                                index='content_view',
-                                id=self.es_document_id,
-                                body={
-                                    'ids': ids,
-                                }
-                            )
-
-                            filtered_with_graph_path = True
-                        else:
-                            valid_spec = False
-                            self.set_status("error: content views must contain less than 60,000 results")
-
+                        data_results = run_neo(data_cypher, cypher_params)
+                        members = self.corpus.get_content_ordinals(self.target_ct, [res.value() for res in data_results])
                     except:
                         print(traceback.format_exc())
                         valid_spec = False
@@ -702,89 +798,340 @@ class ContentView(mongoengine.Document):
                     valid_spec = False
                     print("Invalid pattern of association for content view!")
 
-            if self.search_filter and valid_spec and self.status == 'populating':
+            search_dict = self.get_search_criteria()
+            if search_dict and valid_spec and self.status == 'populating':
+                search_dict['page_size'] = 1000
+                search_dict['only'] = ['id']
 
-                search_dict = json.loads(self.search_filter)
+                search_members = OrdinalBitmap()
+                page = 1
+                num_pages = 1
 
-                # determine if this search filter has any actual criteria specified
-                criteria_specified = False
-                if 'general_query' in search_dict and search_dict['general_query'] != '*':
-                    criteria_specified = True
+                while page <= num_pages:
+                    search_dict['page'] = page
+                    results = self.corpus.search_content(self.target_ct, **search_dict)
+                    if results:
+                        if results['meta']['num_pages'] > num_pages:
+                            num_pages = results['meta']['num_pages']
 
-                if not criteria_specified:
-                    for criteria in search_dict.keys():
-                        if criteria.startswith('fields_') and search_dict[criteria]:
-                            criteria_specified = True
+                        search_members |= self.corpus.get_content_ordinals(
+                            self.target_ct,
+                            [record['id'] for record in results['records']]
+                        )
 
-                if criteria_specified:
-                    if filtered_with_graph_path:
-                        search_dict['content_view'] = self.es_document_id
+                        if 'next_page_token' in results['meta']:
+                            search_dict['next_page_token'] = results['meta']['next_page_token']
 
-                    search_dict['page_size'] = 1000
-                    search_dict['only'] = ['id']
+                    page += 1
 
-                    ids = []
-                    page = 1
-                    num_pages = 1
+                # when filtered with a graph path, only content matching both belongs in the view
+                members = search_members if members is None else members & search_members
 
-                    while page <= num_pages and valid_spec:
-                        search_dict['page'] = page
-                        results = self.corpus.search_content(self.target_ct, **search_dict)
-                        if results:
-                            if results['meta']['num_pages'] > num_pages:
-                                num_pages = results['meta']['num_pages']
+            if valid_spec and members is not None:
+                self.set_members(members)
+                self.register_relevant_cts()
+                self.set_status("populated")
 
-                            if results['meta']['total'] <= 60000:
-                                for record in results['records']:
-                                    ids.append(record['id'])
-                            else:
-                                valid_spec = False
-                                self.set_status("error: content views must contain less than 60,000 results")
+            self.save()
 
-                            if 'next_page_token' in results['meta']:
-                                search_dict['next_page_token'] = results['meta']['next_page_token']
+    def set_members(self, members):
+        """
+        Store a bitmap of member ordinals as this view's membership, mirroring it into Elasticsearch and Neo4J.
 
-                        page += 1
+        Args:
+            members (OrdinalBitmap): The ordinals of the content that belongs to this view.
+        """
 
-                if valid_spec:
-                    es_conn.index(
-                        index='content_view',
-                        id=self.es_document_id,
-                        body={
-                            'ids': ids,
-                        }
-                    )
+        self.membership = members.to_bytes()
+        self.member_count = len(members)
 
-            if valid_spec and ids:
-                total = len(ids)
-                cursor = 0
-                window = 1000
+        run_neo("MERGE (cv:_ContentView { uri: $cv_uri })", {'cv_uri': self.neo_super_node_uri})
 
-                run_neo("MERGE (cv:_ContentView { uri: $cv_uri })", {'cv_uri': self.neo_super_node_uri})
+        self.es_shards = []
+        for shard in range(0, (members.upper_bound // self.shard_span) + 1):
+            self.link_content(self.write_shard(members, shard))
 
-                supernode_cypher = '''
-                    MATCH (cv:_ContentView {{ uri: $cv_uri }}), (target:{0})
-                    WHERE target.uri IN $uris 
-                    MERGE (cv) -[rel:hasContent]-> (target)
-                '''.format(self.target_ct)
+        # remove any shards left over from when this view had other members, along with any document for this view
+        # stored before membership was sharded
+        get_connection().delete_by_query(
+            index='content_view',
+            body={'query': {'bool': {
+                'filter': [{'term': {'view': self.es_document_id}}],
+                'must_not': [{'terms': {'shard': self.es_shards}}]
+            }}},
+            refresh=True
+        )
+        Search(index='content_view').query('ids', values=[self.es_document_id]).delete()
 
-                while cursor < total:
-                    uris = ["/corpus/{0}/{1}/{2}".format(self.corpus.id, self.target_ct, id) for id in ids[cursor:window]]
-                    run_neo(
-                        supernode_cypher,
-                        {
-                            'cv_uri': self.neo_super_node_uri,
-                            'uris': uris
-                        }
-                    )
-                    cursor += window
-                self.set_status("populated")
+    def update_members(self, added, removed):
+        """
+        Add and remove members, rewriting only the Elasticsearch shards they fall in.
+
+        Args:
+            added (OrdinalBitmap): The ordinals of content to add to this view.
+            removed (OrdinalBitmap): The ordinals of content to remove from this view.
+        """
+
+        members = (self.members | added) - removed
+        self.membership = members.to_bytes()
+        self.member_count = len(members)
+
+        for shard in sorted(set(ordinal // self.shard_span for ordinal in (added | removed))):
+            self.write_shard(members, shard)
+
+        self.link_content(list(self.corpus.iterate_content_ids_by_ordinal(self.target_ct, added)))
+        self.unlink_content(list(self.corpus.iterate_content_ids_by_ordinal(self.target_ct, removed)))
+
+    def write_shard(self, members, shard):
+        shard_start = shard * self.shard_span
+        shard_ids = []
+
+        if members.any_in_range(shard_start, shard_start + self.shard_span):
+            shard_ids = list(self.corpus.iterate_content_ids_by_ordinal(
+                self.target_ct,
+                members.iter_range(shard_start, shard_start + self.shard_span)
+            ))
+
+        if shard_ids:
+            get_connection().index(
+                index='content_view',
+                id=self.get_shard_id(shard),
+                body={
+                    'view': self.es_document_id,
+                    'shard': shard,
+                    'ids': shard_ids,
+                }
+            )
+            if shard not in self.es_shards:
+                self.es_shards.append(shard)
+                self.es_shards.sort()
+
+        elif shard in self.es_shards:
+            get_connection().options(ignore_status=404).delete(index='content_view', id=self.get_shard_id(shard))
+            self.es_shards.remove(shard)
+
+        return shard_ids
+
+    def link_content(self, content_ids, window=1000):
+        supernode_cypher = '''
+            MATCH (cv:_ContentView {{ uri: $cv_uri }})
+            UNWIND $uris AS target_uri
+            MATCH (target:{0} {{ uri: target_uri }})
+            MERGE (cv) -[rel:hasContent]-> (target)
+        '''.format(self.target_ct)
+
+        for cursor in range(0, len(content_ids), window):
+            run_neo(
+                supernode_cypher,
+                {
+                    'cv_uri': self.neo_super_node_uri,
+                    'uris': ["/corpus/{0}/{1}/{2}".format(self.corpus.id, self.target_ct, id) for id in content_ids[cursor:cursor + window]]
+                }
+            )
+        if content_ids:
+            self.corpus.bump_graph_version()
+
+    def unlink_content(self, content_ids, window=1000):
+        supernode_cypher = '''
+            UNWIND $uris AS target_uri
+            MATCH (cv:_ContentView {{ uri: $cv_uri }}) -[rel:hasContent]-> (target:{0} {{ uri: target_uri }})
+            DELETE rel
+        '''.format(self.target_ct)
+
+        for cursor in range(0, len(content_ids), window):
+            run_neo(
+                supernode_cypher,
+                {
+                    'cv_uri': self.neo_super_node_uri,
+                    'uris': ["/corpus/{0}/{1}/{2}".format(self.corpus.id, self.target_ct, id) for id in content_ids[cursor:cursor + window]]
+                }
+            )
+        if content_ids:
+            self.corpus.bump_graph_version()
+
+    def register_relevant_cts(self):
+        # saves and deletes only queue change events for content types some view depends on
+        self.corpus.redis_cache.sadd("/corpus/{0}/content_view_cts".format(self.corpus.id), *self.relevant_cts)
+
+    @classmethod
+    def queue_changes(cls, corpus, content_type, changes):
+        """
+        Queue change events for content that has been saved or deleted, for any views that depend on its content type.
+
+        Args:
+            corpus (Corpus): The corpus the content belongs to.
+            content_type (str): The name of the content's content type.
+            changes (list): A dictionary per changed content, with its 'id', 'uri', 'ordinal', the 'action' taken
+                ('save' or 'delete'), and the 'neighbors' it was linked to in Neo4J before the change (a list of URIs).
+        """
+
+        try:
+            cache = corpus.redis_cache
+            if changes and cache.sismember("/corpus/{0}/content_view_cts".format(corpus.id), content_type):
+                cache.rpush(cls.CHANGE_QUEUE, *[json.dumps(dict(change, corpus_id=str(corpus.id), content_type=content_type)) for change in changes])
+
+                # changes are processed shortly after the first one is queued, batching any that arrive in the meantime
+                if cache.set(cls.CHANGE_QUEUE + '/scheduled', '1', nx=True, ex=60):
+                    from manager.tasks import process_content_view_changes
+                    process_content_view_changes.schedule(delay=settings.CONTENT_VIEW_CHANGE_DELAY)
+        except:
+            print("Error queuing content view changes for {0}:".format(content_type))
+            print(traceback.format_exc())
+
+    @classmethod
+    def process_changes(cls, max_changes=10000):
+        """
+        Apply queued change events to the views they affect.
+
+        Returns:
+            int: The number of change events processed.
+        """
+
+        cache = redis.Redis(host=settings.REDIS_HOST, decode_responses=True)
+        cache.delete(cls.CHANGE_QUEUE + '/scheduled')
+
+        # membership is read, modified, and written back, so only one worker applies changes at a time
+        with cache.lock(cls.CHANGE_QUEUE + '/lock', timeout=3600):
+            queue = cache.pipeline()
+            queue.lrange(cls.CHANGE_QUEUE, 0, max_changes - 1)
+            queue.ltrim(cls.CHANGE_QUEUE, max_changes, -1)
+            changes = [json.loads(change) for change in queue.execute()[0]]
 
+            changes_by_corpus = {}
+            for change in changes:
+                changes_by_corpus.setdefault(change['corpus_id'], {}).setdefault(change['content_type'], []).append(change)
+
+            for corpus_id, ct_changes in changes_by_corpus.items():
+                cvs = cls.objects(corpus=corpus_id, status='populated', relevant_cts__in=list(ct_changes.keys()))
+                for cv in cvs:
+                    try:
+                        cv.apply_changes(ct_changes)
+                    except:
+                        print("Error applying changes to content view {0}:".format(cv.name))
+                        print(traceback.format_exc())
+                        cv.set_status('needs_refresh')
+                        cv.save()
+
+        if cache.llen(cls.CHANGE_QUEUE):
+            from manager.tasks import process_content_view_changes
+            process_content_view_changes()
+
+        return len(changes)
+
+    def apply_changes(self, ct_changes):
+        if self.member_count is None:
+            # views populated before membership was kept as a bitmap need to be repopulated in full
+            self.set_status('needs_refresh')
             self.save()
+            return
+
+        graph_steps = parse_graph_steps(self.corpus, self.graph_path) if self.graph_path else {}
+        candidate_ids = set()
+        removed = OrdinalBitmap()
+
+        for change in ct_changes.get(self.target_ct, []):
+            if change['action'] == 'save':
+                candidate_ids.add(change['id'])
+            elif change.get('ordinal') is not None:
+                removed.add(change['ordinal'])
+
+        # a change to any content along the graph path (or to how it's linked) can change whether content within the
+        # path's number of steps of it belongs in the view
+        if graph_steps:
+            start_uris = {}
+            for ct_name, changes in ct_changes.items():
+                if ct_name in self.relevant_cts:
+                    for change in changes:
+                        for uri in [change['uri']] + change.get('neighbors', []):
+                            if uri and uri.count('/') == 4:
+                                start_uris.setdefault(uri.split('/')[3], set()).add(uri)
+
+            for start_ct, uris in start_uris.items():
+                if start_ct == self.target_ct:
+                    candidate_ids.update(uri.split('/')[-1] for uri in uris)
+
+                # the path is walked back to the target from each step the changed content could be at, so only the
+                # path's own content types and directions are followed (and never hub nodes like the view's own)
+                for step_index, step_info in graph_steps.items():
+                    if step_info['ct'] == start_ct:
+                        cypher, cypher_params = build_cypher_from_graph_steps(
+                            self.corpus.id,
+                            self.target_ct,
+                            {prior_index: prior_info for prior_index, prior_info in graph_steps.items() if prior_index <= step_index},
+                            ['ct{0}.uri IN $start_uris'.format(step_index)]
+                        )
+                        cypher_params['start_uris'] = list(uris)
+                        results = run_neo(cypher + "\nRETURN distinct target.id", cypher_params)
+                        if results is None:
+                            raise Exception("Unable to find content affected by changes along the graph path.")
+                        candidate_ids.update(res.value() for res in results if res.value())
+
+        if candidate_ids:
+            self.corpus.ensure_content_ordinals(self.target_ct)
+            candidates = self.corpus.get_content_ordinals(self.target_ct, candidate_ids)
+            matching = self.corpus.get_content_ordinals(self.target_ct, self.match_content(candidate_ids, graph_steps))
+
+            members = self.members
+            added = matching - members
+            removed |= (candidates - matching) & members
+        else:
+            added = OrdinalBitmap()
+            removed &= self.members
+
+        if added or removed:
+            self.update_members(added, removed)
+
+        self.set_status('populated')
+        self.save()
+
+    def match_content(self, content_ids, graph_steps={}, batch_size=1000):
+        """
+        Determine which of the given content of this view's target content type belongs in the view.
+
+        Returns:
+            set: The IDs of the content matching both this view's graph path and search filter.
+        """
+
+        matching = set(content_ids)
+
+        if graph_steps:
+            cypher, cypher_params = build_cypher_from_graph_steps(self.corpus.id, self.target_ct, graph_steps, ['target.id IN $target_ids'])
+            cypher_params['target_ids'] = list(matching)
+            results = run_neo(cypher + "\nRETURN distinct target.id", cypher_params)
+            if results is None:
+                raise Exception("Unable to match content against the graph path.")
+            matching = set(res.value() for res in results)
+
+        search_dict = self.get_search_criteria()
+        if search_dict and matching:
+            view_query = self.corpus.search_content(self.target_ct, generate_query_only=True, **search_dict)
+            if view_query:
+                index_name = "corpus-{0}-{1}".format(self.corpus.id, self.target_ct.lower())
+                es_conn = get_connection()
+
+                # make sure changes to the content are visible to search
+                es_conn.indices.refresh(index=index_name)
+
+                search_matching = set()
+                matching = list(matching)
+                for cursor in range(0, len(matching), batch_size):
+                    batch = matching[cursor:cursor + batch_size]
+                    results = es_conn.search(index=index_name, body={
+                        'query': {'bool': {'must': [view_query], 'filter': [{'ids': {'values': batch}}]}},
+                        '_source': False,
+                        'size': len(batch)
+                    })
+                    search_matching.update(hit['_id'] for hit in results['hits']['hits'])
+                matching = search_matching
+
+        return matching
 
     def clear(self):
-        # delete ES content_view document
-        Search(index='content_view').query('match', _id=self.es_document_id).delete()
+        # delete ES content_view documents
+        Search(index='content_view').query('bool', should=[
+            Q('term', view=self.es_document_id),
+            Q('ids', values=[self.es_document_id])
+        ]).delete()
 
         # delete Neo super node
         run_neo(
@@ -796,6 +1143,7 @@ class ContentView(mongoengine.Document):
                 'cv_uri': self.neo_super_node_uri
             }
         )
+        self.corpus.bump_graph_version()
 
     def to_dict(self):
         return {
@@ -804,9 +1152,31 @@ class ContentView(mongoengine.Document):
             'es_document_id': self.es_document_id,
             'neo_super_node_uri': self.neo_super_node_uri,
             'target_ct': self.target_ct,
+            'member_count': self.member_count,
             'status': self.status
         }
 
+    @classmethod
+    def _post_save(cls, sender, document, **kwargs):
+        # changes the ETags of API responses that include content views
+        document.bump_corpus_version()
+
+    @classmethod
+    def _post_delete(cls, sender, document, **kwargs):
+        document.bump_corpus_version()
+
+    def bump_corpus_version(self):
+        try:
+            if self.corpus:
+                self.corpus.bump_content_view_version()
+        except mongoengine.DoesNotExist:
+            # the corpus is being deleted along with its views
+            pass
+
+
+mongoengine.signals.post_save.connect(ContentView._post_save, sender=ContentView)
+mongoengine.signals.post_delete.connect(ContentView._post_delete, sender=ContentView)
+
 
 class ContentDeletion(mongoengine.Document):
     uri = mongoengine.StringField()
@@ -128,6 +128,10 @@ class ContentType(mongoengine.EmbeddedDocument):
                 if field.multiple:
                     class_dict[field.name] = mongoengine.ListField(class_dict[field.name])
 
+        # content ordinals are looked up when reading and writing ContentView membership
+        if 'ordinal' not in indexes:
+            indexes.append('ordinal')
+
         class_dict['meta'] = {
             'indexes': indexes,
             'collection': "corpus_{0}_{1}".format(corpus.id, self.name)
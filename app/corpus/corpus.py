@@ -5,25 +5,43 @@ import logging
 import traceback
 import mongoengine
 import redis
+import hashlib
+import time
+import asyncio
 from math import ceil
 from datetime import datetime, timedelta
 from copy import deepcopy
 from typing import TYPE_CHECKING
 from bson import ObjectId, DBRef
+from pymongo import UpdateOne
+from mongoengine.base.datastructures import BaseList
 from elasticsearch_dsl import (
     Index, Mapping, analyzer,
     GeoPoint, GeoShape, Nested,
     Q, A, Search
 )
 from elasticsearch_dsl.connections import get_connection
+from elasticsearch_dsl.response import Response
+from elasticsearch import NotFoundError
 from django.conf import settings
-from .utilities import run_neo, parse_date_string, is_valid_long_lat, ensure_neo_indexes
+from .utilities import (
+    run_neo, parse_date_string, is_valid_long_lat, ensure_neo_indexes, delete_elastic_index,
+    get_async_mongo, get_async_elastic, get_async_redis
+)
+from .suggestions import (
+    normalize_prefix, get_suggestion_cache_key, get_suggestions_indexed_key, get_suggestion_index_name,
+    build_suggestion_query, search_suggestion_index, collect_completion_suggestions,
+    ensure_suggestion_index, delete_suggestions, delete_suggestion_index
+)
+from .network import get_graph_version_key
+from .provenance import get_provenance_version_key, delete_provenance, drop_provenance_collection
 from .field_types.file import File
 from .field_types.gitrepo import GitRepo
 from .content_type import ContentType, ContentTypeGroup, ContentTemplate
 from .content import Content, ContentView
+from .bitmap import OrdinalBitmap
 from .field import Field
-from .job import Job, JobSite, Task, CompletedTask
+from .job import Job, JobSite, Task
 
 
 # to avoid circular dependency between Scholar and Corpus classes:
@@ -50,7 +68,10 @@ class Corpus(mongoengine.Document):
         open_access (bool): Whether the corpus is publicly accessible.
         content_types (dict[str, ContentType]): Content type definitions by name.
         content_type_groups (list[ContentTypeGroup]): Groupings for UI organization.
-        provenance (list[CompletedTask]): Audit trail of completed tasks.
+
+    Note:
+        The audit trail of tasks completed for the corpus and its content is kept in a separate collection (see
+        corpus.provenance).
 
     Examples:
         >>> # Create a new corpus
@@ -82,12 +103,14 @@ class Corpus(mongoengine.Document):
     open_access = mongoengine.BooleanField(default=False)
     content_types = mongoengine.MapField(mongoengine.EmbeddedDocumentField(ContentType))
     content_type_groups = mongoengine.ListField(mongoengine.EmbeddedDocumentField(ContentTypeGroup))
-    provenance = mongoengine.EmbeddedDocumentListField(CompletedTask)
 
     def save_file(self, file):
         self.modify(**{'set__files__{0}'.format(file.key): file})
         file._do_linking(content_type='Corpus', content_uri=self.uri)
 
+        # modify doesn't send the post save signal, so cached copies of the corpus are marked stale here
+        self.redis_cache.incr("/corpus/{0}/schema_version".format(self.id))
+
     def get_content(self, content_type, content_id_or_query={}, only=[], exclude=[], all=False, single_result=False):
         """Retrieve one or more instances of content of a specific Content Type.
 
@@ -160,6 +183,110 @@ class Corpus(mongoengine.Document):
 
         return content
 
+    async def aget_content(self, content_type, content_id, only=[]):
+        """
+        An async version of get_content for retrieving a single instance of content by ID, for use by async views.
+        Cross-referenced content is fetched up front (with one query per referenced Content Type) so that calling
+        to_dict on the result doesn't dereference it with blocking queries, though content types that override to_dict
+        (like Document) may still make their own.
+
+        Args:
+            content_type (str): The name of a Content Type in your corpus.
+            content_id (str): A string representation of the content's BSON ObjectId.
+            only (list): A list of content field names (strings) to exclusively return.
+
+        Returns:
+            A MongoEngine Document, or `None` if no matching content found.
+        """
+
+        if content_type not in self.content_types or not ObjectId.is_valid(content_id):
+            return None
+
+        db = get_async_mongo()
+        ct = self.content_types[content_type]
+        content_obj = ct.get_mongoengine_class(self)
+        projection = None
+        if only:
+            projection = {field_name: 1 for field_name in only + ['corpus_id', 'content_type', 'last_updated', 'label', 'uri']}
+
+        content_doc = await db[content_obj._get_collection_name()].find_one({'_id': ObjectId(content_id)}, projection)
+        if not content_doc:
+            return None
+        content = content_obj._from_son(content_doc)
+
+        xref_fields = [field for field in ct.fields if field.type == 'cross_reference' and field.name in content._data]
+        xref_ids = {}
+        for field in xref_fields:
+            refs = content._data[field.name] if field.multiple else [content._data[field.name]]
+            for ref in refs or []:
+                if isinstance(ref, DBRef):
+                    xref_ids.setdefault(field.cross_reference_type, set()).add(ref.id)
+
+        xrefs = {}
+
+        async def fetch_xrefs(xref_ct, ids):
+            xref_obj = self.content_types[xref_ct].get_mongoengine_class(self)
+            xref_docs = db[xref_obj._get_collection_name()].find(
+                {'_id': {'$in': list(ids)}},
+                {'corpus_id': 1, 'content_type': 1, 'last_updated': 1, 'label': 1, 'uri': 1}
+            )
+            async for xref_doc in xref_docs:
+                xrefs[xref_doc['_id']] = xref_obj._from_son(xref_doc)
+
+        await asyncio.gather(*[fetch_xrefs(xref_ct, ids) for xref_ct, ids in xref_ids.items()])
+
+        # references to content that no longer exists are dropped
+        for field in xref_fields:
+            if field.multiple:
+                refs = BaseList([xrefs[ref.id] for ref in content._data[field.name] or [] if isinstance(ref, DBRef) and ref.id in xrefs], content, field.name)
+                refs._dereferenced = True
+                content._data[field.name] = refs
+            elif isinstance(content._data[field.name], DBRef):
+                content._data[field.name] = xrefs.get(content._data[field.name].id)
+
+        return content
+
+    async def aget_last_updated(self, content_type):
+        """
+        Get the most recent last_updated timestamp for content of the given Content Type using the async MongoDB
+        client, or None if there's no content.
+        """
+
+        if content_type in self.content_types:
+            content_obj = self.content_types[content_type].get_mongoengine_class(self)
+            latest_content = await get_async_mongo()[content_obj._get_collection_name()].find_one(
+                {},
+                {'last_updated': 1},
+                sort=[('last_updated', -1)]
+            )
+            if latest_content and latest_content.get('last_updated'):
+                return latest_content['last_updated']
+        return None
+
+    def get_content_last_updated(self, content_type, content_id):
+        """
+        Get the last_updated timestamp of a single piece of content with a query projected to just that field, or None
+        if it doesn't exist.
+        """
+
+        if content_type in self.content_types and ObjectId.is_valid(content_id):
+            content_obj = self.content_types[content_type].get_mongoengine_class(self)
+            content_doc = content_obj._get_collection().find_one({'_id': ObjectId(content_id)}, {'last_updated': 1})
+            if content_doc:
+                return content_doc.get('last_updated')
+        return None
+
+    async def aget_content_last_updated(self, content_type, content_id):
+        if content_type in self.content_types and ObjectId.is_valid(content_id):
+            content_obj = self.content_types[content_type].get_mongoengine_class(self)
+            content_doc = await get_async_mongo()[content_obj._get_collection_name()].find_one(
+                {'_id': ObjectId(content_id)},
+                {'last_updated': 1}
+            )
+            if content_doc:
+                return content_doc.get('last_updated')
+        return None
+
     def get_or_create_content(self, content_type, fields={}, use_cache=False):
         """
         Retrieve existing content or create new if not found.
@@ -292,6 +419,7 @@ class Corpus(mongoengine.Document):
                             'target_uri': target_uri
                         }
                     )
+                    self.bump_graph_version()
 
     def get_content_dbref(self, content_type, content_id):
         """
@@ -371,9 +499,13 @@ class Corpus(mongoengine.Document):
             only_highlights=False,
             aggregations={},
             next_page_token=None,
+            page_query="",
+            page_hits_size=3,
+            profile=False,
             es_debug=False,
             es_debug_query=False,
-            generate_query_only=False
+            generate_query_only=False,
+            generate_sorted_query_only=False
     ):
         """
         Perform advanced search on content using Elasticsearch.
@@ -407,9 +539,21 @@ class Corpus(mongoengine.Document):
             only_highlights (bool): Whether to restrict results to matches that have highlights. Defaults to False.
             aggregations (dict): Elasticsearch aggregations to perform.
             next_page_token (str): Token for deep pagination.
+            page_query (str): A full-text search of the text of content's pages (for content types with a page index,
+                like Document). Only content with matching pages is returned, and each record gets a '_page_hits'
+                list of its best matching pages with highlights. When more than settings.PAGE_QUERY_MAX_CONTENT pieces
+                of content have matching pages, only that many are searched and 'page_query_truncated' is set in the
+                results' meta.
+            page_hits_size (int): The max number of page hits to return per record (for use with page_query).
+            profile (bool): Whether to have Elasticsearch profile the query and to time each phase of the search. The
+                Elasticsearch query, its 'took' time, the Elasticsearch profile, and the timings (in milliseconds) are
+                returned in the 'profile' key of the results' meta. Defaults to False.
             es_debug (bool): Whether to print out both the Elasticsearch query and the results to stdout inside the Corpora container. Defaults to False.
             es_debug_query (bool): Whether to print to stdout only the Elasticsearch query. Defaults to False.
             generate_query_only (bool): Whether to only return the Elasticsearch query without running it. Defaults to False.
+            generate_sorted_query_only (bool): Whether to only return the body of the Elasticsearch search (its query,
+                sort, and any min_score) without paging, highlights, or aggregations, for walking every result in the
+                search's order (as exports do). Defaults to False.
 
         Returns:
             dict: Search results with structure:
@@ -459,6 +603,16 @@ class Corpus(mongoengine.Document):
         }
 
         if content_type in self.content_types:
+            # time spent in each phase of the search (in milliseconds) for profiling and the slow query log
+            search_started = time.perf_counter()
+            phase_started = search_started
+            timings = {}
+
+            def end_phase(phase):
+                nonlocal phase_started
+                phase_ended = time.perf_counter()
+                timings[phase] = round(timings.get(phase, 0) + ((phase_ended - phase_started) * 1000), 3)
+                phase_started = phase_ended
 
             start_index = (page - 1) * page_size
             end_index = page * page_size
@@ -1058,13 +1212,68 @@ class Corpus(mongoengine.Document):
                             else:
                                 should.append(range_query)
 
+            # PAGE QUERY
+            page_index_name = "{0}-pages".format(index_name)
+            page_query_clause = None
+            if page_query:
+                page_query_clause = {'simple_query_string': {
+                    'query': page_query.strip(),
+                    'fields': ['text'],
+                    'default_operator': 'and'
+                }}
+                matching_ids = []
+                end_phase('build_query')
+
+                try:
+                    # the content with matching pages is collected a page of buckets at a time, up to
+                    # settings.PAGE_QUERY_MAX_CONTENT pieces of content
+                    content_ids_agg = {'sources': [{'document_id': {'terms': {'field': 'document_id'}}}]}
+                    while True:
+                        content_ids_agg['size'] = min(10000, settings.PAGE_QUERY_MAX_CONTENT + 1 - len(matching_ids))
+                        page_matches = get_connection().search(index=page_index_name, body={
+                            'query': page_query_clause,
+                            'size': 0,
+                            'aggs': {'content_ids': {'composite': content_ids_agg}}
+                        })
+                        content_ids = page_matches['aggregations']['content_ids']
+                        matching_ids += [bucket['key']['document_id'] for bucket in content_ids['buckets']]
+
+                        if len(matching_ids) > settings.PAGE_QUERY_MAX_CONTENT:
+                            matching_ids = matching_ids[:settings.PAGE_QUERY_MAX_CONTENT]
+                            results['meta']['page_query_truncated'] = True
+                            break
+                        if 'after_key' not in content_ids or len(content_ids['buckets']) < content_ids_agg['size']:
+                            break
+                        content_ids_agg['after'] = content_ids['after_key']
+                except:
+                    print('Error executing page query in corpus.search_content:')
+                    print(traceback.format_exc())
+
+                end_phase('page_query')
+                filter.append({'ids': {'values': matching_ids}})
+
             # CONTENT VIEW
             if content_view:
-                filter.append({'terms': {'_id': {
-                    'index': 'content_view',
-                    'id': content_view,
-                    'path': 'ids'
-                }}})
+                # a content view's members are split across several "shard" documents in the content_view index,
+                # each small enough for a terms lookup
+                cv = ContentView.objects(es_document_id=content_view).only('es_document_id', 'es_shards', 'member_count').first()
+                if cv and cv.member_count is not None and not cv.es_shards:
+                    filter.append({'ids': {'values': []}})
+                elif cv and cv.member_count is not None:
+                    filter.append({'bool': {
+                        'should': [{'terms': {'_id': {
+                            'index': 'content_view',
+                            'id': cv.get_shard_id(shard),
+                            'path': 'ids'
+                        }}} for shard in cv.es_shards],
+                        'minimum_should_match': 1
+                    }})
+                else:
+                    filter.append({'terms': {'_id': {
+                        'index': 'content_view',
+                        'id': content_view,
+                        'path': 'ids'
+                    }}})
 
             if should or must or must_not or filter:
                 search_query = {'query': {'bool': {}}}
@@ -1101,9 +1310,43 @@ class Corpus(mongoengine.Document):
 
                     search_query['source'] = {'includes': only, 'excludes': excludes}
 
+                # CHECK THE AGGREGATION CACHE
+                # aggregation results are cached per query and per version of the content type's data (bumped
+                # whenever its content is indexed or deleted, and again once the index refreshes; see
+                # bump_content_version), so paging through results doesn't recompute them
+                cached_aggregations = {}
+                agg_cache_keys = {}
+                if aggregations and not content_view and not (es_debug or es_debug_query):
+                    end_phase('build_query')
+                    try:
+                        content_version = self.get_content_version(content_type)
+                        for agg_name, agg in aggregations.items():
+                            agg_cache_keys[agg_name] = "/agg_cache/{0}/{1}/{2}/{3}".format(
+                                self.id,
+                                content_type,
+                                content_version,
+                                hashlib.sha1(json.dumps(
+                                    [search_query['query'], agg_name, agg],
+                                    sort_keys=True,
+                                    default=lambda obj: obj.to_dict() if hasattr(obj, 'to_dict') else str(obj)
+                                ).encode('utf-8')).hexdigest()
+                            )
+
+                        for agg_name, cached_agg in zip(agg_cache_keys.keys(), self.redis_cache.mget(list(agg_cache_keys.values()))):
+                            if cached_agg is not None:
+                                cached_aggregations[agg_name] = json.loads(cached_agg)
+                    except:
+                        print('Error reading aggregation cache in corpus.search_content:')
+                        print(traceback.format_exc())
+                        agg_cache_keys = {}
+                    end_phase('aggregation_cache')
+
                 # ADD ANY AGGREGATIONS TO SEARCH
                 agg_type_map = {}
                 for agg_name, agg in aggregations.items():
+                    if agg_name in cached_aggregations:
+                        continue
+
                     # agg should be of type elasticsearch_dsl.A, so calling A's .to_dict()
                     # method to get at what type ('terms', 'nested', etc) of aggregation
                     # this is.
@@ -1180,6 +1423,9 @@ class Corpus(mongoengine.Document):
 
                 search_query['sort'] = adjusted_fields_sort
 
+                if generate_sorted_query_only:
+                    return {key: search_query[key] for key in ['query', 'sort', 'min_score'] if key in search_query}
+
                 if fields_highlight:
                     formatted_highlight_fields = {}
                     for field_to_highlight in fields_highlight:
@@ -1198,7 +1444,12 @@ class Corpus(mongoengine.Document):
                     search_query['from'] = start_index
                     search_query['size'] = results['meta']['page_size']
 
+                if profile:
+                    search_query['profile'] = True
+
                 # execute search
+                search_results = None
+                end_phase('build_query')
                 try:
                     es_logger = None
                     es_log_level = None
@@ -1210,6 +1461,7 @@ class Corpus(mongoengine.Document):
                         es_logger.setLevel(logging.DEBUG)
 
                     search_results = get_connection().search(index=index_name, body=search_query)
+                    end_phase('es_request')
 
                     if es_debug:
                         print(json.dumps(search_results.body, indent=4))
@@ -1246,6 +1498,45 @@ class Corpus(mongoengine.Document):
                         else:
                             results['records'].append(record)
 
+                    end_phase('process_hits')
+
+                    # attach each record's best matching pages
+                    if page_query_clause and results['records']:
+                        page_hits = get_connection().search(index=page_index_name, body={
+                            'query': {'bool': {
+                                'must': [page_query_clause],
+                                'filter': [{'terms': {'document_id': [record['id'] for record in results['records']]}}]
+                            }},
+                            'collapse': {
+                                'field': 'document_id',
+                                'inner_hits': {
+                                    'name': 'pages',
+                                    'size': page_hits_size,
+                                    '_source': ['ref_no'],
+                                    'highlight': {
+                                        'fields': {'text': {}},
+                                        'fragment_size': highlight_fragment_size,
+                                        'number_of_fragments': highlight_num_fragments,
+                                        'max_analyzed_offset': 90000
+                                    }
+                                }
+                            },
+                            '_source': False,
+                            'size': len(results['records'])
+                        })
+
+                        records_by_id = {record['id']: record for record in results['records']}
+                        for page_hit in page_hits['hits']['hits']:
+                            document_id = page_hit['fields']['document_id'][0]
+                            if document_id in records_by_id:
+                                records_by_id[document_id]['_page_hits'] = [{
+                                    'ref_no': inner_hit['_source']['ref_no'],
+                                    'score': inner_hit['_score'],
+                                    'highlights': inner_hit.get('highlight', {}).get('text', [])
+                                } for inner_hit in page_hit['inner_hits']['pages']['hits']['hits']]
+
+                        end_phase('page_hits')
+
                     # search_after
                     if (end_index >= 9000 or using_page_token) and results['meta']['has_next_page']:
                         next_page_token = str(ObjectId())
@@ -1260,6 +1551,8 @@ class Corpus(mongoengine.Document):
                             self.redis_cache.set(next_page_token, next_page_info, ex=300)
                             results['meta']['next_page_token'] = next_page_token
 
+                    end_phase('process_hits')
+
                     if 'aggregations' in search_results:
                         for agg_name in search_results['aggregations'].keys():
                             results['meta']['aggregations'][agg_name] = {}
@@ -1284,10 +1577,56 @@ class Corpus(mongoengine.Document):
                             elif agg_type_map[agg_name] == 'geo_bounds':
                                 results['meta']['aggregations'][agg_name] = search_results['aggregations'][agg_name]['bounds']
 
+                    if agg_cache_keys:
+                        agg_cache = self.redis_cache.pipeline()
+                        for agg_name in search_results.get('aggregations', {}).keys():
+                            agg_cache.set(
+                                agg_cache_keys[agg_name],
+                                json.dumps(results['meta']['aggregations'][agg_name]),
+                                ex=settings.AGGREGATION_CACHE_GEO_SECONDS if 'geo' in agg_type_map[agg_name] else settings.AGGREGATION_CACHE_TERMS_SECONDS
+                            )
+                        agg_cache.execute()
+
+                    if cached_aggregations:
+                        results['meta']['aggregations'].update(cached_aggregations)
+                        results['meta']['aggregations'] = {
+                            agg_name: results['meta']['aggregations'][agg_name] for agg_name in aggregations.keys()
+                            if agg_name in results['meta']['aggregations']
+                        }
+
+                    end_phase('aggregations')
+
                 except:
                     print('Error executing elasticsearch query in corpus.search_content:')
                     print(traceback.format_exc())
 
+                total_ms = round((time.perf_counter() - search_started) * 1000, 3)
+                took = search_results['took'] if search_results is not None else None
+
+                if profile:
+                    results['meta']['profile'] = {
+                        'query': SlowQuery.serialize_body(search_query),
+                        'took': took,
+                        'es_profile': search_results.get('profile') if search_results is not None else None,
+                        'timings': timings,
+                        'total_ms': total_ms
+                    }
+
+                if total_ms >= settings.SLOW_QUERY_MS:
+                    try:
+                        SlowQuery.record(
+                            corpus_id=str(self.id),
+                            content_type=content_type,
+                            body=search_query,
+                            took=took,
+                            total_ms=total_ms,
+                            timings=timings,
+                            es_profile=search_results.get('profile') if search_results is not None else None
+                        )
+                    except:
+                        print('Error recording slow query in corpus.search_content:')
+                        print(traceback.format_exc())
+
         return results
 
     def explore_content(
@@ -1450,8 +1789,10 @@ class Corpus(mongoengine.Document):
         """
         Generate autocomplete suggestions for content fields.
 
-        Uses Elasticsearch's search-as-you-type (autocomplete) functionality to provide
-        real-time suggestions based on indexed content.
+        Suggestions come from the corpus' suggestion index (see corpus.suggestions) once the
+        content type's entries have been built, and otherwise (or when filtering) from searching
+        the search-as-you-type subfields of the content type's index. Results are cached in
+        Redis for SUGGESTION_CACHE_SECONDS, keyed by the normalized prefix, fields, and filters.
 
         Args:
             content_type (str): Name of the content type.
@@ -1476,138 +1817,227 @@ class Corpus(mongoengine.Document):
         results = {}
 
         if content_type in self.content_types:
-            ct = self.content_types[content_type]
-            index_name = "corpus-{0}-{1}".format(self.id, ct.name.lower())
-            index = Index(index_name)
-            if index.exists():
-                text_fields = []
-                xref_fields = []
-
-                for ct_field in ct.fields:
-                    if ct_field.autocomplete and (not fields) or (ct_field.name in fields):
-                        if ct_field.type == 'text':
-                            text_fields.append(ct_field.name)
-                        elif ct_field.type == 'cross_reference':
-                            xref_fields.append(ct_field.name)
-                if 'label' in fields and ct.autocomplete_labels:
-                    text_fields.append('label')
-
-                if text_fields or xref_fields:
-                    filter_queries = []
-                    if filters:
-                        for search_field in filters.keys():
-                            field_values = [value_part for value_part in filters[search_field].split('__') if
-                                            value_part]
-                            field_queries = []
-                            for field_value in field_values:
-                                if '.' in search_field:
-                                    field_parts = search_field.split('.')
-                                    field_queries.append(Q(
-                                        "nested",
-                                        path=field_parts[0],
-                                        query=Q(
-                                            'term',
-                                            **{search_field: field_value}
-                                        )
-                                    ))
-                                else:
-                                    if search_field == 'id':
-                                        search_field = '_id'
-                                    field_queries.append(Q('term', **{search_field: field_value}))
-
-                            if field_queries:
-                                if len(field_queries) > 1:
-                                    filter_queries.append(Q('bool', should=field_queries))
-                                else:
-                                    filter_queries.append(field_queries[0])
-
-                    if text_fields:
-                        subfields = []
-                        for text_field in text_fields:
-                            subfields.append(text_field + '.suggest')
-                            subfields.append(text_field + '.suggest._2gram')
-                            subfields.append(text_field + '.suggest._3gram')
-
-                        text_query = Q('multi_match', query=prefix, type='bool_prefix', fields=subfields)
-                        command = Search(using=get_connection(), index=index_name)
-                        command = command.query('bool', must=[text_query], filter=filter_queries)
-                        command = command.source(includes=text_fields)
-
+            prefix = normalize_prefix(prefix)
+            cache_key = get_suggestion_cache_key(self.id, content_type, prefix, fields, max_suggestions_per_field, filters)
+            cached_results, suggestions_indexed = self.redis_cache.mget([
+                cache_key,
+                get_suggestions_indexed_key(self.id, content_type)
+            ])
+            if cached_results and not es_debug:
+                return json.loads(cached_results)
+
+            completion_query = None
+            if suggestions_indexed and not filters:
+                completion_query = build_suggestion_query(self.content_types[content_type], prefix, fields, max_suggestions_per_field)
+
+            completion_response = None
+            if completion_query:
+                if es_debug:
+                    print(json.dumps(completion_query, indent=4))
+                completion_response = search_suggestion_index(self.id, completion_query)
+                if es_debug:
+                    print(json.dumps(completion_response, indent=4))
+
+            if completion_response is not None:
+                results = collect_completion_suggestions(completion_response, max_suggestions_per_field)
+            else:
+                index_name = "corpus-{0}-{1}".format(self.id, content_type.lower())
+                index = Index(index_name)
+                if index.exists():
+                    suggestion_searches = self.build_suggestion_searches(content_type, prefix, fields, max_suggestions_per_field, filters)
+                    for search_type, command, search_fields in suggestion_searches:
                         if es_debug:
                             print(json.dumps(command.to_dict(), indent=4))
                         response = command.execute()
                         if es_debug:
                             print(json.dumps(response.to_dict(), indent=4))
 
-                        if hasattr(response, 'hits'):
-                            field_hits_gathered = {}
-                            total_hits_gathered = 0
+                        self.collect_search_suggestions(results, search_type, response, search_fields, max_suggestions_per_field)
 
-                            for hit in response.hits:
-                                if total_hits_gathered >= len(text_fields) * max_suggestions_per_field:
-                                    break
-                                else:
-                                    for text_field in text_fields:
-                                        if 'text_field' not in field_hits_gathered or field_hits_gathered[
-                                            text_field] < max_suggestions_per_field:
-                                            if hasattr(hit, text_field) and getattr(hit, text_field):
-                                                if text_field not in results:
-                                                    results[text_field] = []
-
-                                                hit_value = getattr(hit, text_field)
-
-                                                if hit_value not in results[text_field]:
-                                                    results[text_field].append(hit_value)
-
-                                                    if text_field not in field_hits_gathered:
-                                                        field_hits_gathered[text_field] = 0
-
-                                                    field_hits_gathered[text_field] += 1
-                                                    total_hits_gathered += 1
-
-                    if xref_fields:
-                        nested_queries = []
-                        for xref_field in xref_fields:
-                            nested_queries.append(Q(
-                                'nested',
-                                path=xref_field,
+            self.redis_cache.set(cache_key, json.dumps(results), ex=settings.SUGGESTION_CACHE_SECONDS)
+
+        return results
+
+    async def asuggest_content(
+            self,
+            content_type,
+            prefix,
+            fields=[],
+            max_suggestions_per_field=5,
+            filters={}
+    ):
+        """
+        An async version of suggest_content for use by async views, which sends its Elasticsearch requests
+        concurrently using the async Elasticsearch client.
+        """
+
+        results = {}
+
+        if content_type in self.content_types:
+            es = get_async_elastic()
+            cache = get_async_redis()
+            prefix = normalize_prefix(prefix)
+            cache_key = get_suggestion_cache_key(self.id, content_type, prefix, fields, max_suggestions_per_field, filters)
+            cached_results, suggestions_indexed = await cache.mget([
+                cache_key,
+                get_suggestions_indexed_key(self.id, content_type)
+            ])
+            if cached_results:
+                return json.loads(cached_results)
+
+            completion_query = None
+            if suggestions_indexed and not filters:
+                completion_query = build_suggestion_query(self.content_types[content_type], prefix, fields, max_suggestions_per_field)
+
+            completion_response = None
+            if completion_query:
+                try:
+                    completion_response = (await es.search(index=get_suggestion_index_name(self.id), body=completion_query)).body
+                except NotFoundError:
+                    completion_response = None
+
+            index_name = "corpus-{0}-{1}".format(self.id, content_type.lower())
+            if completion_response is not None:
+                results = collect_completion_suggestions(completion_response, max_suggestions_per_field)
+            elif await es.indices.exists(index=index_name):
+                suggestion_searches = self.build_suggestion_searches(content_type, prefix, fields, max_suggestions_per_field, filters)
+                raw_responses = await asyncio.gather(*[
+                    es.search(index=index_name, body=command.to_dict()) for search_type, command, search_fields in suggestion_searches
+                ])
+
+                for (search_type, command, search_fields), raw_response in zip(suggestion_searches, raw_responses):
+                    response = Response(command, raw_response.body)
+                    self.collect_search_suggestions(results, search_type, response, search_fields, max_suggestions_per_field)
+
+            await cache.set(cache_key, json.dumps(results), ex=settings.SUGGESTION_CACHE_SECONDS)
+
+        return results
+
+    def build_suggestion_searches(self, content_type, prefix, fields, max_suggestions_per_field, filters):
+        # returns a list of (search type, Search, field names) for suggest_content and asuggest_content to execute
+        searches = []
+        ct = self.content_types[content_type]
+        index_name = "corpus-{0}-{1}".format(self.id, ct.name.lower())
+        text_fields = []
+        xref_fields = []
+
+        for ct_field in ct.fields:
+            if ct_field.autocomplete and (not fields) or (ct_field.name in fields):
+                if ct_field.type == 'text':
+                    text_fields.append(ct_field.name)
+                elif ct_field.type == 'cross_reference':
+                    xref_fields.append(ct_field.name)
+        if 'label' in fields and ct.autocomplete_labels:
+            text_fields.append('label')
+
+        if text_fields or xref_fields:
+            filter_queries = []
+            if filters:
+                for search_field in filters.keys():
+                    field_values = [value_part for value_part in filters[search_field].split('__') if
+                                    value_part]
+                    field_queries = []
+                    for field_value in field_values:
+                        if '.' in search_field:
+                            field_parts = search_field.split('.')
+                            field_queries.append(Q(
+                                "nested",
+                                path=field_parts[0],
                                 query=Q(
-                                    'multi_match',
-                                    query=prefix,
-                                    type='bool_prefix',
-                                    fields=[
-                                        xref_field + '.label.suggest',
-                                        xref_field + '.label.suggest._2gram',
-                                        xref_field + '.label.suggest._3gram'
-                                    ]
+                                    'term',
+                                    **{search_field: field_value}
                                 )
                             ))
+                        else:
+                            if search_field == 'id':
+                                search_field = '_id'
+                            field_queries.append(Q('term', **{search_field: field_value}))
 
-                        command = Search(using=get_connection(), index=index_name, extra={'size': 0})
-                        command = command.query('bool', must=nested_queries, filter=filter_queries)
+                    if field_queries:
+                        if len(field_queries) > 1:
+                            filter_queries.append(Q('bool', should=field_queries))
+                        else:
+                            filter_queries.append(field_queries[0])
+
+            if text_fields:
+                subfields = []
+                for text_field in text_fields:
+                    subfields.append(text_field + '.suggest')
+                    subfields.append(text_field + '.suggest._2gram')
+                    subfields.append(text_field + '.suggest._3gram')
+
+                text_query = Q('multi_match', query=prefix, type='bool_prefix', fields=subfields)
+                command = Search(using=get_connection(), index=index_name)
+                command = command.query('bool', must=[text_query], filter=filter_queries)
+                command = command.source(includes=text_fields)
+                searches.append(('text', command, text_fields))
+
+            if xref_fields:
+                nested_queries = []
+                for xref_field in xref_fields:
+                    nested_queries.append(Q(
+                        'nested',
+                        path=xref_field,
+                        query=Q(
+                            'multi_match',
+                            query=prefix,
+                            type='bool_prefix',
+                            fields=[
+                                xref_field + '.label.suggest',
+                                xref_field + '.label.suggest._2gram',
+                                xref_field + '.label.suggest._3gram'
+                            ]
+                        )
+                    ))
 
-                        for xref_field in xref_fields:
-                            agg = A('nested', path=xref_field)
-                            agg.bucket('names', 'terms', size=max_suggestions_per_field,
-                                       field=xref_field + '.label.raw')
-                            command.aggs.bucket(xref_field, agg)
+                command = Search(using=get_connection(), index=index_name, extra={'size': 0})
+                command = command.query('bool', must=nested_queries, filter=filter_queries)
 
-                        if es_debug:
-                            print(json.dumps(command.to_dict(), indent=4))
-                        response = command.execute()
-                        if es_debug:
-                            print(json.dumps(response.to_dict(), indent=4))
+                for xref_field in xref_fields:
+                    agg = A('nested', path=xref_field)
+                    agg.bucket('names', 'terms', size=max_suggestions_per_field,
+                               field=xref_field + '.label.raw')
+                    command.aggs.bucket(xref_field, agg)
+                searches.append(('xref', command, xref_fields))
 
-                        if hasattr(response, 'aggregations'):
-                            for xref_field in xref_fields:
-                                if hasattr(response.aggregations, xref_field):
-                                    suggestions = getattr(response.aggregations, xref_field).names.buckets
-                                    for suggestion in suggestions:
-                                        if xref_field not in results:
-                                            results[xref_field] = []
-                                        results[xref_field].append(suggestion.key)
+        return searches
 
-        return results
+    def collect_search_suggestions(self, results, search_type, response, search_fields, max_suggestions_per_field):
+        if search_type == 'text' and hasattr(response, 'hits'):
+            text_fields = search_fields
+            field_hits_gathered = {}
+            total_hits_gathered = 0
+
+            for hit in response.hits:
+                if total_hits_gathered >= len(text_fields) * max_suggestions_per_field:
+                    break
+                else:
+                    for text_field in text_fields:
+                        if 'text_field' not in field_hits_gathered or field_hits_gathered[
+                            text_field] < max_suggestions_per_field:
+                            if hasattr(hit, text_field) and getattr(hit, text_field):
+                                if text_field not in results:
+                                    results[text_field] = []
+
+                                hit_value = getattr(hit, text_field)
+
+                                if hit_value not in results[text_field]:
+                                    results[text_field].append(hit_value)
+
+                                    if text_field not in field_hits_gathered:
+                                        field_hits_gathered[text_field] = 0
+
+                                    field_hits_gathered[text_field] += 1
+                                    total_hits_gathered += 1
+
+        elif search_type == 'xref' and hasattr(response, 'aggregations'):
+            for xref_field in search_fields:
+                if hasattr(response.aggregations, xref_field):
+                    suggestions = getattr(response.aggregations, xref_field).names.buckets
+                    for suggestion in suggestions:
+                        if xref_field not in results:
+                            results[xref_field] = []
+                        results[xref_field].append(suggestion.key)
 
     def save_content_type(self, schema):
         """
@@ -1953,15 +2383,20 @@ class Corpus(mongoengine.Document):
                     '''.format(content_type),
                     {'corpus_id': str(self.id)}
                 )[0][0]
+            self.bump_graph_version()
 
             # Delete Elasticsearch index
-            index_name = "corpus-{0}-{1}".format(self.id, content_type.lower())
-            index = Index(index_name)
-            if index.exists():
-                index.delete()
+            delete_elastic_index("corpus-{0}-{1}".format(self.id, content_type.lower()))
+            delete_suggestions(self.id, content_type)
+            self.redis_cache.delete(get_suggestions_indexed_key(self.id, content_type))
+
+            delete_provenance(self, content_type)
 
-            # Drop MongoDB collection
-            self.content_types[content_type].get_mongoengine_class(self).drop_collection()
+            # Drop MongoDB collection (and any auxiliary collections)
+            ct_class = self.content_types[content_type].get_mongoengine_class(self)
+            for auxiliary_collection in ct_class.get_auxiliary_collections():
+                self._get_db().drop_collection(auxiliary_collection)
+            ct_class.drop_collection()
 
             # Delete files
             ct_path = "{0}/{1}".format(self.path, content_type)
@@ -2042,7 +2477,7 @@ class Corpus(mongoengine.Document):
 
         return None
 
-    def build_content_type_elastic_index(self, content_type):
+    def build_content_type_elastic_index(self, content_type, index_name=None):
         """
         Build or rebuild the Elasticsearch index for a content type.
 
@@ -2051,6 +2486,9 @@ class Corpus(mongoengine.Document):
 
         Args:
             content_type (str): Name of the content type to index.
+            index_name (str): Create the index under this name instead, leaving the
+                content type's index and suggestion entries as they are (as when the
+                elasticsearch_reindex command builds an index to swap in).
         """
 
         if content_type in self.content_types:
@@ -2080,10 +2518,11 @@ class Corpus(mongoengine.Document):
                 'document': 'text',
             }
 
-            index_name = "corpus-{0}-{1}".format(self.id, ct.name.lower())
-            index = Index(index_name)
-            if index.exists():
-                index.delete()
+            if index_name:
+                index = Index(index_name)
+            else:
+                delete_elastic_index("corpus-{0}-{1}".format(self.id, ct.name.lower()))
+                index = Index("corpus-{0}-{1}".format(self.id, ct.name.lower()))
 
             label_analyzer = analyzer(
                 'corpora_label_analyzer',
@@ -2164,6 +2603,15 @@ class Corpus(mongoengine.Document):
 
             index.mapping(mapping)
             index.save()
+            if index_name:
+                return
+
+            self.bump_content_version(ct.name)
+
+            # suggestion entries are rebuilt along with the content type's index (see corpus.suggestions)
+            ensure_suggestion_index(self.id)
+            delete_suggestions(self.id, ct.name)
+            self.redis_cache.set(get_suggestions_indexed_key(self.id, ct.name), 1)
 
     def queue_local_job(self, content_type=None, content_id=None, task_id=None, task_name=None, scholar_id=None,
                         parameters={}):
@@ -2300,6 +2748,157 @@ class Corpus(mongoengine.Document):
         os.makedirs("{0}/files".format(corpus_path), exist_ok=True)
         return corpus_path
 
+    def get_content_version(self, content_type):
+        """
+        Get the write counter for a content type, which changes whenever its content is indexed or deleted.
+        """
+
+        return self.redis_cache.get("/corpus/{0}/{1}/version".format(self.id, content_type)) or '0'
+
+    def bump_content_version(self, content_type):
+        """
+        Bump the write counter for a content type. Writes to Elasticsearch aren't searchable until the index refreshes,
+        so anything searched (and cached, or given an ETag) under the new version in the meantime may predate the
+        write. The counter is bumped again once the index has been refreshed (see settle_content_version), batching any
+        writes that arrive in the meantime.
+        """
+
+        try:
+            version_key = "/corpus/{0}/{1}/version".format(self.id, content_type)
+            self.redis_cache.incr(version_key)
+
+            if self.redis_cache.set(version_key + '/settle_scheduled', '1', nx=True, ex=60):
+                from manager.tasks import settle_content_version
+                settle_content_version.schedule(args=(str(self.id), content_type), delay=settings.CONTENT_VERSION_SETTLE_DELAY)
+        except:
+            print("Error bumping content version for {0}:".format(content_type))
+            print(traceback.format_exc())
+
+    def settle_content_version(self, content_type):
+        """
+        Refresh a content type's index and bump its write counter, so that searches made before the refresh and cached
+        under the previous version are no longer used.
+        """
+
+        version_key = "/corpus/{0}/{1}/version".format(self.id, content_type)
+
+        # writes made during the refresh schedule another one
+        self.redis_cache.delete(version_key + '/settle_scheduled')
+        get_connection().options(ignore_status=404).indices.refresh(index="corpus-{0}-{1}".format(self.id, content_type.lower()))
+        self.redis_cache.incr(version_key)
+
+    def get_version_keys(self, content_types=[], content_views=False, provenance=False):
+        keys = ["/corpus/{0}/schema_version".format(self.id)]
+        keys += ["/corpus/{0}/{1}/version".format(self.id, content_type) for content_type in content_types]
+        if content_views:
+            keys.append("/corpus/{0}/content_view_version".format(self.id))
+        if provenance:
+            keys.append(get_provenance_version_key(self.id))
+        return keys
+
+    def get_versions(self, content_types=[], content_views=False, provenance=False):
+        """
+        Get this corpus' schema version, followed by the write counters of the given content types (see
+        get_content_version) and, optionally, of its content views and provenance, in a single round trip to Redis.
+        """
+
+        return [version or '0' for version in self.redis_cache.mget(self.get_version_keys(content_types, content_views, provenance))]
+
+    async def aget_versions(self, content_types=[], content_views=False, provenance=False):
+        versions = await get_async_redis().mget(self.get_version_keys(content_types, content_views, provenance))
+        return [version or '0' for version in versions]
+
+    def bump_content_view_version(self):
+        try:
+            self.redis_cache.incr("/corpus/{0}/content_view_version".format(self.id))
+        except:
+            print("Error bumping content view version for corpus {0}:".format(self.id))
+            print(traceback.format_exc())
+
+    def get_graph_version(self):
+        """
+        Get the write counter for this corpus' graph, which changes whenever nodes or relationships are written to or
+        deleted from it. Cached networks (see corpus.network) are keyed by it.
+        """
+
+        return self.redis_cache.get(get_graph_version_key(self.id)) or '0'
+
+    def bump_graph_version(self):
+        try:
+            self.redis_cache.incr(get_graph_version_key(self.id))
+        except:
+            print("Error bumping graph version for corpus {0}:".format(self.id))
+            print(traceback.format_exc())
+
+    def ensure_content_ordinals(self, content_type, batch_size=10000):
+        """
+        Assign a dense integer ordinal to any content of the given type that doesn't have one yet, continuing on from
+        the highest ordinal already assigned. Ordinals are what ContentView membership bitmaps are built over.
+
+        Returns:
+            int: The number of ordinals assigned.
+        """
+
+        collection = self.content_types[content_type].get_mongoengine_class(self)._get_collection()
+        assigned = 0
+
+        with self.redis_cache.lock("/corpus/{0}/{1}/ordinal_lock".format(self.id, content_type), timeout=3600):
+            highest = collection.find_one({}, {'ordinal': 1}, sort=[('ordinal', -1)])
+            next_ordinal = highest['ordinal'] + 1 if highest and highest.get('ordinal') is not None else 0
+
+            while True:
+                unassigned = [doc['_id'] for doc in collection.find({'ordinal': None}, {'_id': 1}).sort('_id', 1).limit(batch_size)]
+                if not unassigned:
+                    break
+
+                collection.bulk_write([
+                    UpdateOne({'_id': content_id}, {'$set': {'ordinal': next_ordinal + offset}})
+                    for offset, content_id in enumerate(unassigned)
+                ], ordered=False)
+                next_ordinal += len(unassigned)
+                assigned += len(unassigned)
+
+        return assigned
+
+    def get_content_ordinals(self, content_type, content_ids, batch_size=10000):
+        """
+        Build a bitmap of the ordinals for the given content IDs. Content without an ordinal is left out, so call
+        ensure_content_ordinals first.
+
+        Returns:
+            OrdinalBitmap: The ordinals of the content.
+        """
+
+        collection = self.content_types[content_type].get_mongoengine_class(self)._get_collection()
+        ordinals = OrdinalBitmap()
+        content_ids = list(content_ids)
+
+        for cursor in range(0, len(content_ids), batch_size):
+            batch = [ObjectId(content_id) for content_id in content_ids[cursor:cursor + batch_size]]
+            for doc in collection.find({'_id': {'$in': batch}, 'ordinal': {'$ne': None}}, {'ordinal': 1}):
+                ordinals.add(doc['ordinal'])
+
+        return ordinals
+
+    def iterate_content_ids_by_ordinal(self, content_type, ordinals, batch_size=10000):
+        """
+        Generator that yields the IDs (as strings) of the content whose ordinals are in a bitmap, in ordinal order.
+        """
+
+        collection = self.content_types[content_type].get_mongoengine_class(self)._get_collection()
+        batch = []
+
+        for ordinal in ordinals:
+            batch.append(ordinal)
+            if len(batch) == batch_size:
+                for doc in collection.find({'ordinal': {'$in': batch}}, {'_id': 1}).sort('ordinal', 1):
+                    yield str(doc['_id'])
+                batch = []
+
+        if batch:
+            for doc in collection.find({'ordinal': {'$in': batch}}, {'_id': 1}).sort('ordinal', 1):
+                yield str(doc['_id'])
+
     @property
     def redis_cache(self):
         if not hasattr(self, '_redis_cache'):
@@ -2336,9 +2935,13 @@ class Corpus(mongoengine.Document):
             }
         )
 
+        # let any cached copies of this corpus (see manager.utilities.aget_corpus) know they're stale
+        document.redis_cache.incr("/corpus/{0}/schema_version".format(document.id))
+
     @classmethod
     def _pre_delete(cls, sender, document, **kwargs):
         corpus_id = str(document.id)
+        document.redis_cache.incr("/corpus/{0}/schema_version".format(corpus_id))
 
         # Delete any ContentViews associated with this corpus
         cvs = ContentView.objects(corpus=corpus_id)
@@ -2349,16 +2952,21 @@ class Corpus(mongoengine.Document):
             cv.clear()
             cv.delete()
 
+        delete_suggestion_index(corpus_id)
+
         # Delete Content Type indexes and collections
         for content_type in document.content_types.keys():
             # Delete ct index
-            index_name = "corpus-{0}-{1}".format(corpus_id, content_type.lower())
-            index = Index(index_name)
-            if index.exists():
-                index.delete()
+            delete_elastic_index("corpus-{0}-{1}".format(corpus_id, content_type.lower()))
+            document.redis_cache.delete(get_suggestions_indexed_key(corpus_id, content_type))
+
+            # Drop ct MongoDB collection (and any auxiliary collections)
+            ct_class = document.content_types[content_type].get_mongoengine_class(document)
+            for auxiliary_collection in ct_class.get_auxiliary_collections():
+                document._get_db().drop_collection(auxiliary_collection)
+            ct_class.drop_collection()
 
-            # Drop ct MongoDB collection
-            document.content_types[content_type].get_mongoengine_class(document).drop_collection()
+        drop_provenance_collection(document)
 
         # Delete all Neo4J nodes associated with corpus
         delete_count = 1
@@ -2448,11 +3056,12 @@ class Corpus(mongoengine.Document):
 
             corpus_dict['content_type_groups'] = [ctg.to_dict() for ctg in self.content_type_groups]
 
-        corpus_dict['provenance'] = [prov.to_dict() for prov in self.provenance]
-
         return corpus_dict
 
     meta = {
+        # documents saved before provenance was moved to its own collection may still have it embedded until
+        # migrated (see the migrate_provenance management command)
+        'strict': False,
         'indexes': [
             'open_access',
             {
@@ -2597,3 +3206,181 @@ class CorpusBackupAutomation(mongoengine.Document):
             'number_to_retain': self.number_to_retain,
             'automated_backups': [b.to_dict() for b in self.automated_backups],
         }
+
+
+class SlowQuery(mongoengine.Document):
+    """
+    A search_content query that took longer than settings.SLOW_QUERY_MS to complete, kept in a capped collection so
+    that only the most recent slow queries (settings.SLOW_QUERY_LOG_SIZE of them) are retained.
+
+    Queries are grouped by their "shape," which is the Elasticsearch query body with every value replaced by a
+    placeholder. Searches that differ only by their search terms, ids, dates, or page number share a shape (and
+    therefore a shape_hash), while a search that adds a clause, a nested query, or an aggregation does not.
+
+    Attributes:
+        corpus_id (str): The ID of the corpus searched
+        content_type (str): The name of the content type searched
+        shape_hash (str): SHA1 hash of the normalized query shape
+        shape (str): The normalized query shape as JSON
+        body (str): The Elasticsearch query body as JSON
+        took (int): How long Elasticsearch reported spending on the query (in milliseconds)
+        total_ms (float): How long the entire call to search_content took (in milliseconds)
+        timings (dict): Milliseconds spent in each phase of the search, i.e. build_query, page_query,
+            aggregation_cache, es_request, process_hits, page_hits, and aggregations
+        clause_counts (dict): The number of each type of clause (nested, range, etc.) in the query
+        page_from (int): The offset of the first result requested
+        search_after (bool): Whether the query paged deeply using search_after
+        es_profile (str): The Elasticsearch profile as JSON, if the search was run in profiling mode
+        created (datetime): When the query was run
+    """
+
+    CLAUSE_TYPES = [
+        'bool', 'nested', 'range', 'term', 'terms', 'ids', 'exists', 'wildcard', 'match', 'match_phrase',
+        'simple_query_string', 'query_string', 'multi_match', 'geo_bounding_box', 'geo_shape'
+    ]
+
+    corpus_id = mongoengine.StringField()
+    content_type = mongoengine.StringField()
+    shape_hash = mongoengine.StringField()
+    shape = mongoengine.StringField()
+    body = mongoengine.StringField()
+    took = mongoengine.IntField()
+    total_ms = mongoengine.FloatField()
+    timings = mongoengine.DictField()
+    clause_counts = mongoengine.DictField()
+    page_from = mongoengine.IntField(default=0)
+    search_after = mongoengine.BooleanField(default=False)
+    es_profile = mongoengine.StringField()
+    created = mongoengine.DateTimeField(default=datetime.now)
+
+    meta = {
+        'max_documents': settings.SLOW_QUERY_LOG_SIZE,
+        'max_size': settings.SLOW_QUERY_LOG_SIZE * 20480,
+        'indexes': [
+            'shape_hash'
+        ]
+    }
+
+    @classmethod
+    def serialize_body(cls, body):
+        # aggregations may be elasticsearch_dsl objects rather than dictionaries
+        return json.loads(json.dumps(
+            body,
+            default=lambda obj: obj.to_dict() if hasattr(obj, 'to_dict') else str(obj)
+        ))
+
+    @classmethod
+    def normalize_body(cls, body):
+        if isinstance(body, dict):
+            return {
+                key: cls.normalize_body(value) for key, value in body.items()
+                if key not in ['profile', 'explain']
+            }
+        elif isinstance(body, list):
+            # lists of values (like the ids in a terms query) have the same shape no matter how many values they hold
+            if all(not isinstance(item, (dict, list)) for item in body):
+                return ['?'] if body else []
+            return [cls.normalize_body(item) for item in body]
+        return '?'
+
+    @classmethod
+    def count_clauses(cls, query, counts=None):
+        if counts is None:
+            counts = {}
+
+        if isinstance(query, dict):
+            for key, value in query.items():
+                if key in cls.CLAUSE_TYPES:
+                    counts[key] = counts.get(key, 0) + 1
+                cls.count_clauses(value, counts)
+        elif isinstance(query, list):
+            for item in query:
+                cls.count_clauses(item, counts)
+        return counts
+
+    @classmethod
+    def record(cls, corpus_id, content_type, body, took=None, total_ms=0, timings={}, es_profile=None):
+        body = cls.serialize_body(body)
+        shape = json.dumps(cls.normalize_body(body), sort_keys=True)
+        clause_counts = cls.count_clauses(body.get('query', {}))
+        if body.get('aggs'):
+            clause_counts['aggregations'] = len(body['aggs'])
+
+        slow_query = cls(
+            corpus_id=corpus_id,
+            content_type=content_type,
+            shape_hash=hashlib.sha1(shape.encode('utf-8')).hexdigest(),
+            shape=shape,
+            body=json.dumps(body),
+            took=took,
+            total_ms=total_ms,
+            timings=timings,
+            clause_counts=clause_counts,
+            page_from=body.get('from', 0),
+            search_after='search_after' in body,
+            es_profile=json.dumps(es_profile) if es_profile else None
+        )
+        slow_query.save()
+        return slow_query
+
+    @classmethod
+    def summarize(cls, corpus_id=None, limit=100):
+        """
+        Group the logged slow queries by shape, slowest (in total time spent) first.
+
+        Returns:
+            list: A dictionary per query shape with its shape_hash, shape, count, total_ms, avg_ms, max_ms, avg_took,
+                when it was last_seen, the corpus_id and content_type it was last seen for, and the body and timings of
+                its most recent occurrence.
+        """
+
+        pipeline = []
+        if corpus_id:
+            pipeline.append({'$match': {'corpus_id': corpus_id}})
+
+        pipeline += [
+            {'$sort': {'created': -1}},
+            {'$group': {
+                '_id': '$shape_hash',
+                'shape': {'$first': '$shape'},
+                'count': {'$sum': 1},
+                'total_ms': {'$sum': '$total_ms'},
+                'avg_ms': {'$avg': '$total_ms'},
+                'max_ms': {'$max': '$total_ms'},
+                'avg_took': {'$avg': '$took'},
+                'last_seen': {'$first': '$created'},
+                'corpus_id': {'$first': '$corpus_id'},
+                'content_type': {'$first': '$content_type'},
+                'clause_counts': {'$first': '$clause_counts'},
+                'search_after': {'$max': '$search_after'},
+                'max_page_from': {'$max': '$page_from'},
+                'body': {'$first': '$body'},
+                'timings': {'$first': '$timings'},
+            }},
+            {'$sort': {'total_ms': -1}},
+            {'$limit': limit}
+        ]
+
+        summaries = []
+        for summary in cls.objects.aggregate(pipeline):
+            summary['shape_hash'] = summary.pop('_id')
+            summaries.append(summary)
+        return summaries
+
+    def to_dict(self):
+        return {
+            'id': str(self.id),
+            'corpus_id': self.corpus_id,
+            'content_type': self.content_type,
+            'shape_hash': self.shape_hash,
+            'shape': json.loads(self.shape),
+            'body': json.loads(self.body),
+            'took': self.took,
+            'total_ms': self.total_ms,
+            'timings': self.timings,
+            'clause_counts': self.clause_counts,
+            'page_from': self.page_from,
+            'search_after': self.search_after,
+            'es_profile': json.loads(self.es_profile) if self.es_profile else None,
+            'created': int(self.created.timestamp())
+        }
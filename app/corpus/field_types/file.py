@@ -1,10 +1,14 @@
 import os
 import zlib
+import json
+import redis
 import requests
 import mongoengine
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
-from PIL import Image
 from ..utilities import run_neo
+from .pyramid import make_pyramidal_derivative
+from .probe import get_image_size
 
 
 class File(mongoengine.EmbeddedDocument):
@@ -20,6 +24,7 @@ class File(mongoengine.EmbeddedDocument):
     height = mongoengine.IntField(required=False)
     width = mongoengine.IntField(required=False)
     iiif_info = mongoengine.DictField()
+    iiif_path = mongoengine.StringField(required=False)
 
     @property
     def key(self):
@@ -42,6 +47,37 @@ class File(mongoengine.EmbeddedDocument):
     def is_image(self):
         return self.extension in settings.VALID_IMAGE_EXTENSIONS
 
+    @property
+    def derivative_path(self):
+        return "{0}.pyramid.tif".format(os.path.splitext(self.path)[0])
+
+    def make_iiif_derivative(self, tile_size=None):
+        """
+        Write a tiled, pyramidal TIFF copy of this image alongside it and point iiif_path at it.
+
+        The original file is left in place (and remains the file served for download), but the image server is
+        directed to the derivative so that tile requests only decode the tiles they need.
+
+        Returns:
+            bool: Whether a derivative was made.
+        """
+
+        if self.is_image and not self.iiif_info and self.path and os.path.exists(self.path):
+            make_pyramidal_derivative(
+                self.path,
+                self.derivative_path,
+                tile_size=tile_size or settings.IIIF_DERIVATIVE_TILE_SIZE
+            )
+            self.iiif_path = self.derivative_path
+            return True
+        return False
+
+    def delete_iiif_derivative(self):
+        if self.iiif_path:
+            if os.path.exists(self.iiif_path):
+                os.remove(self.iiif_path)
+            self.iiif_path = None
+
     def _do_linking(self, content_type, content_uri):
         uri_parts = [part for part in content_uri.split('/') if part]
         if uri_parts[0] == 'corpus' and len(uri_parts) > 1:
@@ -55,6 +91,7 @@ class File(mongoengine.EmbeddedDocument):
                     SET f.corpus_id = $corpus_id
                     SET f.is_image = $is_image
                     SET f.external = $is_external
+                    SET f.iiif_path = $iiif_path
                     MERGE (n) -[rel:hasFile]-> (f)
                 '''.format(content_type=content_type),
                 {
@@ -63,7 +100,8 @@ class File(mongoengine.EmbeddedDocument):
                     'corpus_id': corpus_id,
                     'file_path': self.path,
                     'is_image': self.is_image,
-                    'is_external': bool(self.iiif_info)
+                    'is_external': bool(self.iiif_info),
+                    'iiif_path': self.iiif_path
                 }
             )
 
@@ -94,13 +132,11 @@ class File(mongoengine.EmbeddedDocument):
             file.provenance_id = prov_id
 
             if file.extension.lower() in settings.VALID_IMAGE_EXTENSIONS:
-                img = Image.open(file.path)
-                file.width, file.height = img.size
+                file.width, file.height = get_image_size(file.path)
 
         elif external_iiif:
-            req = requests.get(path + '/info.json')
-            if req.status_code == 200:
-                iiif_info = req.json()
+            iiif_info = cls.get_iiif_info(path)
+            if iiif_info:
                 if 'height' in iiif_info and 'width' in iiif_info:
                     file = File()
                     file.path = path
@@ -117,6 +153,46 @@ class File(mongoengine.EmbeddedDocument):
 
         return file
 
+    @classmethod
+    def get_iiif_info(cls, path, session=None):
+        """
+        Fetch the info.json for an external IIIF image, using the copy cached in Redis if there is one.
+
+        Returns:
+            dict: The parsed info.json, or None if it couldn't be retrieved.
+        """
+
+        cache = redis.Redis(host=settings.REDIS_HOST, decode_responses=True)
+        cache_key = "/iiif_info/{0}".format(path)
+
+        iiif_info = cache.get(cache_key)
+        if iiif_info:
+            return json.loads(iiif_info)
+
+        req = (session or requests).get(path + '/info.json', timeout=30)
+        if req.status_code == 200:
+            iiif_info = req.json()
+            cache.set(cache_key, json.dumps(iiif_info), ex=settings.IIIF_INFO_CACHE_SECONDS)
+            return iiif_info
+        return None
+
+    @classmethod
+    def prefetch_iiif_info(cls, paths, max_workers=8):
+        """
+        Fetch and cache the info.json for many external IIIF images at once, so that subsequent calls to process for
+        each of them don't have to wait on their image servers one at a time.
+        """
+
+        def fetch(path):
+            try:
+                return path, cls.get_iiif_info(path, session)
+            except:
+                return path, None
+
+        with requests.Session() as session:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                return dict(executor.map(fetch, paths))
+
     @classmethod
     def generate_key(cls, path):
         return zlib.compress(path.encode('utf-8')).hex()
@@ -141,6 +217,7 @@ class File(mongoengine.EmbeddedDocument):
                 break
 
         if valid:
+            file.iiif_path = file_dict.get('iiif_path')
             return file
         return None
 
@@ -160,5 +237,6 @@ class File(mongoengine.EmbeddedDocument):
             'width': self.width,
             'is_image': self.is_image,
             'iiif_info': self.iiif_info,
+            'iiif_path': self.iiif_path,
             'collection_label': self.collection_label
         }
\ No newline at end of file
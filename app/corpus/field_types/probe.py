@@ -0,0 +1,155 @@
+import struct
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+JP2_SIGNATURE = b'\x00\x00\x00\x0cjP  \r\n\x87\n'
+J2K_SIGNATURE = b'\xff\x4f\xff\x51'
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+
+
+def get_image_size(path):
+    """
+    Get the width and height of an image, reading only as much of the file as is needed to find them.
+
+    PNG, JPEG, TIFF, and JPEG 2000 dimensions are parsed directly out of the file's header bytes. Anything else (or
+    anything that can't be parsed) falls back to having Pillow open the image.
+
+    Returns:
+        tuple: The image's (width, height).
+    """
+
+    try:
+        size = probe_image_size(path)
+        if size:
+            return size
+    except (struct.error, ValueError, OSError):
+        pass
+
+    from PIL import Image
+    with Image.open(path) as img:
+        return img.size
+
+
+def probe_image_size(path):
+    with open(path, 'rb') as image_in:
+        header = image_in.read(16)
+
+        if header.startswith(PNG_SIGNATURE):
+            image_in.seek(16)
+            return struct.unpack('>II', image_in.read(8))
+        elif header.startswith(b'\xff\xd8'):
+            return _probe_jpeg(image_in)
+        elif header[:4] in [b'II*\x00', b'MM\x00*', b'II+\x00', b'MM\x00+']:
+            return _probe_tiff(image_in, header)
+        elif header.startswith(JP2_SIGNATURE):
+            return _probe_jp2(image_in)
+        elif header.startswith(J2K_SIGNATURE):
+            image_in.seek(0)
+            return _probe_j2k_codestream(image_in)
+    return None
+
+
+def _probe_jpeg(image_in):
+    image_in.seek(2)
+    while True:
+        byte = image_in.read(1)
+        if not byte:
+            return None
+        if byte != b'\xff':
+            continue
+
+        # any number of fill bytes may precede a marker
+        marker = image_in.read(1)
+        while marker == b'\xff':
+            marker = image_in.read(1)
+        if not marker:
+            return None
+
+        marker = marker[0]
+        if marker in JPEG_STANDALONE_MARKERS or marker == 0x00:
+            continue
+
+        segment_length = struct.unpack('>H', image_in.read(2))[0]
+        if marker in JPEG_SOF_MARKERS:
+            precision, height, width = struct.unpack('>BHH', image_in.read(5))
+            return width, height
+        elif marker in [0xD9, 0xDA]:
+            return None
+
+        image_in.seek(segment_length - 2, 1)
+
+
+def _probe_tiff(image_in, header):
+    byte_order = '<' if header[:2] == b'II' else '>'
+    big_tiff = struct.unpack(byte_order + 'H', header[2:4])[0] == 43
+
+    if big_tiff:
+        ifd_offset = struct.unpack(byte_order + 'Q', header[8:16])[0]
+        image_in.seek(ifd_offset)
+        num_entries = struct.unpack(byte_order + 'Q', image_in.read(8))[0]
+        entry_format = 'HHQ8s'
+    else:
+        ifd_offset = struct.unpack(byte_order + 'I', header[4:8])[0]
+        image_in.seek(ifd_offset)
+        num_entries = struct.unpack(byte_order + 'H', image_in.read(2))[0]
+        entry_format = 'HHI4s'
+
+    entry_size = struct.calcsize(byte_order + entry_format)
+    entries = image_in.read(num_entries * entry_size)
+    width = height = None
+
+    for entry_index in range(0, num_entries):
+        tag, field_type, count, value = struct.unpack_from(byte_order + entry_format, entries, entry_index * entry_size)
+        if tag in [256, 257]:
+            # width and height are stored as SHORT, LONG, or (in BigTIFF) LONG8 values
+            value_format = {3: 'H', 4: 'I', 16: 'Q'}.get(field_type)
+            if not value_format:
+                return None
+            dimension = struct.unpack_from(byte_order + value_format, value)[0]
+            if tag == 256:
+                width = dimension
+            else:
+                height = dimension
+
+        if width is not None and height is not None:
+            return width, height
+    return None
+
+
+def _probe_jp2(image_in):
+    image_in.seek(len(JP2_SIGNATURE))
+    box_end = None
+
+    while True:
+        box_start = image_in.tell()
+        box_header = image_in.read(8)
+        if len(box_header) < 8:
+            return None
+
+        box_length, box_type = struct.unpack('>I4s', box_header)
+        if box_length == 1:
+            box_length = struct.unpack('>Q', image_in.read(8))[0]
+
+        if box_type == b'jp2h':
+            # the image header box is the first box inside the jp2 header superbox
+            box_end = box_start + box_length if box_length else None
+            continue
+        elif box_type == b'ihdr':
+            height, width = struct.unpack('>II', image_in.read(8))
+            return width, height
+        elif box_type == b'jp2c':
+            return _probe_j2k_codestream(image_in)
+        elif box_length == 0 or (box_end and box_start >= box_end):
+            return None
+
+        image_in.seek(box_start + box_length)
+
+
+def _probe_j2k_codestream(image_in):
+    marker, siz_marker, siz_length, capabilities = struct.unpack('>HHHH', image_in.read(8))
+    if marker != 0xFF4F or siz_marker != 0xFF51:
+        return None
+
+    x_size, y_size, x_offset, y_offset = struct.unpack('>IIII', image_in.read(16))
+    return x_size - x_offset, y_size - y_offset
@@ -0,0 +1,118 @@
+import os
+import zlib
+import struct
+from PIL import Image
+
+
+SHORT = 3
+LONG = 4
+
+COMPRESSION_DEFLATE = 8
+PHOTOMETRIC_MINISBLACK = 1
+PHOTOMETRIC_RGB = 2
+SUBFILE_REDUCED_IMAGE = 1
+
+MAX_CLASSIC_TIFF_BYTES = 2 ** 32 - 1
+
+
+def save_pyramidal_tiff(image, path, tile_size=512, compression_level=6):
+    """
+    Write an image as a tiled, multi-resolution ("pyramidal") TIFF.
+
+    The full resolution image is written to the first IFD and each following IFD holds the previous level reduced by
+    half, down to the first level that fits within a single tile. Every level is cut into tile_size x tile_size,
+    deflate-compressed tiles so that an image server can decode only the tiles a request needs from the level closest
+    to the requested scale, rather than decoding the entire source image.
+
+    Args:
+        image (PIL.Image.Image): The image to write. Images not in L or RGB mode are converted to RGB.
+        path (str): Where to write the TIFF. The file is written to a temporary path and moved into place when done.
+        tile_size (int): Width and height of each tile. Must be a multiple of 16.
+        compression_level (int): The zlib compression level for tiles.
+    """
+
+    if image.mode not in ['L', 'RGB']:
+        image = image.convert('RGB')
+
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as tiff_out:
+        # little-endian header with the offset of the first IFD patched in once it's written
+        tiff_out.write(b'II' + struct.pack('<HI', 42, 0))
+        next_ifd_pointer = 4
+
+        level = image
+        level_index = 0
+        while True:
+            tile_offsets = []
+            tile_byte_counts = []
+            for tile_y in range(0, level.height, tile_size):
+                for tile_x in range(0, level.width, tile_size):
+                    # cropping past the edge of the image pads edge tiles out to the full tile size
+                    tile = level.crop((tile_x, tile_y, tile_x + tile_size, tile_y + tile_size))
+                    tile_data = zlib.compress(tile.tobytes(), compression_level)
+                    tile_offsets.append(tiff_out.tell())
+                    tile_byte_counts.append(len(tile_data))
+                    tiff_out.write(tile_data)
+
+            if tiff_out.tell() % 2:
+                tiff_out.write(b'\x00')
+
+            ifd_offset = tiff_out.tell()
+            tiff_out.seek(next_ifd_pointer)
+            tiff_out.write(struct.pack('<I', ifd_offset))
+            tiff_out.seek(ifd_offset)
+
+            samples_per_pixel = len(level.getbands())
+            next_ifd_pointer = _write_ifd(tiff_out, ifd_offset, [
+                (254, LONG, [SUBFILE_REDUCED_IMAGE if level_index else 0]),
+                (256, LONG, [level.width]),
+                (257, LONG, [level.height]),
+                (258, SHORT, [8] * samples_per_pixel),
+                (259, SHORT, [COMPRESSION_DEFLATE]),
+                (262, SHORT, [PHOTOMETRIC_RGB if samples_per_pixel == 3 else PHOTOMETRIC_MINISBLACK]),
+                (277, SHORT, [samples_per_pixel]),
+                (284, SHORT, [1]),
+                (322, LONG, [tile_size]),
+                (323, LONG, [tile_size]),
+                (324, LONG, tile_offsets),
+                (325, LONG, tile_byte_counts),
+            ])
+
+            if tiff_out.tell() > MAX_CLASSIC_TIFF_BYTES:
+                raise ValueError("Image is too large to be written as a classic TIFF.")
+
+            if level.width <= tile_size and level.height <= tile_size:
+                break
+
+            level = level.reduce(2)
+            level_index += 1
+
+    os.replace(temp_path, path)
+
+
+def _write_ifd(tiff_out, ifd_offset, entries):
+    # values that don't fit in an entry's four byte value field are written after the IFD itself
+    extra_offset = ifd_offset + 2 + (12 * len(entries)) + 4
+    entry_data = b''
+    extra_data = b''
+
+    for tag, field_type, values in entries:
+        value_data = struct.pack('<{0}{1}'.format(len(values), 'H' if field_type == SHORT else 'I'), *values)
+        if len(value_data) <= 4:
+            entry_data += struct.pack('<HHI', tag, field_type, len(values)) + value_data.ljust(4, b'\x00')
+        else:
+            entry_data += struct.pack('<HHII', tag, field_type, len(values), extra_offset + len(extra_data))
+            extra_data += value_data
+            if len(extra_data) % 2:
+                extra_data += b'\x00'
+
+    tiff_out.write(struct.pack('<H', len(entries)) + entry_data)
+    next_ifd_pointer = tiff_out.tell()
+    tiff_out.write(struct.pack('<I', 0) + extra_data)
+    return next_ifd_pointer
+
+
+def make_pyramidal_derivative(source_path, derivative_path, tile_size=512):
+    with Image.open(source_path) as source_image:
+        save_pyramidal_tiff(source_image, derivative_path, tile_size=tile_size)
+    return derivative_path
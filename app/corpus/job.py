@@ -456,7 +456,10 @@ class JobTracker(mongoengine.Document):
             else:
                 self.report("\nCORPORA JOB COMPLETE")
 
-        if self.content and self.task and self.task.track_provenance:
+        content_id = self.corpus_id if self.content_type == 'Corpus' else self.content_id
+        if self.corpus and content_id and self.task and self.task.track_provenance:
+            from .provenance import record_provenance
+
             scholar_name = "None"
             if self.scholar:
                 scholar_name = f"{self.scholar.fname} {self.scholar.lname} ({self.scholar.username})".strip()
@@ -473,12 +476,9 @@ class JobTracker(mongoengine.Document):
             ct.status = self.status
             ct.error = self.error
 
-            self.content.provenance.append(ct)
-
-            while len(self.content.provenance) > settings.MAX_CONTENT_PROVENANCE:
-                self.content.provenance.pop(0)
-
-            self.content.save()
+            # provenance is inserted into its own collection rather than saved with the content, so the content
+            # doesn't need to be loaded or resaved
+            record_provenance(self.corpus, self.content_type, content_id, ct)
 
         self.publish_status()
         self.delete()
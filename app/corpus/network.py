@@ -0,0 +1,258 @@
+"""
+The network engine builds the network JSON for a piece of content (see the network-json API view): the content's
+neighbors, grouped by relationship and content type, and the destinations of any "collapsed" paths (paths that pass
+through one or more proxy content types, drawn as a single edge).
+
+The whole network is found with a single Cypher query. Only the origin node's label, which must be one of the corpus'
+content types, is written into the query; everything else (URIs, excluded content types, content view filters,
+paging, and the content types along collapsed paths) is passed as parameters, so the query's text depends only on
+the origin content type and the number and length of the collapsed paths, and Neo4J can reuse its plan.
+
+Finished networks are cached in Redis, keyed by the corpus' graph version (see Corpus.bump_graph_version), which
+changes whenever nodes or relationships in the corpus' graph are written, so cached networks are never stale.
+"""
+import json
+import hashlib
+from django.conf import settings
+from .utilities import run_neo, async_run_neo, get_async_redis, build_path_network_json
+
+
+NETWORK_QUERY = '''
+    OPTIONAL MATCH (a:`{origin}` {{ uri: $uri }})
+    WITH a, ($origin_view IS NULL OR EXISTS {{ (a) <-[:hasContent]- (:_ContentView {{ uri: $origin_view }}) }}) AS origin_in_view
+    CALL {{
+        WITH a, origin_in_view
+        MATCH path = (a) -[b]- (c)
+        WHERE ANY(l IN labels(c) WHERE NOT l STARTS WITH '_')
+        AND NONE(l IN labels(a) + labels(c) WHERE l IN $excluded_cts)
+        WITH type(b) AS rel, labels(c) AS cts, count(*) AS count, collect(
+            CASE WHEN origin_in_view AND $paths_wanted AND ($target_ct = '' OR labels(c)[0] = $target_ct)
+            AND ($filters[labels(c)[0]] IS NULL OR EXISTS {{ (c) <-[:hasContent]- (:_ContentView {{ uri: $filters[labels(c)[0]] }}) }})
+            THEN path END
+        ) AS paths
+        RETURN collect({{ rel: rel, cts: cts, count: count, paths: paths[$skip..$skip + $limit] }}) AS relationships
+    }}
+    {collapses}
+    RETURN a, relationships{collapse_returns}
+'''
+
+NETWORK_COLLAPSE_QUERY = '''
+    CALL {{
+        WITH a, origin_in_view
+        MATCH path = (a) -- {proxy_path} -- (c)
+        WHERE origin_in_view
+        AND {proxy_labels}
+        AND $collapses[{index}].to_ct IN labels(c)
+        AND NONE(l IN labels(a) + labels(c) WHERE l IN $excluded_cts)
+        AND ($filters[$collapses[{index}].to_ct] IS NULL OR EXISTS {{ (c) <-[:hasContent]- (:_ContentView {{ uri: $filters[$collapses[{index}].to_ct] }}) }})
+        WITH c, count(path) AS freq
+        WITH collect({{ node: c, freq: freq }}) AS destinations, sum(freq) AS count
+        RETURN {{
+            count: count,
+            destinations: CASE WHEN $collapses[{index}].wanted THEN destinations[$skip..$skip + $limit] ELSE [] END
+        }} AS collapse_{index}
+    }}
+'''
+
+
+def get_graph_version_key(corpus_id):
+    return "/corpus/{0}/graph_version".format(corpus_id)
+
+
+def get_network_cache_key(corpus_id, graph_version, content_type, content_id, params):
+    query_key = json.dumps([
+        content_type,
+        content_id,
+        params.per_type_limit,
+        params.per_type_skip,
+        params.meta_only,
+        params.is_seed,
+        params.target_ct,
+        sorted(params.filters.items()),
+        params.collapses,
+        sorted(params.excluded_cts)
+    ], sort_keys=True)
+
+    return "/corpus/{0}/network/{1}/{2}".format(
+        corpus_id,
+        graph_version,
+        hashlib.sha1(query_key.encode('utf-8')).hexdigest()
+    )
+
+
+def clean_network_params(corpus, params):
+    # collapsed paths may only pass through and lead to the corpus' content types
+    params.collapses = [
+        collapse for collapse in params.collapses
+        if all(ct in corpus.content_types for ct in [collapse['from_ct'], collapse['to_ct']] + collapse['proxy_ct'].split('.'))
+    ]
+    return params
+
+
+def build_network_query(content_type, content_uri, params):
+    """
+    Build the Cypher query and parameters for the network of the content with the given URI. The content type must
+    have already been checked against the corpus' content types, as it's the only value written into the query.
+    """
+
+    collapses = []
+    collapse_params = []
+    for index, collapse in enumerate(params.collapses):
+        proxy_cts = collapse['proxy_ct'].split('.')
+        collapses.append(NETWORK_COLLAPSE_QUERY.format(
+            index=index,
+            proxy_path=" -- ".join(["(b{0})".format(proxy_index) for proxy_index in range(0, len(proxy_cts))]),
+            proxy_labels=" AND ".join([
+                "$collapses[{0}].proxy_cts[{1}] IN labels(b{1})".format(index, proxy_index)
+                for proxy_index in range(0, len(proxy_cts))
+            ])
+        ))
+        collapse_params.append({
+            'proxy_cts': proxy_cts,
+            'to_ct': collapse['to_ct'],
+            'wanted': not params.meta_only and (not params.target_ct or params.target_ct == collapse['to_ct'])
+        })
+
+    cypher = NETWORK_QUERY.format(
+        origin=content_type,
+        collapses="".join(collapses),
+        collapse_returns="".join([", collapse_{0}".format(index) for index in range(0, len(collapses))])
+    )
+
+    return cypher, {
+        'uri': content_uri,
+        'origin_view': params.filters.get(content_type),
+        'excluded_cts': params.excluded_cts,
+        'paths_wanted': not params.meta_only,
+        'target_ct': params.target_ct,
+        'filters': params.filters,
+        'collapses': collapse_params,
+        'skip': params.per_type_skip,
+        'limit': params.per_type_limit
+    }
+
+
+def make_network_json(content_type, content_uri, record, params):
+    network_json = {
+        'nodes': [],
+        'edges': [],
+        'meta': {}
+    }
+
+    if not record:
+        return network_json
+
+    for relationship in record['relationships']:
+        if relationship['paths']:
+            rel_net_json = build_path_network_json(relationship['paths'])
+            node_uris = [n['id'] for n in network_json['nodes']]
+            network_json['nodes'] += [n for n in rel_net_json['nodes'] if n['id'] not in node_uris]
+            network_json['edges'] += rel_net_json['edges']
+
+        path_key = "{0}-{1}".format(relationship['rel'], relationship['cts'][0])
+        network_json['meta'][path_key] = {
+            'count': relationship['count'],
+            'skip': params.per_type_skip,
+            'limit': params.per_type_limit,
+            'collapsed': False
+        }
+
+    node_uris = [n['id'] for n in network_json['nodes']]
+
+    for index, collapse in enumerate(params.collapses):
+        collapse_result = record['collapse_{0}'.format(index)]
+        path_key = "{0}-{1}-{2}".format(
+            collapse['from_ct'],
+            collapse['proxy_ct'],
+            collapse['to_ct']
+        )
+        network_json['meta'][path_key] = {
+            'count': collapse_result['count'],
+            'skip': params.per_type_skip,
+            'limit': params.per_type_limit,
+            'collapsed': True
+        }
+
+        for destination in collapse_result['destinations']:
+            uri = destination['node'].get('uri')
+            if uri not in node_uris:
+                network_json['nodes'].append({
+                    'group': collapse['to_ct'],
+                    'id': uri,
+                    'label': destination['node'].get('label')
+                })
+                node_uris.append(uri)
+                network_json['edges'].append({
+                    'from': content_uri,
+                    'id': content_uri + '-' + uri,
+                    'title': 'has{0}via{1}'.format(collapse['to_ct'], collapse['proxy_ct']),
+                    'to': uri,
+                    'freq': destination['freq']
+                })
+
+    if params.is_seed and record['a'] and content_uri not in node_uris:
+        network_json['nodes'].append({
+            'id': content_uri,
+            'group': content_type,
+            'label': record['a'].get('label')
+        })
+
+    return network_json
+
+
+def get_network(corpus, content_type, content_id, params):
+    """
+    Get the network JSON for a piece of content, from the cache when the corpus' graph hasn't changed since it was
+    last built.
+
+    Args:
+        corpus (Corpus): The corpus the content belongs to.
+        content_type (str): The name of the content's Content Type, which must be one of the corpus' content types.
+        content_id (str): The ID of the content.
+        params (SimpleNamespace): Paging, filter, exclusion, and collapse parameters (see _get_network_params in
+            manager.views).
+
+    Returns:
+        dict: The network's nodes, edges, and the count and paging of each group of neighbors ("meta").
+    """
+
+    params = clean_network_params(corpus, params)
+    content_uri = "/corpus/{0}/{1}/{2}".format(corpus.id, content_type, content_id)
+    cache_key = get_network_cache_key(corpus.id, corpus.get_graph_version(), content_type, content_id, params)
+
+    cached = corpus.redis_cache.get(cache_key)
+    if cached:
+        return json.loads(cached)
+
+    cypher, cypher_params = build_network_query(content_type, content_uri, params)
+    results = run_neo(cypher, cypher_params)
+    network_json = make_network_json(content_type, content_uri, results[0] if results else None, params)
+
+    # errors running the query aren't cached
+    if results is not None:
+        corpus.redis_cache.set(cache_key, json.dumps(network_json), ex=settings.NETWORK_CACHE_SECONDS)
+    return network_json
+
+
+async def aget_network(corpus, content_type, content_id, params):
+    """
+    Async version of get_network.
+    """
+
+    cache = get_async_redis()
+    params = clean_network_params(corpus, params)
+    content_uri = "/corpus/{0}/{1}/{2}".format(corpus.id, content_type, content_id)
+    graph_version = await cache.get(get_graph_version_key(corpus.id)) or '0'
+    cache_key = get_network_cache_key(corpus.id, graph_version, content_type, content_id, params)
+
+    cached = await cache.get(cache_key)
+    if cached:
+        return json.loads(cached)
+
+    cypher, cypher_params = build_network_query(content_type, content_uri, params)
+    results = await async_run_neo(cypher, cypher_params)
+    network_json = make_network_json(content_type, content_uri, results[0] if results else None, params)
+
+    if results is not None:
+        await cache.set(cache_key, json.dumps(network_json), ex=settings.NETWORK_CACHE_SECONDS)
+    return network_json
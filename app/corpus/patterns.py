@@ -0,0 +1,192 @@
+"""
+Pattern counts are the number of a content type's content matching a pattern of association in the graph (see
+parse_graph_steps), as shown while building a content view, or, with a terms aggregation, the content each matching
+piece of content is associated with along the pattern's last step.
+
+Counts are cached in Redis per corpus, pattern, and graph version (see Corpus.bump_graph_version), so a pattern is only
+counted again once the corpus' graph has changed. Counting a pattern that isn't limited to any particular content and
+whose target content type has more than settings.PATTERN_COUNT_SYNC_LIMIT nodes is left to the count_graph_pattern
+task, one at a time per pattern whatever the graph version (which changes with every save while a corpus is being
+edited). Until it finishes, the pattern's last exact count is returned, flagged as approximate, or failing that, an
+approximation taken from Neo4J's count store (which holds the number of nodes with each label without any querying)
+and the number of the corpus' content of the target content type.
+"""
+import json
+import hashlib
+import traceback
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .utilities import run_neo, async_run_neo, get_async_redis, get_async_mongo, build_cypher_from_graph_steps
+from .network import get_graph_version_key
+
+
+def get_pattern_hash(target_ct, graph_steps, terms_aggregation):
+    pattern_key = json.dumps([
+        target_ct,
+        [[step_info['direction'], step_info['ct'], sorted(step_info['ids'])] for step_info in graph_steps.values()],
+        terms_aggregation
+    ])
+    return hashlib.sha1(pattern_key.encode('utf-8')).hexdigest()
+
+
+def get_pattern_cache_key(corpus_id, graph_version, target_ct, graph_steps, terms_aggregation):
+    return "/corpus/{0}/pattern_count/{1}/{2}".format(
+        corpus_id,
+        graph_version,
+        get_pattern_hash(target_ct, graph_steps, terms_aggregation)
+    )
+
+
+def get_pattern_key(corpus_id, target_ct, graph_steps):
+    # keys the count in progress and the last exact count of a large pattern, across graph versions
+    return "/corpus/{0}/pattern_count/{1}".format(corpus_id, get_pattern_hash(target_ct, graph_steps, False))
+
+
+def build_pattern_count_query(corpus_id, target_ct, graph_steps, terms_aggregation=False):
+    cypher, params = build_cypher_from_graph_steps(corpus_id, target_ct, graph_steps)
+
+    if terms_aggregation:
+        last_ct = list(graph_steps.keys())[-1]
+        cypher += f'''
+            RETURN target.id AS rootID,
+            COUNT(DISTINCT ct{last_ct}.id) as leafCount,
+            COLLECT(DISTINCT ct{last_ct}.id) AS leafIDs
+            ORDER BY leafCount DESC
+        '''
+    else:
+        cypher += "\nRETURN count(distinct target)"
+
+    return cypher, params
+
+
+def read_pattern_count(results, terms_aggregation=False):
+    if terms_aggregation:
+        return {result['rootID']: result['leafIDs'] for result in results}
+    return {'count': results[0].value() if results else 0}
+
+
+def build_label_count_query(target_ct):
+    # a count of all nodes with a single label is answered from the count store
+    return "MATCH (n:`{0}`) RETURN count(n)".format(target_ct)
+
+
+def is_large_pattern(graph_steps, target_label_count):
+    # limiting any step to particular content keeps the pattern small however many nodes there are
+    if any(step_info['ids'] for step_info in graph_steps.values()):
+        return False
+    return target_label_count > settings.PATTERN_COUNT_SYNC_LIMIT
+
+
+def get_content_collection_name(corpus_id, target_ct):
+    return "corpus_{0}_{1}".format(corpus_id, target_ct)
+
+
+def count_pattern(corpus, target_ct, graph_steps, terms_aggregation=False):
+    """
+    Count the content of a content type matching a pattern of association, or, for large patterns, approximate it
+    while the exact count is made in the background.
+
+    Args:
+        corpus (Corpus): The corpus the content belongs to.
+        target_ct (str): The name of the content type being counted, which must be one of the corpus' content types.
+        graph_steps (dict): The steps of the pattern, as returned by parse_graph_steps.
+        terms_aggregation (bool): Whether to return the IDs of the content each matching piece of content is
+            associated with along the pattern's last step instead of a count. These are never approximated.
+
+    Returns:
+        dict: The count ("count"), with "approximate" set to True when it's an approximation, or for a terms
+            aggregation, the IDs of the associated content keyed by the ID of each piece of matching content.
+    """
+
+    cache_key = get_pattern_cache_key(corpus.id, corpus.get_graph_version(), target_ct, graph_steps, terms_aggregation)
+    cached = corpus.redis_cache.get(cache_key)
+    if cached:
+        return json.loads(cached)
+
+    if not terms_aggregation:
+        label_count = run_neo(build_label_count_query(target_ct))
+        target_label_count = label_count[0].value() if label_count else 0
+
+        if is_large_pattern(graph_steps, target_label_count):
+            # only one count of the same pattern is queued at a time
+            pattern_key = get_pattern_key(corpus.id, target_ct, graph_steps)
+            if corpus.redis_cache.set(pattern_key + '/counting', 1, nx=True, ex=settings.PATTERN_COUNT_JOB_SECONDS):
+                from manager.tasks import count_graph_pattern
+                count_graph_pattern(str(corpus.id), target_ct, graph_steps)
+
+            last_count = corpus.redis_cache.get(pattern_key + '/last')
+            if last_count:
+                return dict(json.loads(last_count), approximate=True)
+
+            content_count = corpus._get_db()[get_content_collection_name(corpus.id, target_ct)].estimated_document_count()
+            return {'count': min(target_label_count, content_count), 'approximate': True}
+
+    cypher, params = build_pattern_count_query(corpus.id, target_ct, graph_steps, terms_aggregation)
+    results = run_neo(cypher, params)
+    pattern_count = read_pattern_count(results or [], terms_aggregation)
+
+    # errors running the query aren't cached
+    if results is not None:
+        corpus.redis_cache.set(cache_key, json.dumps(pattern_count), ex=settings.PATTERN_COUNT_CACHE_SECONDS)
+    return pattern_count
+
+
+async def acount_pattern(corpus, target_ct, graph_steps, terms_aggregation=False):
+    """
+    Async version of count_pattern.
+    """
+
+    cache = get_async_redis()
+    graph_version = await cache.get(get_graph_version_key(corpus.id)) or '0'
+    cache_key = get_pattern_cache_key(corpus.id, graph_version, target_ct, graph_steps, terms_aggregation)
+    cached = await cache.get(cache_key)
+    if cached:
+        return json.loads(cached)
+
+    if not terms_aggregation:
+        label_count = await async_run_neo(build_label_count_query(target_ct))
+        target_label_count = label_count[0].value() if label_count else 0
+
+        if is_large_pattern(graph_steps, target_label_count):
+            pattern_key = get_pattern_key(corpus.id, target_ct, graph_steps)
+            if await cache.set(pattern_key + '/counting', 1, nx=True, ex=settings.PATTERN_COUNT_JOB_SECONDS):
+                from manager.tasks import count_graph_pattern
+                await sync_to_async(count_graph_pattern, thread_sensitive=False)(str(corpus.id), target_ct, graph_steps)
+
+            last_count = await cache.get(pattern_key + '/last')
+            if last_count:
+                return dict(json.loads(last_count), approximate=True)
+
+            content_count = await get_async_mongo()[get_content_collection_name(corpus.id, target_ct)].estimated_document_count()
+            return {'count': min(target_label_count, content_count), 'approximate': True}
+
+    cypher, params = build_pattern_count_query(corpus.id, target_ct, graph_steps, terms_aggregation)
+    results = await async_run_neo(cypher, params)
+    pattern_count = read_pattern_count(results or [], terms_aggregation)
+
+    if results is not None:
+        await cache.set(cache_key, json.dumps(pattern_count), ex=settings.PATTERN_COUNT_CACHE_SECONDS)
+    return pattern_count
+
+
+def run_pattern_count(corpus, target_ct, graph_steps):
+    """
+    Make the exact count for a large pattern, caching it under the graph version it was counted at, and keeping it as
+    the pattern's last exact count.
+    """
+
+    pattern_key = get_pattern_key(corpus.id, target_ct, graph_steps)
+    try:
+        # the graph may change while the pattern's counted, so the count is cached under the version it started at
+        cache_key = get_pattern_cache_key(corpus.id, corpus.get_graph_version(), target_ct, graph_steps, False)
+        cypher, params = build_pattern_count_query(corpus.id, target_ct, graph_steps)
+        results = run_neo(cypher, params)
+        if results is not None:
+            pattern_count = json.dumps(read_pattern_count(results))
+            corpus.redis_cache.set(cache_key, pattern_count, ex=settings.PATTERN_COUNT_CACHE_SECONDS)
+            corpus.redis_cache.set(pattern_key + '/last', pattern_count, ex=settings.PATTERN_COUNT_CACHE_SECONDS)
+    except:
+        print("Error counting pattern for {0} in corpus {1}:".format(target_ct, corpus.id))
+        print(traceback.format_exc())
+    finally:
+        corpus.redis_cache.delete(pattern_key + '/counting')
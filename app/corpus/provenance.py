@@ -0,0 +1,218 @@
+"""
+Provenance is the record of the tasks completed for a corpus or a piece of its content (see JobTracker.complete),
+shown alongside it so that jobs can be reviewed and retried.
+
+Each corpus has a single MongoDB collection of provenance records, one per completed task, keyed by the content type
+("Corpus" for the corpus itself) and ID of the content the task ran on. Records are only ever inserted, never
+rewritten, so recording provenance doesn't resave content, and content documents and their index documents don't
+carry their history around. Provenance is only read when asked for (i.e. with the include-provenance parameter of the
+corpus and content API views).
+
+Two retention policies apply: only the settings.MAX_CONTENT_PROVENANCE most recent records are kept for each piece of
+content, and, when settings.PROVENANCE_RETENTION_DAYS is set, records older than that are expired by MongoDB.
+"""
+import traceback
+from datetime import datetime, timezone
+from django.conf import settings
+from pymongo.errors import OperationFailure
+from .job import CompletedTask
+from .utilities import get_async_mongo
+
+
+PROVENANCE_FIELDS = [
+    'job_id',
+    'task_name',
+    'task_version',
+    'task_configuration',
+    'scholar_name',
+    'submitted',
+    'completed',
+    'status',
+    'report_path',
+    'error'
+]
+
+known_provenance_collections = set()
+
+
+def get_provenance_collection_name(corpus_id):
+    # content type names can't begin with an underscore, so this can't collide with a content type's collection
+    return "corpus_{0}__provenance".format(corpus_id)
+
+
+def get_provenance_version_key(corpus_id):
+    return "/corpus/{0}/provenance_version".format(corpus_id)
+
+
+def ensure_provenance_collection(corpus):
+    collection_name = get_provenance_collection_name(corpus.id)
+    collection = corpus._get_db()[collection_name]
+
+    if collection_name not in known_provenance_collections:
+        collection.create_index([('content_type', 1), ('content_id', 1), ('_id', -1)], name='content_provenance')
+
+        retention_seconds = settings.PROVENANCE_RETENTION_DAYS * 86400
+        if retention_seconds:
+            try:
+                collection.create_index('recorded', name='provenance_retention', expireAfterSeconds=retention_seconds)
+            except OperationFailure:
+                # the retention period has changed since the index was made
+                corpus._get_db().command('collMod', collection_name, index={
+                    'name': 'provenance_retention',
+                    'expireAfterSeconds': retention_seconds
+                })
+        elif 'provenance_retention' in collection.index_information():
+            collection.drop_index('provenance_retention')
+
+        known_provenance_collections.add(collection_name)
+    return collection
+
+
+def drop_provenance_collection(corpus):
+    collection_name = get_provenance_collection_name(corpus.id)
+    corpus._get_db().drop_collection(collection_name)
+    known_provenance_collections.discard(collection_name)
+    corpus.redis_cache.incr(get_provenance_version_key(corpus.id))
+
+
+def make_provenance_record(content_type, content_id, completed_task):
+    record = {
+        'content_type': content_type,
+        'content_id': str(content_id),
+        'recorded': datetime.now(timezone.utc)
+    }
+    for attr in PROVENANCE_FIELDS:
+        record[attr] = getattr(completed_task, attr)
+    return record
+
+
+def record_provenance(corpus, content_type, content_id, completed_task):
+    """
+    Record a completed task for a piece of content (or, with a content type of "Corpus", for the corpus), dropping that
+    content's oldest records beyond settings.MAX_CONTENT_PROVENANCE.
+    """
+
+    try:
+        collection = ensure_provenance_collection(corpus)
+        collection.insert_one(make_provenance_record(content_type, content_id, completed_task))
+
+        content_query = {'content_type': content_type, 'content_id': str(content_id)}
+        stale_records = collection.find(content_query, {'_id': 1}).sort('_id', -1).skip(settings.MAX_CONTENT_PROVENANCE).limit(1)
+        for stale_record in stale_records:
+            collection.delete_many(dict(content_query, _id={'$lte': stale_record['_id']}))
+
+        corpus.redis_cache.incr(get_provenance_version_key(corpus.id))
+    except:
+        print("Error recording provenance for {0} {1} in corpus {2}:".format(content_type, content_id, corpus.id))
+        print(traceback.format_exc())
+
+
+def record_provenance_batch(corpus, content_type, completed_tasks):
+    """
+    Insert the provenance records for many pieces of content at once, given (content ID, CompletedTask) pairs, as when
+    moving provenance embedded in content documents into the provenance collection. The per content limit isn't
+    enforced here.
+    """
+
+    records = [make_provenance_record(content_type, content_id, completed_task) for content_id, completed_task in completed_tasks]
+    if records:
+        ensure_provenance_collection(corpus).insert_many(records, ordered=False)
+        corpus.redis_cache.incr(get_provenance_version_key(corpus.id))
+
+
+def read_provenance_record(record):
+    return CompletedTask.from_dict({attr: record[attr] for attr in PROVENANCE_FIELDS if record.get(attr) is not None})
+
+
+def get_provenance_query(content_type, content_id, job_id=None):
+    query = {'content_type': content_type, 'content_id': str(content_id)}
+    if job_id:
+        query['job_id'] = job_id
+    return query
+
+
+def get_provenance(corpus, content_type, content_id):
+    """
+    Get the provenance of a piece of content (or, with a content type of "Corpus", of the corpus).
+
+    Returns:
+        list[CompletedTask]: The content's completed tasks, oldest first.
+    """
+
+    records = corpus._get_db()[get_provenance_collection_name(corpus.id)].find(
+        get_provenance_query(content_type, content_id)
+    ).sort('_id', -1).limit(settings.MAX_CONTENT_PROVENANCE)
+    return [read_provenance_record(record) for record in reversed(list(records))]
+
+
+async def aget_provenance(corpus, content_type, content_id):
+    """
+    Async version of get_provenance.
+    """
+
+    records = await get_async_mongo()[get_provenance_collection_name(corpus.id)].find(
+        get_provenance_query(content_type, content_id)
+    ).sort('_id', -1).limit(settings.MAX_CONTENT_PROVENANCE).to_list(None)
+    return [read_provenance_record(record) for record in reversed(records)]
+
+
+def get_completed_task(corpus, content_type, content_id, job_id):
+    record = corpus._get_db()[get_provenance_collection_name(corpus.id)].find_one(
+        get_provenance_query(content_type, content_id, job_id)
+    )
+    if record:
+        return read_provenance_record(record)
+    return None
+
+
+def delete_provenance(corpus, content_type=None, content_ids=None, job_id=None):
+    """
+    Delete the provenance records for a content type, for particular content of that content type, or for a particular
+    job run on a piece of content.
+    """
+
+    query = {}
+    if content_type:
+        query['content_type'] = content_type
+    if content_ids is not None:
+        query['content_id'] = {'$in': [str(content_id) for content_id in content_ids]}
+    if job_id:
+        query['job_id'] = job_id
+
+    try:
+        corpus._get_db()[get_provenance_collection_name(corpus.id)].delete_many(query)
+        corpus.redis_cache.incr(get_provenance_version_key(corpus.id))
+    except:
+        print("Error deleting provenance in corpus {0}:".format(corpus.id))
+        print(traceback.format_exc())
+
+
+def migrate_embedded_provenance(corpus, content_type, keep=True, batch_size=1000):
+    """
+    Move any provenance still embedded in the documents of a content type's collection (or, with a content type of
+    "Corpus", in the corpus' document) into the provenance collection, removing it from the documents. With keep set
+    to False, embedded provenance is removed without being moved (as when importing another instance's backup).
+
+    Returns:
+        int: The number of documents provenance was removed from.
+    """
+
+    if content_type == 'Corpus':
+        collection = corpus._get_collection()
+    else:
+        collection = corpus._get_db()["corpus_{0}_{1}".format(corpus.id, content_type)]
+
+    query = {'provenance': {'$exists': True}}
+    if content_type == 'Corpus':
+        query['_id'] = corpus.id
+
+    if keep:
+        completed_tasks = []
+        for doc in collection.find(dict(query, provenance={'$exists': True, '$ne': []}), {'provenance': 1}).batch_size(batch_size):
+            completed_tasks += [(doc['_id'], CompletedTask.from_dict(prov_info)) for prov_info in doc['provenance'][-settings.MAX_CONTENT_PROVENANCE:]]
+            if len(completed_tasks) >= batch_size:
+                record_provenance_batch(corpus, content_type, completed_tasks)
+                completed_tasks = []
+        record_provenance_batch(corpus, content_type, completed_tasks)
+
+    return collection.update_many(query, {'$unset': {'provenance': ''}}).modified_count
@@ -1,8 +1,13 @@
+import re
+import json
 import secrets
 import traceback
 
 import mongoengine
+import redis
 from typing import TYPE_CHECKING
+from bson import ObjectId
+from django.conf import settings
 from elasticsearch_dsl import Search
 from elasticsearch_dsl.connections import get_connection
 from django.contrib.auth.models import User
@@ -28,6 +33,11 @@ class Scholar(mongoengine.Document):
     is_admin = mongoengine.BooleanField(default=False)
     auth_token = mongoengine.StringField(default=secrets.token_urlsafe(32))
     auth_token_ips = mongoengine.ListField(mongoengine.StringField())
+    # UI preferences, keyed by "{content_uri}/{preference}" (see get_preference_key)
+    preferences = mongoengine.DictField()
+
+    PREFERENCE_QUEUE = "/scholar/{0}/pending_preferences"
+    PREFERENCE_NAME = re.compile(r'^\w+$')
 
     def save(self, index_pages=False, **kwargs):
         super().save(**kwargs)
@@ -71,36 +81,81 @@ class Scholar(mongoengine.Document):
             }
         )
 
+    @classmethod
+    def get_preference_key(cls, content_uri, preference):
+        # preference keys become MongoDB field names, so they can't contain dots or begin with a dollar sign
+        if cls.PREFERENCE_NAME.match(preference) and content_uri.startswith('/') and '.' not in content_uri:
+            return "{0}/{1}".format(content_uri, preference)
+        return None
+
     def get_preference(self, content_type, content_uri, preference):
-        results = run_neo(
-            '''
-                MATCH (s:_Scholar {{ uri: $scholar_uri }}) -[prefs:hasPreferences]-> (c:{content_type} {{ uri: $content_uri }})
-                RETURN prefs.{preference} as preference
-            '''.format(content_type=content_type, preference=preference),
-            {
-                'scholar_uri': "/scholar/{0}".format(self.id),
-                'content_uri': content_uri
-            }
-        )
+        """
+        Get one of this scholar's preferences for a piece of content. Preferences are loaded along with the scholar
+        (i.e. into the session scholar by _get_context), so this makes no queries. Sessions' cached scholars are
+        cleared whenever queued preferences are saved (see flush_scholar_preferences), so they pick up preferences
+        set from the scholar's other sessions.
+        """
 
-        if results and 'preference' in results[0].keys():
-            return results[0]['preference']
+        preference_key = self.get_preference_key(content_uri, preference)
+        if preference_key:
+            return self.preferences.get(preference_key)
         return None
 
     def set_preference(self, content_type, content_uri, preference, value):
-        run_neo(
-            '''
-                MATCH (s:_Scholar {{ uri: $scholar_uri }})
-                MATCH (c:{content_type} {{ uri: $content_uri }})
-                MERGE (s) -[prefs:hasPreferences]-> (c) 
-                SET prefs.{preference} = $value
-            '''.format(content_type=content_type, preference=preference),
-            {
-                'scholar_uri': "/scholar/{0}".format(self.id),
-                'content_uri': content_uri,
-                'value': value
-            }
-        )
+        """
+        Set one of this scholar's preferences for a piece of content. The preference is set on this instance right
+        away, but only saved once settings.SCHOLAR_PREFERENCE_FLUSH_DELAY seconds have passed, along with any other
+        preferences set in the meantime (see flush_preferences).
+
+        Returns:
+            bool: Whether the preference was set, which it isn't when the content URI or preference name are invalid.
+        """
+
+        preference_key = self.get_preference_key(content_uri, preference)
+        if not preference_key:
+            return False
+
+        self.preferences[preference_key] = value
+
+        try:
+            cache = redis.Redis(host=settings.REDIS_HOST, decode_responses=True)
+            queue = self.PREFERENCE_QUEUE.format(self.id)
+            cache.hset(queue, preference_key, json.dumps(value))
+
+            if cache.set(queue + '/scheduled', '1', nx=True, ex=60):
+                from manager.tasks import flush_scholar_preferences
+                flush_scholar_preferences.schedule(args=(str(self.id),), delay=settings.SCHOLAR_PREFERENCE_FLUSH_DELAY)
+        except:
+            print("Error queuing preference {0} for scholar {1}:".format(preference_key, self.id))
+            print(traceback.format_exc())
+
+        return True
+
+    @classmethod
+    def flush_preferences(cls, scholar_id):
+        """
+        Save the preferences queued for a scholar by set_preference in a single update, with the last value set for
+        each preference winning.
+
+        Returns:
+            int: The number of preferences saved.
+        """
+
+        cache = redis.Redis(host=settings.REDIS_HOST, decode_responses=True)
+        queue = cls.PREFERENCE_QUEUE.format(scholar_id)
+
+        # preferences set after the queue is drained schedule another flush
+        pipeline = cache.pipeline()
+        pipeline.hgetall(queue)
+        pipeline.delete(queue, queue + '/scheduled')
+        pending = pipeline.execute()[0]
+
+        if pending:
+            cls._get_collection().update_one(
+                {'_id': ObjectId(scholar_id)},
+                {'$set': {'preferences.' + preference_key: json.loads(value) for preference_key, value in pending.items()}}
+            )
+        return len(pending)
 
     def to_dict(self):
         from .corpus import Corpus # importing in method to avoid circular dependency between Scholar and Corpus
@@ -190,6 +245,10 @@ class Scholar(mongoengine.Document):
         es_scholar = Search(index='scholar').query("match", _id=str(document.id))
         es_scholar.delete()
 
+        # Discard any preferences not yet saved
+        queue = cls.PREFERENCE_QUEUE.format(document.id)
+        redis.Redis(host=settings.REDIS_HOST, decode_responses=True).delete(queue, queue + '/scheduled')
+
         # ---------------------------------------------- #
         # Delete corresponding user from Django Admin DB #
         # ---------------------------------------------- #
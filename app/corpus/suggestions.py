@@ -0,0 +1,246 @@
+"""
+The suggestion index backs autocomplete (see Corpus.suggest_content).
+
+Each corpus has a single Elasticsearch index of completion entries, one per instance of content and suggestable field
+(text and cross-reference fields with autocomplete enabled, as well as the label for content types that autocomplete
+labels). An entry holds the field's values (for cross-reference fields, the labels of the content referenced), the
+content type and ID of the content, and completion inputs for every word-initial suffix of each value, so that a prefix
+matches any word in a value, as the search_as_you_type subfields of the content type index do. Entries are written
+alongside each content's index document by Content._do_indexing and the bulk reindexing paths.
+
+Until a content type's entries have been built in full (when its index is rebuilt, or by the build_suggestion_index
+management command), suggestions for it are made by searching its content type index instead.
+"""
+import hashlib
+import json
+from elasticsearch import NotFoundError
+from elasticsearch.helpers import bulk
+from elasticsearch_dsl.connections import get_connection
+
+
+# the number of word-initial suffixes of a value used as completion inputs
+MAX_INPUTS_PER_VALUE = 8
+
+known_suggestion_indexes = set()
+
+
+def get_suggestion_index_name(corpus_id):
+    # content type index names are lowercase versions of content type names, which can't begin with an underscore
+    return "corpus-{0}-_suggestions".format(corpus_id)
+
+
+def get_suggestions_indexed_key(corpus_id, content_type):
+    return "/corpus/{0}/{1}/suggestions_indexed".format(corpus_id, content_type)
+
+
+def get_suggestion_cache_key(corpus_id, content_type, prefix, fields, max_suggestions_per_field, filters):
+    query_key = json.dumps([prefix, sorted(fields), max_suggestions_per_field, sorted(filters.items())])
+    return "/corpus/{0}/{1}/suggestions/{2}".format(
+        corpus_id,
+        content_type,
+        hashlib.sha1(query_key.encode('utf-8')).hexdigest()
+    )
+
+
+def normalize_prefix(prefix):
+    return " ".join(prefix.lower().split())
+
+
+def get_suggestable_fields(ct):
+    suggestable_fields = {}
+    for field in ct.fields:
+        if field.autocomplete and field.in_lists and field.type in ['text', 'cross_reference']:
+            suggestable_fields[field.name] = field.type
+    if ct.autocomplete_labels:
+        suggestable_fields['label'] = 'text'
+    return suggestable_fields
+
+
+def ensure_suggestion_index(corpus_id):
+    index_name = get_suggestion_index_name(corpus_id)
+    if index_name not in known_suggestion_indexes:
+        es = get_connection()
+        if not es.indices.exists(index=index_name):
+            # another process may create the index at the same time
+            es.options(ignore_status=400).indices.create(
+                index=index_name,
+                settings={
+                    'analysis': {
+                        'analyzer': {
+                            'corpora_suggestion_analyzer': {
+                                'type': 'custom',
+                                'tokenizer': 'standard',
+                                'filter': ['lowercase', 'asciifolding']
+                            }
+                        }
+                    }
+                },
+                mappings={
+                    'properties': {
+                        'content_type': {'type': 'keyword'},
+                        'content_id': {'type': 'keyword'},
+                        'field': {'type': 'keyword'},
+                        'values': {'type': 'keyword', 'index': False},
+                        'suggest': {
+                            'type': 'completion',
+                            'analyzer': 'corpora_suggestion_analyzer',
+                            'contexts': [{'name': 'field', 'type': 'category'}]
+                        }
+                    }
+                }
+            )
+        known_suggestion_indexes.add(index_name)
+    return index_name
+
+
+def delete_suggestion_index(corpus_id):
+    index_name = get_suggestion_index_name(corpus_id)
+    get_connection().options(ignore_status=404).indices.delete(index=index_name)
+    known_suggestion_indexes.discard(index_name)
+
+
+def get_suggestion_values(field_type, index_value):
+    values = index_value if isinstance(index_value, list) else [index_value]
+    if field_type == 'cross_reference':
+        values = [value.get('label') for value in values if isinstance(value, dict)]
+    return list(dict.fromkeys([value for value in values if value and isinstance(value, str)]))
+
+
+def get_suggestion_inputs(values):
+    inputs = []
+    for value in values:
+        words = value.split()
+        for word_index in range(0, min(len(words), MAX_INPUTS_PER_VALUE)):
+            inputs.append(" ".join(words[word_index:]))
+    return list(dict.fromkeys(inputs))
+
+
+def make_suggestion_actions(corpus_id, ct, content_id, index_obj, field_list=[]):
+    """
+    Make the bulk actions that index (or, for empty fields, delete) the suggestion entries for a content's suggestable
+    fields, given the document it's indexed with (see Content._make_index_obj).
+    """
+
+    actions = []
+    index_name = get_suggestion_index_name(corpus_id)
+
+    for field_name, field_type in get_suggestable_fields(ct).items():
+        if field_list and field_name not in field_list:
+            continue
+
+        entry_id = "{0}-{1}-{2}".format(ct.name, content_id, field_name)
+        values = get_suggestion_values(field_type, index_obj.get(field_name))
+        if values:
+            actions.append({
+                '_index': index_name,
+                '_id': entry_id,
+                '_source': {
+                    'content_type': ct.name,
+                    'content_id': content_id,
+                    'field': field_name,
+                    'values': values,
+                    'suggest': {
+                        'input': get_suggestion_inputs(values),
+                        'contexts': {'field': ["{0}.{1}".format(ct.name, field_name)]}
+                    }
+                }
+            })
+        else:
+            actions.append({'_op_type': 'delete', '_index': index_name, '_id': entry_id})
+
+    return actions
+
+
+def make_suggestion_deletions(corpus_id, ct, content_ids):
+    index_name = get_suggestion_index_name(corpus_id)
+    return [
+        {'_op_type': 'delete', '_index': index_name, '_id': "{0}-{1}-{2}".format(ct.name, content_id, field_name)}
+        for content_id in content_ids for field_name in get_suggestable_fields(ct).keys()
+    ]
+
+
+def index_suggestions(corpus_id, actions):
+    errors = []
+    if actions:
+        ensure_suggestion_index(corpus_id)
+        indexed, bulk_errors = bulk(get_connection(), actions, raise_on_error=False)
+        for bulk_error in bulk_errors:
+            # deleting an entry that doesn't exist (i.e. for a field that was always empty) isn't an error
+            if bulk_error.get('delete', {}).get('status') != 404:
+                errors.append(bulk_error)
+    return errors
+
+
+def delete_suggestions(corpus_id, content_type):
+    query = {'bool': {'filter': [{'term': {'content_type': content_type}}]}}
+    get_connection().options(ignore_status=404).delete_by_query(
+        index=get_suggestion_index_name(corpus_id),
+        body={'query': query},
+        conflicts='proceed'
+    )
+
+
+def build_suggestion_query(ct, prefix, fields, max_suggestions_per_field):
+    """
+    Build the completion suggester query for the fields suggest_content would search, or return None when any of those
+    fields don't have suggestion entries.
+    """
+
+    suggestable_fields = get_suggestable_fields(ct)
+
+    if fields:
+        # as with searching the content type index, any named text or cross-reference field is suggested for
+        requested_fields = []
+        for field in ct.fields:
+            if field.name in fields and field.type in ['text', 'cross_reference']:
+                requested_fields.append(field.name)
+        if 'label' in fields and ct.autocomplete_labels:
+            requested_fields.append('label')
+    else:
+        requested_fields = [field_name for field_name in suggestable_fields.keys() if field_name != 'label']
+
+    if not requested_fields or not all(field_name in suggestable_fields for field_name in requested_fields):
+        return None
+
+    return {
+        '_source': ['values'],
+        'suggest': {
+            field_name: {
+                'prefix': prefix,
+                'completion': {
+                    'field': 'suggest',
+                    # leaves room for values repeated across the inputs of different entries
+                    'size': max_suggestions_per_field * 3,
+                    'skip_duplicates': True,
+                    'contexts': {'field': ["{0}.{1}".format(ct.name, field_name)]}
+                }
+            } for field_name in requested_fields
+        }
+    }
+
+
+def collect_completion_suggestions(response, max_suggestions_per_field):
+    results = {}
+    for field_name, entries in response.get('suggest', {}).items():
+        for entry in entries:
+            for option in entry.get('options', []):
+                # the matching input is a suffix of one of the entry's values
+                values = option.get('_source', {}).get('values', [])
+                value = next((value for value in values if value.endswith(option['text'])), option['text'])
+
+                suggestions = results.setdefault(field_name, [])
+                if value not in suggestions and len(suggestions) < max_suggestions_per_field:
+                    suggestions.append(value)
+    return results
+
+
+def search_suggestion_index(corpus_id, query):
+    """
+    Run a suggestion query, returning None if the corpus has no suggestion index.
+    """
+
+    try:
+        response = get_connection().search(index=get_suggestion_index_name(corpus_id), body=query)
+        return response.body
+    except NotFoundError:
+        return None
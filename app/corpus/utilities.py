@@ -2,6 +2,8 @@ import re
 import json
 import traceback
 import uuid
+import time
+import asyncio
 
 import requests
 import mongoengine
@@ -12,8 +14,13 @@ from typing import TYPE_CHECKING
 from elasticsearch_dsl import Search, Q
 from elasticsearch_dsl.query import SimpleQueryString
 from elasticsearch_dsl.connections import get_connection
+from elasticsearch import AsyncElasticsearch
+from neo4j import AsyncGraphDatabase
+from pymongo import AsyncMongoClient
+from redis import asyncio as async_redis
 from django.conf import settings
 from dateutil import parser
+from manager.metrics import record_call, MongoCommandListener, InstrumentedAsyncNode
 
 
 if TYPE_CHECKING:
@@ -143,6 +150,7 @@ def search_scholars(search_dict):
 def run_neo(cypher, params={}, tries=0):
     results = None
     with settings.NEO4J.session() as neo:
+        started = time.perf_counter()
         try:
             results = list(neo.run(cypher, **params))
         except:
@@ -157,11 +165,80 @@ def run_neo(cypher, params={}, tries=0):
             print("Params: {0}".format(json.dumps(params, indent=4)))
             print(error)
         finally:
+            record_call('neo', time.perf_counter() - started)
             neo.close()
     return results
 
 
+# Async clients are bound to the event loop they're created on, so each one is created lazily the first time it's
+# needed on a given loop (daphne serves everything from a single loop)
+async_clients = {}
+
+
+def get_async_client(name, make_client):
+    loop = asyncio.get_running_loop()
+    client_loop, client = async_clients.get(name, (None, None))
+    if client_loop is not loop:
+        client = make_client()
+        async_clients[name] = (loop, client)
+    return client
+
+
+def get_async_mongo():
+    client = get_async_client('mongo', lambda: AsyncMongoClient(
+        host=settings.MONGO_HOST,
+        username=settings.MONGO_USER,
+        password=settings.MONGO_PWD,
+        authSource=settings.MONGO_AUTH_SOURCE,
+        maxPoolSize=int(settings.MONGO_POOLSIZE),
+        event_listeners=[MongoCommandListener()]
+    ))
+    return client[settings.MONGO_DB]
+
+
+def get_async_elastic():
+    return get_async_client('elastic', lambda: AsyncElasticsearch(
+        settings.ELASTIC_HOST,
+        request_timeout=60,
+        node_class=InstrumentedAsyncNode
+    ))
+
+
+def get_async_redis():
+    return get_async_client('redis', lambda: async_redis.Redis(host=settings.REDIS_HOST, decode_responses=True))
+
+
+async def async_run_neo(cypher, params={}):
+    results = None
+    driver = get_async_client('neo', lambda: AsyncGraphDatabase.driver(
+        "bolt://{0}".format(settings.NEO4J_HOST),
+        auth=('neo4j', settings.NEO4J_PWD)
+    ))
+
+    started = time.perf_counter()
+    try:
+        async with driver.session() as neo:
+            result = await neo.run(cypher, **params)
+            results = [record async for record in result]
+    except:
+        print("Error running Neo4J cypher!")
+        print("Cypher: {0}".format(cypher))
+        print("Params: {0}".format(json.dumps(params, indent=4)))
+        print(traceback.format_exc())
+    finally:
+        record_call('neo', time.perf_counter() - started)
+    return results
+
+
 def get_network_json(cypher):
+    return build_network_json(run_neo(cypher))
+
+
+def build_network_json(results):
+    return build_path_network_json([result.items()[0][1] for result in results])
+
+
+def build_path_network_json(paths):
     net_json = {
         'nodes': [],
         'edges': [],
@@ -170,10 +247,8 @@ def get_network_json(cypher):
     node_id_to_uri_map = {}
     rel_ids = []
 
-    results = run_neo(cypher)
-
-    for result in results:
-        graph = result.items()[0][1].graph
+    for path in paths:
+        graph = path.graph
 
         for node in graph.nodes:
             if node.id not in node_id_to_uri_map:
@@ -224,6 +299,16 @@ def ensure_neo_indexes(node_names):
             run_neo("CREATE INDEX IF NOT EXISTS FOR (ct:{0}) ON (ct.corpus_id)".format(node_name), {})
 
 
+def delete_elastic_index(index_name):
+    # once the elasticsearch_reindex command has swapped in a fresh index, a content type's index name is an alias,
+    # which Elasticsearch won't delete by name
+    es = get_connection()
+    index_names = [index_name]
+    if es.indices.exists_alias(name=index_name):
+        index_names = list(es.indices.get_alias(name=index_name).keys())
+    es.options(ignore_status=404).indices.delete(index=','.join(index_names))
+
+
 def ensure_connection():
     try:
         from .corpus import Corpus
@@ -296,24 +381,34 @@ def parse_graph_steps(corpus, graph_path):
     return graph_steps
 
 
-def build_cypher_from_graph_steps(corpus_id, target_ct, graph_steps):
-    cypher = "MATCH (target:{0})".format(target_ct)
-    where_clauses = []
+def build_cypher_from_graph_steps(corpus_id, target_ct, graph_steps, extra_where_clauses=[]):
+    """
+    Build the MATCH and WHERE clauses of a Cypher query for the target content matching a pattern of association.
+
+    Content type names (already checked against the corpus' content types by parse_graph_steps) are the only values
+    written into the query; the URIs of any content a step is limited to are passed as parameters, so that patterns
+    differing only in the content they're limited to share a query plan. Target content is limited to the corpus by
+    the prefix of its URI, as content type labels are shared by every corpus.
+
+    Returns:
+        tuple: The Cypher and a dict of its parameters.
+    """
+
+    cypher = "MATCH (target:`{0}`)".format(target_ct)
+    where_clauses = ["target.uri STARTS WITH $target_uri_prefix"] + list(extra_where_clauses)
+    params = {'target_uri_prefix': '/corpus/{0}/{1}/'.format(corpus_id, target_ct)}
 
     for step_index, step_info in graph_steps.items():
-        cypher += " {0} (ct{1}:{2})".format(step_info['direction'], step_index, step_info['ct'])
+        cypher += " {0} (ct{1}:`{2}`)".format(step_info['direction'], step_index, step_info['ct'])
         if step_info['ids']:
-            step_uris = ['/corpus/{0}/{1}/{2}'.format(corpus_id, step_info['ct'], ct_id) for ct_id in
-                         step_info['ids']]
-            where_clauses.append("ct{0}.uri in ['{1}']".format(
-                step_index,
-                "','".join(step_uris)
-            ))
+            where_clauses.append("ct{0}.uri IN $ct{0}_uris".format(step_index))
+            params['ct{0}_uris'.format(step_index)] = [
+                '/corpus/{0}/{1}/{2}'.format(corpus_id, step_info['ct'], ct_id) for ct_id in step_info['ids']
+            ]
 
-    if where_clauses:
-        cypher += "\nWHERE {0}".format(" AND ".join(where_clauses))
+    cypher += "\nWHERE {0}".format(" AND ".join(where_clauses))
 
-    return cypher
+    return cypher, params
 
 
 def is_valid_long_lat(longitude, latitude):
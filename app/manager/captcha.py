@@ -1,11 +1,18 @@
 import random
 import os
+import json
+import math
 import base64
-import hashlib
+import redis
+import secrets
 from io import BytesIO
 from PIL import Image, ImageDraw, ImageFont
+from django.conf import settings
 
 FONT = os.path.dirname(os.path.abspath(__file__)) + '/last_draft.ttf'
+CAPTCHA_POOL_KEY = '/captcha/pool'
+CAPTCHA_TOKEN_KEY = '/captcha/token/{0}'
+_font = None
 WORDS = ["misery", "rushie", "straunge", "intelligent", "begotten", "multiply", "females", "coniunct", "offen",
          "quarel", "luckie", "extraordinarie", "grewe", "carryed", "approued", "graue", "auoide", "sorrow", "bleeding",
          "disloyall", "wotting", "kingdome", "foredoone", "squiny", "child", "murrion", "diuine", "conductor",
@@ -721,25 +728,99 @@ WORDS = ["misery", "rushie", "straunge", "intelligent", "begotten", "multiply",
          "degrees", "euerlasting", "ouerwatcht"]
 
 
-def generate_captcha():
-    word = WORDS[random.randrange(0, len(WORDS))]
+def get_font():
+    global _font
+    if _font is None:
+        _font = ImageFont.truetype(FONT, 44)
+    return _font
+
+
+def get_cache():
+    return redis.Redis(host=settings.REDIS_HOST, decode_responses=True)
+
+
+def render_captcha(word):
+    font = get_font()
+    char_widths = [int(font.getlength(char)) for char in word]
+    width = sum(char_widths) + 40
+    height = 70
+    ink = (231, 37, 42)
+
+    # draw each character on its own slightly rotated and offset tile
+    image = Image.new('RGB', (width, height), color=(255, 255, 255))
+    x = random.randint(5, 15)
+    for char, char_width in zip(word, char_widths):
+        char_image = Image.new('RGBA', (char_width + 20, height), (255, 255, 255, 0))
+        ImageDraw.Draw(char_image).text((10, 5), char, font=font, fill=ink)
+        char_image = char_image.rotate(random.uniform(-18, 18), resample=Image.BICUBIC)
+        image.paste(char_image, (x - 10, random.randint(-6, 6)), char_image)
+        x += char_width + random.randint(-3, 2)
+
+    # bend the text along a random sine wave
+    amplitude = random.uniform(2, 5)
+    period = random.uniform(50, 90)
+    phase = random.uniform(0, 2 * math.pi)
+    waved = Image.new('RGB', (width, height), color=(255, 255, 255))
+    for column in range(0, width):
+        shift = int(amplitude * math.sin((2 * math.pi * column / period) + phase))
+        waved.paste(image.crop((column, 0, column + 1, height)), (column, shift))
+
+    # and add some noise
+    draw = ImageDraw.Draw(waved)
+    for line in range(0, random.randint(3, 5)):
+        draw.line(
+            [(random.randint(0, width), random.randint(0, height)), (random.randint(0, width), random.randint(0, height))],
+            fill=ink,
+            width=random.randint(1, 2)
+        )
+    for dot in range(0, int(width * height * 0.01)):
+        draw.point((random.randint(0, width - 1), random.randint(0, height - 1)), fill=ink)
 
-    image = Image.new('RGB', (300, 50), color=(255, 255, 255))
-    font = ImageFont.truetype(FONT, 50)
-    draw = ImageDraw.Draw(image)
-    draw.text((0, 0), word, font=font, fill=(231, 37, 42))
     buffer = BytesIO()
-    image.save(buffer, format="PNG")
-    base64_string = base64.b64encode(buffer.getvalue()).decode('utf-8')
+    waved.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+
+def fill_captcha_pool(pool_size=None):
+    if pool_size is None:
+        pool_size = settings.CAPTCHA_POOL_SIZE
+
+    cache = get_cache()
+    captchas_added = 0
+    while cache.llen(CAPTCHA_POOL_KEY) < pool_size:
+        word = WORDS[random.randrange(0, len(WORDS))]
+        cache.rpush(CAPTCHA_POOL_KEY, json.dumps({'word': word, 'image': render_captcha(word)}))
+        captchas_added += 1
+    return captchas_added
+
+
+def generate_captcha():
+    """
+    Serve a captcha from the pre-rendered pool, rendering one on the spot only if the pool is empty.
+
+    Returns:
+        A tuple of the base64 encoded PNG image and a single-use token to submit along with the answer.
+    """
+
+    cache = get_cache()
+    captcha = cache.lpop(CAPTCHA_POOL_KEY)
+    if captcha:
+        captcha = json.loads(captcha)
+    else:
+        word = WORDS[random.randrange(0, len(WORDS))]
+        captcha = {'word': word, 'image': render_captcha(word)}
 
-    word_hash = hashlib.sha1(str.encode(word))
-    word_hash = word_hash.hexdigest()
+    token = secrets.token_urlsafe(24)
+    cache.set(CAPTCHA_TOKEN_KEY.format(token), captcha['word'], ex=settings.CAPTCHA_TOKEN_TTL)
 
-    return base64_string, word_hash
+    return captcha['image'], token
 
 
-def validate_captcha(word, hash):
-    word_hash = hashlib.sha1(str.encode(word))
-    word_hash = word_hash.hexdigest()
+def validate_captcha(word, token):
+    # fetch and delete the token in one transaction so that it can only ever be checked once
+    pipeline = get_cache().pipeline()
+    pipeline.get(CAPTCHA_TOKEN_KEY.format(token))
+    pipeline.delete(CAPTCHA_TOKEN_KEY.format(token))
+    expected_word, deleted = pipeline.execute()
 
-    return hash == word_hash
+    return bool(expected_word) and bool(word) and word.strip().lower() == expected_word
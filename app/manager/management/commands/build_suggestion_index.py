@@ -0,0 +1,74 @@
+import json
+import traceback
+from django.core.management.base import BaseCommand
+from elasticsearch.helpers import scan
+from elasticsearch_dsl.connections import get_connection
+from corpus.suggestions import get_suggestable_fields, get_suggestions_indexed_key, make_suggestion_actions, \
+    index_suggestions, delete_suggestions, ensure_suggestion_index
+from corpus import Corpus
+
+
+class Command(BaseCommand):
+    help = "Build the autocomplete suggestion index for every content type in every corpus (or only those specified) from their content type indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', action='append', default=[], help='ID of a corpus to build suggestions for. Can be given more than once. Defaults to all corpora.')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Number of suggestion entries per bulk request.')
+
+    def handle(self, *args, **options):
+        corpora = Corpus.objects.all()
+        if options['corpus']:
+            corpora = corpora.filter(id__in=options['corpus'])
+
+        errors = []
+        es = get_connection()
+        for c in corpora:
+            ensure_suggestion_index(c.id)
+
+            for ct_name, ct in c.content_types.items():
+                suggestable_fields = list(get_suggestable_fields(ct).keys())
+                indexed_key = get_suggestions_indexed_key(c.id, ct_name)
+                c.redis_cache.delete(indexed_key)
+                delete_suggestions(c.id, ct_name)
+
+                if not suggestable_fields:
+                    c.redis_cache.set(indexed_key, 1)
+                    continue
+
+                print(f"Building suggestions for \"{ct_name}\" in corpus \"{c.name}\"...")
+                try:
+                    # the content type index already holds cross-reference labels, so content needn't be dereferenced
+                    count = 0
+                    ct_errors = []
+                    actions = []
+                    for hit in scan(
+                        es,
+                        index="corpus-{0}-{1}".format(c.id, ct_name.lower()),
+                        query={'query': {'match_all': {}}, '_source': suggestable_fields},
+                        size=options['chunk_size']
+                    ):
+                        actions += make_suggestion_actions(c.id, ct, hit['_id'], hit.get('_source', {}))
+                        count += 1
+
+                        if len(actions) >= options['chunk_size']:
+                            ct_errors += index_suggestions(c.id, actions)
+                            actions = []
+
+                    ct_errors += index_suggestions(c.id, actions)
+
+                    if ct_errors:
+                        errors += [f"Error indexing \"{ct_name}\" suggestions: {json.dumps(error, default=str)}" for error in ct_errors]
+                    else:
+                        c.redis_cache.set(indexed_key, 1)
+                    print(f"Built suggestions for {count} \"{ct_name}\" instances!")
+
+                except:
+                    errors.append(f"Error building suggestions for \"{ct_name}\":\n{traceback.format_exc()}")
+
+            print("\n")
+
+        if errors:
+            print("\n\n".join(errors))
+            print("Building suggestions finished with errors. Content types with errors will continue to be suggested for by searching their content type indexes.")
+        else:
+            print("All suggestions successfully built.")
@@ -1,30 +1,213 @@
+import os
+import json
+import threading
+import traceback
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from django.core.management.base import BaseCommand
-from manager.utilities import order_content_schema
+from elasticsearch.helpers import streaming_bulk, parallel_bulk
+from elasticsearch_dsl.connections import get_connection
+from manager.utilities import order_content_schema, iterate_content_batches
+from corpus.suggestions import make_suggestion_actions, index_suggestions, get_suggestions_indexed_key
 from corpus import Corpus
 
 
 class Command(BaseCommand):
+    help = "Rebuild the Elasticsearch indexes for every content type in every corpus (or only those specified)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', action='append', default=[], help='ID of a corpus to reindex. Can be given more than once. Defaults to all corpora.')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Number of documents per bulk request.')
+        parser.add_argument('--threads', type=int, default=4, help='Number of threads sending bulk requests for each content type. Use 1 for streaming_bulk.')
+        parser.add_argument('--workers', type=int, default=2, help='Number of content types to reindex at the same time.')
+        parser.add_argument('--checkpoint', type=str, default='/corpora/elasticsearch_reindex_checkpoint.json', help='Path of the checkpoint file used to resume an interrupted reindex.')
+        parser.add_argument('--restart', action='store_true', help='Ignore any existing checkpoint and reindex everything.')
+
     def handle(self, *args, **options):
-        for c in Corpus.objects.all():
-            print(f"Adding corpus \"{c.name}\" to corpus index...")
-            c.save()
+        self.chunk_size = options['chunk_size']
+        self.threads = options['threads']
+        self.checkpoint_path = options['checkpoint']
+        self.checkpoint_lock = threading.Lock()
+        self.checkpoint = {}
 
-            ordered_schema = []
-            for ct_name in c.content_types.keys():
-                ordered_schema.append(c.content_types[ct_name].to_dict())
-            ordered_schema = order_content_schema(ordered_schema)
+        if os.path.exists(self.checkpoint_path) and not options['restart']:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as checkpoint_in:
+                self.checkpoint = json.load(checkpoint_in)
+            print(f"Resuming reindex from checkpoint {self.checkpoint_path}...")
 
-            for ct in ordered_schema:
-                ct_name = ct['name']
-                print(f"Rebuilding \"{ct_name}\" content type index...")
-                c.build_content_type_elastic_index(ct_name)
+        corpora = Corpus.objects.all()
+        if options['corpus']:
+            corpora = corpora.filter(id__in=options['corpus'])
+
+        errors = []
+        for c in corpora:
+            corpus_checkpoint = self.checkpoint.setdefault(str(c.id), {'corpus_indexed': False, 'content_types': {}})
 
-                content_count = 0
-                for content in c.get_content(ct_name, all=True):
-                    content._do_indexing()
-                    content_count += 1
-                print(f"Reindexed {content_count} \"{ct_name}\" instances!")
+            if not corpus_checkpoint['corpus_indexed']:
+                print(f"Adding corpus \"{c.name}\" to corpus index...")
+                c.save()
+                corpus_checkpoint['corpus_indexed'] = True
+                self.save_checkpoint()
+
+            # content types are reindexed in waves: each wave holds the content types whose cross-referenced content
+            # types were handled in an earlier wave, and the content types within a wave are reindexed in parallel
+            ordered_schema = order_content_schema([c.content_types[ct_name].to_dict() for ct_name in c.content_types.keys()])
+            for wave in self.make_waves(ordered_schema):
+                with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                    for ct_errors in executor.map(lambda ct_name: self.reindex_content_type(c, ct_name), wave):
+                        errors += ct_errors
 
             print("\n")
 
-        print("All content successfully reindexed.")
+        if errors:
+            print("\n\n".join(errors))
+            print(f"Reindexing finished with errors. Run this command again to resume from {self.checkpoint_path}.")
+        else:
+            if os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
+            print("All content successfully reindexed.")
+
+    def make_waves(self, ordered_schema):
+        waves = []
+        wave_of = {}
+        for ct in ordered_schema:
+            wave = 0
+            for field in ct['fields']:
+                if field['type'] == 'cross_reference' and field['cross_reference_type'] in wave_of:
+                    wave = max(wave, wave_of[field['cross_reference_type']] + 1)
+
+            wave_of[ct['name']] = wave
+            while len(waves) <= wave:
+                waves.append([])
+            waves[wave].append(ct['name'])
+        return waves
+
+    def reindex_content_type(self, corpus, ct_name):
+        errors = []
+        es = get_connection()
+        alias_name = "corpus-{0}-{1}".format(corpus.id, ct_name.lower())
+        ct_checkpoint = self.checkpoint[str(corpus.id)]['content_types'].get(ct_name)
+
+        if ct_checkpoint and ct_checkpoint['complete']:
+            print(f"Skipping \"{ct_name}\", which was already reindexed.")
+            return errors
+
+        try:
+            # content is loaded into a fresh index, which replaces the live one only once it's complete, so that
+            # searches keep working while the content type is reindexed
+            if not ct_checkpoint:
+                print(f"Rebuilding \"{ct_name}\" content type index...")
+                index_name = "{0}-{1}".format(alias_name, datetime.now().strftime('%Y%m%d%H%M%S'))
+                corpus.build_content_type_elastic_index(ct_name, index_name=index_name)
+
+                index_settings = es.indices.get_settings(index=index_name)[index_name]['settings']['index']
+                ct_checkpoint = {
+                    'index': index_name,
+                    'started': datetime.now().isoformat(),
+                    'last_id': None,
+                    'count': 0,
+                    'complete': False,
+                    'refresh_interval': index_settings.get('refresh_interval'),
+                    'number_of_replicas': index_settings.get('number_of_replicas')
+                }
+                self.set_content_type_checkpoint(corpus, ct_name, ct_checkpoint)
+            else:
+                print(f"Resuming \"{ct_name}\" after {ct_checkpoint['count']} instances...")
+            index_name = ct_checkpoint['index']
+
+            # refreshing and replicating while loading only slows the load down
+            es.indices.put_settings(index=index_name, body={'index': {'refresh_interval': '-1', 'number_of_replicas': 0}})
+
+            mongo_batch_size = self.chunk_size * max(self.threads, 1)
+            for contents in iterate_content_batches(corpus, ct_name, batch_size=mongo_batch_size, start_after=ct_checkpoint['last_id']):
+                batch_errors = self.index_contents(es, corpus, ct_name, index_name, contents)
+
+                # once a batch has failed, the checkpoint stays behind it so that resuming reindexes it, but later
+                # batches are still loaded to report all of the content type's errors
+                if not batch_errors and not errors:
+                    ct_checkpoint['last_id'] = str(contents[-1].id)
+                    ct_checkpoint['count'] += len(contents)
+                    self.set_content_type_checkpoint(corpus, ct_name, ct_checkpoint)
+                errors += batch_errors
+
+            if errors:
+                print(f"Errors reindexing \"{ct_name}\", so its index wasn't replaced.")
+                return errors
+
+            # content saved since the reindex started may have been loaded before it changed
+            started = datetime.fromisoformat(ct_checkpoint['started'])
+            changed_ids = [content.id for content in corpus.get_content(ct_name, {'last_updated__gte': started}, only=['id'])]
+            for contents in iterate_content_batches(corpus, ct_name, id_batches=[changed_ids[i:i + mongo_batch_size] for i in range(0, len(changed_ids), mongo_batch_size)]):
+                errors += self.index_contents(es, corpus, ct_name, index_name, contents)
+
+            if errors:
+                print(f"Errors reindexing \"{ct_name}\", so its index wasn't replaced.")
+                return errors
+
+            es.indices.put_settings(index=index_name, body={'index': {
+                'refresh_interval': ct_checkpoint['refresh_interval'],
+                'number_of_replicas': ct_checkpoint['number_of_replicas'] if ct_checkpoint['number_of_replicas'] is not None else 1
+            }})
+            es.indices.refresh(index=index_name)
+            self.swap_index(es, alias_name, index_name)
+            corpus.redis_cache.set(get_suggestions_indexed_key(corpus.id, ct_name), 1)
+            corpus.bump_content_version(ct_name)
+
+            ct_checkpoint['complete'] = True
+            self.set_content_type_checkpoint(corpus, ct_name, ct_checkpoint)
+            print(f"Reindexed {ct_checkpoint['count']} \"{ct_name}\" instances!")
+
+        except:
+            errors.append(f"Error reindexing \"{ct_name}\":\n{traceback.format_exc()}")
+
+        return errors
+
+    def index_contents(self, es, corpus, ct_name, index_name, contents):
+        errors = []
+        actions = []
+        suggestion_actions = []
+        for content in contents:
+            index_obj = content._make_index_obj()
+            actions.append({
+                '_index': index_name,
+                '_id': str(content.id),
+                '_source': index_obj
+            })
+            suggestion_actions += make_suggestion_actions(corpus.id, corpus.content_types[ct_name], str(content.id), index_obj)
+
+        if self.threads > 1:
+            bulk_results = parallel_bulk(es, actions, thread_count=self.threads, chunk_size=self.chunk_size, raise_on_error=False)
+        else:
+            bulk_results = streaming_bulk(es, actions, chunk_size=self.chunk_size, raise_on_error=False)
+
+        for ok, result in bulk_results:
+            if not ok:
+                errors.append(f"Error indexing \"{ct_name}\" content: {json.dumps(result, default=str)}")
+        for result in index_suggestions(corpus.id, suggestion_actions):
+            errors.append(f"Error indexing \"{ct_name}\" suggestions: {json.dumps(result, default=str)}")
+        return errors
+
+    def swap_index(self, es, alias_name, index_name):
+        # point the content type's index name at the new index and drop the old one in a single step
+        actions = [{'add': {'index': index_name, 'alias': alias_name}}]
+        old_index_names = []
+        if es.indices.exists_alias(name=alias_name):
+            old_index_names = [old_index_name for old_index_name in es.indices.get_alias(name=alias_name).keys() if old_index_name != index_name]
+            actions = [{'remove': {'index': old_index_name, 'alias': alias_name}} for old_index_name in old_index_names] + actions
+        elif es.indices.exists(index=alias_name):
+            actions = [{'remove_index': {'index': alias_name}}] + actions
+
+        es.indices.update_aliases(actions=actions)
+        if old_index_names:
+            es.options(ignore_status=404).indices.delete(index=','.join(old_index_names))
+
+    def set_content_type_checkpoint(self, corpus, ct_name, ct_checkpoint):
+        with self.checkpoint_lock:
+            self.checkpoint[str(corpus.id)]['content_types'][ct_name] = ct_checkpoint
+            self.save_checkpoint()
+
+    def save_checkpoint(self):
+        checkpoint_temp_path = f"{self.checkpoint_path}.tmp"
+        with open(checkpoint_temp_path, 'w', encoding='utf-8') as checkpoint_out:
+            json.dump(self.checkpoint, checkpoint_out, indent=4)
+        os.replace(checkpoint_temp_path, self.checkpoint_path)
@@ -9,6 +9,7 @@ from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
 from django.conf import settings
 from elasticsearch_dsl import Boolean, normalizer, Index, Mapping, analyzer, Keyword
+from elasticsearch_dsl.connections import get_connection
 from manager.utilities import _contains
 from corpus import CorpusBackup, JobSite, Task, Scholar
 
@@ -116,11 +117,18 @@ class Command(BaseCommand):
 
         # Ensure ContentView Elasticsearch index exists
         if Index('content_view').exists():
+            # content view membership is now split across shard documents, so make sure their fields are mapped
+            get_connection().indices.put_mapping(index='content_view', body={'properties': {
+                'view': {'type': 'keyword'},
+                'shard': {'type': 'integer'}
+            }})
             print("\t-- CONTENT VIEW INDEX EXISTS :)")
         else:
             # Create ContentView Elasticsearch index
             mapping = Mapping()
             mapping.field('ids', 'keyword')
+            mapping.field('view', 'keyword')
+            mapping.field('shard', 'integer')
             content_view_index = Index('content_view')
             content_view_index.mapping(mapping)
             content_view_index.save()
@@ -208,7 +216,8 @@ class Command(BaseCommand):
                                     jobsite.task_registry[name] = {
                                         'task_id': new_task.id,
                                         'module': plugin_task['module'],
-                                        'functions': deepcopy(plugin_task['functions'])
+                                        'functions': deepcopy(plugin_task['functions']),
+                                        'resumable': plugin_task.get('resumable', False)
                                     }
                                     jobsite.save()
                                     print("\t-- TASK {0}: {1} REGISTERED :)".format(app, name))
@@ -217,6 +226,7 @@ class Command(BaseCommand):
                                 if jobsite.type == 'HUEY':
                                     jobsite.task_registry[name]['module'] = plugin_task['module']
                                     jobsite.task_registry[name]['functions'] = plugin_task['functions']
+                                    jobsite.task_registry[name]['resumable'] = plugin_task.get('resumable', False)
                                     jobsite.save()
                                     print("\t-- UPDATED {0}: {1} FROM VERSION {2} TO {3} :)".format(
                                         app,
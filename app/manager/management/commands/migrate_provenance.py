@@ -0,0 +1,33 @@
+import traceback
+from django.core.management.base import BaseCommand
+from corpus.provenance import migrate_embedded_provenance
+from corpus import Corpus
+
+
+class Command(BaseCommand):
+    help = "Move job provenance embedded in corpus and content documents into each corpus' provenance collection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', action='append', default=[], help='ID of a corpus to migrate. Can be given more than once. Defaults to all corpora.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of provenance records per bulk insert.')
+
+    def handle(self, *args, **options):
+        corpora = Corpus.objects.all()
+        if options['corpus']:
+            corpora = corpora.filter(id__in=options['corpus'])
+
+        errors = []
+        for c in corpora:
+            for content_type in ['Corpus'] + list(c.content_types.keys()):
+                try:
+                    migrated = migrate_embedded_provenance(c, content_type, batch_size=options['batch_size'])
+                    if migrated:
+                        print(f"Moved provenance out of {migrated} \"{content_type}\" documents in corpus \"{c.name}\".")
+                except:
+                    errors.append(f"Error migrating provenance for \"{content_type}\" in corpus \"{c.name}\":\n{traceback.format_exc()}")
+
+        if errors:
+            print("\n\n".join(errors))
+            print("Provenance migration finished with errors. Run it again to migrate the content types with errors.")
+        else:
+            print("All provenance successfully migrated.")
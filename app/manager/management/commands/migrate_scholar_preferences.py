@@ -0,0 +1,55 @@
+import traceback
+from bson import ObjectId
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from corpus import Scholar, run_neo
+from manager.utilities import clear_cached_session_scholar
+
+
+class Command(BaseCommand):
+    help = "Move scholar preferences stored on hasPreferences relationships in Neo4J onto scholar records in MongoDB."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', action='store_true', help='Keep the hasPreferences relationships after migrating them.')
+
+    def handle(self, *args, **options):
+        results = run_neo(
+            '''
+                MATCH (s:_Scholar) -[prefs:hasPreferences]-> (c)
+                RETURN s.uri AS scholar_uri, c.uri AS content_uri, properties(prefs) AS preferences
+            ''',
+            {}
+        )
+
+        if results is None:
+            print("Unable to read preferences from Neo4J.")
+            return
+
+        updates = {}
+        for result in results:
+            scholar_id = result['scholar_uri'].split('/')[-1]
+            for preference, value in result['preferences'].items():
+                preference_key = Scholar.get_preference_key(result['content_uri'] or '', preference)
+                if preference_key and ObjectId.is_valid(scholar_id):
+                    updates.setdefault(scholar_id, {})['preferences.' + preference_key] = value
+
+        errors = []
+        for scholar_id, preferences in updates.items():
+            try:
+                Scholar._get_collection().update_one({'_id': ObjectId(scholar_id)}, {'$set': preferences})
+            except:
+                errors.append(f"Error migrating preferences for scholar {scholar_id}:\n{traceback.format_exc()}")
+
+        # sessions cache a copy of their scholar, which wouldn't otherwise have the migrated preferences
+        usernames = Scholar.objects(id__in=list(updates.keys())).scalar('username')
+        for user in User.objects.filter(username__in=list(usernames)):
+            clear_cached_session_scholar(user.id)
+
+        print(f"Migrated preferences for {len(updates)} scholars.")
+
+        if errors:
+            print("\n\n".join(errors))
+            print("Preference migration finished with errors, so preferences were left in Neo4J.")
+        elif not options['keep']:
+            run_neo("MATCH (:_Scholar) -[prefs:hasPreferences]-> () DELETE prefs", {})
+            print("All preferences successfully migrated.")
@@ -0,0 +1,223 @@
+"""
+Request and task scoped instrumentation of calls to MongoDB, Elasticsearch, and Neo4J.
+
+Each web request (via manager.middleware.MetricsMiddleware) and each Huey task (via the signal hooks registered by
+register_huey_hooks) is tracked as an "operation." While an operation is running, every MongoDB command, Elasticsearch
+request, and run_neo call made on its behalf is counted and timed. When it finishes, its duration and per-service call
+counts are added to histograms kept in Redis, so that the web process and the Huey consumer report to the same place,
+and the /metrics view renders them in the Prometheus text format.
+
+A view or task whose number of calls per operation jumps (an N+1 regression) shows up as a shift in its
+corpora_{request|task}_backend_calls histogram.
+"""
+import time
+import json
+import contextvars
+import traceback
+import redis
+from pymongo import monitoring
+from elastic_transport import Urllib3HttpNode, AiohttpHttpNode
+from django.conf import settings
+
+
+SERVICES = ['mongo', 'elastic', 'neo']
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300]
+CALL_COUNT_BUCKETS = [0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000]
+OPERATION_LABELS = {'request': 'view', 'task': 'task'}
+
+current_operation = contextvars.ContextVar('corpora_current_operation', default=None)
+
+
+class Operation(object):
+    def __init__(self, kind, name=''):
+        self.kind = kind
+        self.name = name
+        self.started = time.perf_counter()
+        self.duration = None
+        self.calls = {service: 0 for service in SERVICES}
+        self.seconds = {service: 0.0 for service in SERVICES}
+
+    def record(self, service, seconds):
+        self.calls[service] += 1
+        self.seconds[service] += seconds
+
+    def breakdown(self):
+        return {
+            'kind': self.kind,
+            'name': self.name,
+            'duration_ms': round((self.duration or 0) * 1000, 3),
+            'calls': self.calls,
+            'ms': {service: round(seconds * 1000, 3) for service, seconds in self.seconds.items()}
+        }
+
+
+def start_operation(kind, name=''):
+    operation = Operation(kind, name)
+    return operation, current_operation.set(operation)
+
+
+def finish_operation(operation, token=None):
+    operation.duration = time.perf_counter() - operation.started
+    if token:
+        try:
+            current_operation.reset(token)
+        except ValueError:
+            # the token was created in a different context (e.g. by a Huey signal in another thread)
+            current_operation.set(None)
+
+    try:
+        store_operation(operation)
+    except:
+        print("Error storing metrics for {0} {1}:".format(operation.kind, operation.name))
+        print(traceback.format_exc())
+    return operation
+
+
+def record_call(service, seconds):
+    operation = current_operation.get()
+    if operation:
+        operation.record(service, seconds)
+
+
+def bucket_for(value, buckets):
+    for bucket in buckets:
+        if value <= bucket:
+            return str(bucket)
+    return '+Inf'
+
+
+def get_cache():
+    return redis.Redis(host=settings.REDIS_HOST, decode_responses=True)
+
+
+def store_operation(operation):
+    # only the bucket each observation falls into is incremented; buckets are made cumulative when rendered
+    key = "/metrics/{0}".format(operation.kind)
+    name = operation.name or 'unknown'
+
+    pipeline = get_cache().pipeline(transaction=False)
+    pipeline.hincrby(key, json.dumps(['duration_bucket', name, bucket_for(operation.duration, DURATION_BUCKETS)]), 1)
+    pipeline.hincrbyfloat(key, json.dumps(['duration_sum', name]), operation.duration)
+    pipeline.hincrby(key, json.dumps(['duration_count', name]), 1)
+
+    for service in SERVICES:
+        pipeline.hincrby(key, json.dumps(['calls_bucket', name, service, bucket_for(operation.calls[service], CALL_COUNT_BUCKETS)]), 1)
+        pipeline.hincrby(key, json.dumps(['calls_sum', name, service]), operation.calls[service])
+        pipeline.hincrbyfloat(key, json.dumps(['seconds_sum', name, service]), operation.seconds[service])
+    pipeline.execute()
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    return '{' + ','.join('{0}="{1}"'.format(label, escape_label(value)) for label, value in labels) + '}'
+
+
+def render_metrics():
+    """
+    Render the stored request and task histograms in the Prometheus text exposition format.
+    """
+
+    lines = []
+    cache = get_cache()
+
+    for kind, name_label in OPERATION_LABELS.items():
+        durations = {}
+        duration_sums = {}
+        duration_counts = {}
+        calls = {}
+        call_sums = {}
+        seconds_sums = {}
+
+        for field, value in cache.hgetall("/metrics/{0}".format(kind)).items():
+            field = json.loads(field)
+            if field[0] == 'duration_bucket':
+                durations.setdefault(field[1], {})[field[2]] = int(value)
+            elif field[0] == 'duration_sum':
+                duration_sums[field[1]] = float(value)
+            elif field[0] == 'duration_count':
+                duration_counts[field[1]] = int(value)
+            elif field[0] == 'calls_bucket':
+                calls.setdefault((field[1], field[2]), {})[field[3]] = int(value)
+            elif field[0] == 'calls_sum':
+                call_sums[(field[1], field[2])] = int(value)
+            elif field[0] == 'seconds_sum':
+                seconds_sums[(field[1], field[2])] = float(value)
+
+        metric = "corpora_{0}_duration_seconds".format(kind)
+        lines.append("# HELP {0} Duration of each {1}.".format(metric, kind))
+        lines.append("# TYPE {0} histogram".format(metric))
+        for name in sorted(duration_counts.keys()):
+            cumulative = 0
+            for bucket in [str(bucket) for bucket in DURATION_BUCKETS] + ['+Inf']:
+                cumulative += durations.get(name, {}).get(bucket, 0)
+                lines.append("{0}_bucket{1} {2}".format(metric, format_labels([(name_label, name), ('le', bucket)]), cumulative))
+            lines.append("{0}_sum{1} {2}".format(metric, format_labels([(name_label, name)]), duration_sums.get(name, 0)))
+            lines.append("{0}_count{1} {2}".format(metric, format_labels([(name_label, name)]), duration_counts[name]))
+
+        metric = "corpora_{0}_backend_calls".format(kind)
+        lines.append("# HELP {0} Number of calls made to each backend service per {1}.".format(metric, kind))
+        lines.append("# TYPE {0} histogram".format(metric))
+        for name, service in sorted(calls.keys()):
+            cumulative = 0
+            labels = [(name_label, name), ('service', service)]
+            for bucket in [str(bucket) for bucket in CALL_COUNT_BUCKETS] + ['+Inf']:
+                cumulative += calls[(name, service)].get(bucket, 0)
+                lines.append("{0}_bucket{1} {2}".format(metric, format_labels(labels + [('le', bucket)]), cumulative))
+            lines.append("{0}_sum{1} {2}".format(metric, format_labels(labels), call_sums.get((name, service), 0)))
+            lines.append("{0}_count{1} {2}".format(metric, format_labels(labels), cumulative))
+
+        metric = "corpora_{0}_backend_seconds_total".format(kind)
+        lines.append("# HELP {0} Time spent waiting on each backend service.".format(metric))
+        lines.append("# TYPE {0} counter".format(metric))
+        for name, service in sorted(seconds_sums.keys()):
+            lines.append("{0}{1} {2}".format(metric, format_labels([(name_label, name), ('service', service)]), seconds_sums[(name, service)]))
+
+    return "\n".join(lines) + "\n"
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        record_call('mongo', event.duration_micros / 1000000)
+
+    def failed(self, event):
+        record_call('mongo', event.duration_micros / 1000000)
+
+
+class InstrumentedNode(Urllib3HttpNode):
+    def perform_request(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().perform_request(*args, **kwargs)
+        finally:
+            record_call('elastic', time.perf_counter() - started)
+
+
+class InstrumentedAsyncNode(AiohttpHttpNode):
+    async def perform_request(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().perform_request(*args, **kwargs)
+        finally:
+            record_call('elastic', time.perf_counter() - started)
+
+
+def register_huey_hooks(huey):
+    from huey.signals import SIGNAL_EXECUTING, SIGNAL_COMPLETE, SIGNAL_ERROR, SIGNAL_INTERRUPTED
+
+    running_tasks = {}
+
+    @huey.signal(SIGNAL_EXECUTING)
+    def start_task_operation(signal, task, *args):
+        running_tasks[task.id] = start_operation('task', task.name)
+
+    @huey.signal(SIGNAL_COMPLETE, SIGNAL_ERROR, SIGNAL_INTERRUPTED)
+    def finish_task_operation(signal, task, *args):
+        if task.id in running_tasks:
+            operation, token = running_tasks.pop(task.id)
+            finish_operation(operation, token)
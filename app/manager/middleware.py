@@ -1,8 +1,21 @@
+import json
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from manager.metrics import start_operation, finish_operation, current_operation
+from manager.serialization import get_accepted_encoding, compress
 
+
+# These middleware classes support both sync and async requests so that Django doesn't have to hand async views off to
+# a thread just to pass through them (see https://docs.djangoproject.com/en/5.1/topics/http/middleware/#async-middleware)
 class SiteMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
         host = request.get_host()
@@ -14,9 +27,13 @@ class SiteMiddleware:
         return response
 
 class ChunkedTransferMiddleware:
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
         if 'CONTENT_TYPE' in request.headers and request.headers['CONTENT_TYPE'] == 'application%2Foffset%2Boctet-stream':
@@ -24,3 +41,119 @@ class ChunkedTransferMiddleware:
 
         response = self.get_response(request)
         return response
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(self.get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        operation, token = start_operation('request')
+        try:
+            response = self.get_response(request)
+        finally:
+            self.finish(request, operation, token)
+
+        return response
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+
+        operation, token = start_operation('request')
+        try:
+            response = await self.get_response(request)
+        finally:
+            # storing the metrics is a blocking call to Redis, so it's made from a thread
+            current_operation.reset(token)
+            await sync_to_async(self.finish, thread_sensitive=False)(request, operation)
+
+        return response
+
+    def finish(self, request, operation, token=None):
+        resolver_match = getattr(request, 'resolver_match', None)
+        operation.name = resolver_match.view_name if resolver_match else 'unmatched'
+        finish_operation(operation, token)
+
+        if operation.duration >= settings.SLOW_REQUEST_SECONDS:
+            breakdown = operation.breakdown()
+            breakdown['method'] = request.method
+            breakdown['path'] = request.get_full_path()
+            print("SLOW REQUEST: {0}".format(json.dumps(breakdown)))
+
+
+class CompressionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    # only API responses are compressed: compressing HTML pages, which carry secrets like CSRF tokens alongside
+    # reflected input, would expose them to compression side channel attacks (i.e. BREACH)
+    compressible_types = ['application/json', 'application/ld+json', 'application/geo+json', 'application/xml']
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(self.get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        response = self.get_response(request)
+        encoding = self.get_encoding(request, response)
+        if encoding:
+            self.compress_response(response, encoding)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        encoding = self.get_encoding(request, response)
+        if encoding:
+            # large bodies are compressed from a thread so the event loop isn't held up
+            if len(response.content) > settings.COMPRESSION_THREAD_BYTES:
+                await sync_to_async(self.compress_response, thread_sensitive=False)(response, encoding)
+            else:
+                self.compress_response(response, encoding)
+        return response
+
+    def get_encoding(self, request, response):
+        # streamed responses (i.e. event streams and exports) are left alone
+        if not settings.COMPRESSION_ENABLED or response.streaming or response.has_header('Content-Encoding'):
+            return None
+
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in self.compressible_types:
+            return None
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < settings.COMPRESSION_MIN_BYTES:
+            return None
+
+        return get_accepted_encoding(request.headers.get('Accept-Encoding', ''))
+
+    def compress_response(self, response, encoding):
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return
+
+        response.content = compressed
+        response['Content-Encoding'] = encoding
+        response['Content-Length'] = str(len(compressed))
+
+        # the compressed body is no longer byte-for-byte what a strong ETag promises
+        etag = response.get('ETag')
+        if etag and not etag.startswith('W/'):
+            response['ETag'] = 'W/' + etag
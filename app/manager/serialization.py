@@ -0,0 +1,87 @@
+"""
+The JSON and compression layer for API responses.
+
+Responses are serialized with orjson when it's installed, and with the standard library's json module otherwise.
+Either way, the BSON types that turn up in to_dict() output and raw MongoDB documents (ObjectIds, DBRefs, and
+Decimal128s) are written as strings, and datetimes in ISO 8601 format.
+
+Bodies are compressed by CompressionMiddleware, using brotli when it's installed and the client accepts it, or gzip.
+"""
+import gzip
+import json
+from datetime import date, datetime
+from bson import ObjectId, DBRef, Decimal128
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def serialize_default(obj):
+    if isinstance(obj, (ObjectId, Decimal128)):
+        return str(obj)
+    if isinstance(obj, DBRef):
+        return str(obj.id)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode('utf-8', errors='replace')
+    raise TypeError("Object of type {0} is not JSON serializable".format(type(obj).__name__))
+
+
+def dumps(obj):
+    """
+    Serialize an object as JSON, returning UTF-8 encoded bytes.
+    """
+
+    if orjson:
+        try:
+            return orjson.dumps(obj, default=serialize_default, option=orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            # i.e. integers too large for 64 bits, which the standard library can handle
+            pass
+    return json.dumps(obj, default=serialize_default).encode('utf-8')
+
+
+def json_response(obj, status=200):
+    return HttpResponse(dumps(obj), content_type='application/json', status=status)
+
+
+def get_accepted_encoding(accept_encoding):
+    """
+    Pick the compression to use for a request's Accept-Encoding header, or None if it accepts neither brotli nor gzip.
+    """
+
+    accepted = {}
+    for coding in accept_encoding.lower().split(','):
+        coding_parts = [part.strip() for part in coding.split(';')]
+        quality = 1.0
+        for param in coding_parts[1:]:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if coding_parts[0]:
+            accepted[coding_parts[0]] = quality
+
+    for encoding in (['br'] if brotli else []) + ['gzip']:
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=4)
+    # mtime=0 keeps the output (and so any ETag computed from it downstream) stable for the same body
+    return gzip.compress(body, compresslevel=5, mtime=0)
@@ -13,14 +13,16 @@ from corpus import (
     Corpus, Job, get_corpus, File,
     ContentView, ContentTypeGroup, ContentDeletion,
     CorpusBackup, CorpusBackupAutomation,
-    JobSite, GitRepo, CompletedTask
+    JobSite, GitRepo, CompletedTask, Scholar, run_neo
 )
-from huey.contrib.djhuey import db_task, db_periodic_task
+from huey.contrib.djhuey import HUEY, db_task, db_periodic_task
 from huey import crontab
 from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from mongoengine.errors import NotUniqueError
 from urllib.parse import quote
 from elasticsearch_dsl.connections import get_connection
-from elasticsearch.helpers import scan
+from elasticsearch.helpers import scan, bulk
 from datetime import datetime, timedelta
 from subprocess import call
 from manager.utilities import (
@@ -30,13 +32,28 @@ from manager.utilities import (
     process_content_bundle,
     delimit_content_json,
     create_content_csv_rows,
-    get_open_access_corpora
+    get_open_access_corpora,
+    clear_cached_session_scholar
 )
+from manager.captcha import fill_captcha_pool
+from corpus.suggestions import make_suggestion_actions, make_suggestion_deletions, index_suggestions
+from corpus.patterns import run_pattern_count
+from corpus.provenance import (
+    record_provenance_batch, delete_provenance, migrate_embedded_provenance, get_provenance_collection_name,
+    drop_provenance_collection
+)
+from manager.metrics import register_huey_hooks
 from django.conf import settings
+from django.contrib.auth.models import User
 from django.template.loader import get_template
 from django_drf_filepond.models import TemporaryUpload
 
 
+# count and time the backend calls made by each task
+if settings.METRICS_ENABLED:
+    register_huey_hooks(HUEY)
+
+
 REGISTRY = {
     "Bulk Launch Jobs": {
         "version": "0.0",
@@ -107,6 +124,40 @@ REGISTRY = {
         "module": 'manager.tasks',
         "functions": ['bulk_edit_content']
     },
+    "Bulk Delete Content": {
+        "version": "0",
+        "jobsite_type": "HUEY",
+        "track_provenance": False,
+        "create_report": True,
+        "resumable": True,
+        "content_type": "Corpus",
+        "configuration": {
+            "parameters": {
+                "content_type": {
+                    "value": "",
+                    "type": "content_type",
+                    "label": "Content Type"
+                },
+                "content_ids": {
+                    "value": "",
+                    "type": "text",
+                    "label": "Bulk Delete IDs"
+                },
+                "content_query": {
+                    "value": "",
+                    "type": "text",
+                    "label": "Content Search Query JSON"
+                },
+                "deleted_count": {
+                    "value": 0,
+                    "type": "integer",
+                    "label": "Content Deleted So Far"
+                }
+            }
+        },
+        "module": 'manager.tasks',
+        "functions": ['bulk_delete_content']
+    },
     "Save Content Type Schema": {
         "version": "0",
         "jobsite_type": "HUEY",
@@ -557,6 +608,136 @@ def set_and_save_content(corpus, content_type, content_ids, content_bundle, scho
             )
 
 
+@db_task(priority=3)
+def bulk_delete_content(job_id):
+    job = Job(job_id)
+    job.set_status('running')
+    if job:
+        corpus = job.corpus
+        content_type = job.get_param_value('content_type')
+        content_ids = job.get_param_value('content_ids')
+        content_query = job.get_param_value('content_query')
+        batch_size = 500
+
+        # content deleted by an earlier, interrupted run of this job is gone from the database and the search index,
+        # so picking the job back up simply continues with whatever content remains
+        deleted_count = int(job.get_param_value('deleted_count') or 0)
+
+        if content_type in corpus.content_types:
+            if deleted_count:
+                job.report("Resuming deletion after {0} {1} already deleted.".format(deleted_count, content_type))
+
+            if content_ids:
+                content_ids = [content_id for content_id in content_ids.split(',') if content_id]
+                for start in range(0, len(content_ids), batch_size):
+                    deleted_count += delete_content_batch(job, content_type, content_ids[start:start + batch_size])
+                    record_bulk_deletion_progress(job, deleted_count, int(((start + batch_size) / len(content_ids)) * 100))
+
+            elif content_query:
+                search_params = build_search_params_from_dict(json.loads(content_query))
+                search_params['page'] = 1
+                search_params['page_size'] = batch_size
+                search_params['only'] = ['id']
+                total = None
+
+                # since matching content is removed from the index as we go, the first page of results always holds
+                # the next batch to delete
+                while True:
+                    results = corpus.search_content(content_type, **search_params)
+                    if not results or not results['records']:
+                        break
+
+                    if total is None:
+                        total = results['meta']['total'] + deleted_count
+
+                    batch_deleted = delete_content_batch(job, content_type, [record['id'] for record in results['records']])
+                    if not batch_deleted:
+                        job.report("Unable to delete any of the remaining {0} matching the search. Halting!".format(content_type))
+                        break
+
+                    deleted_count += batch_deleted
+                    record_bulk_deletion_progress(job, deleted_count, int((deleted_count / total) * 100))
+
+        job.report("Deleted {0} {1}.".format(deleted_count, content_type))
+    job.complete('complete')
+
+
+def delete_content_batch(job, content_type, content_ids):
+    corpus = job.corpus
+    ct_class = corpus.content_types[content_type].get_mongoengine_class(corpus)
+    contents = corpus.get_content(content_type, {'id__in': content_ids}, only=['id', 'uri', 'path', 'ordinal'])
+    contents = [content for content in contents]
+    if not contents:
+        return 0
+
+    content_oids = [content.id for content in contents]
+    content_ids = [str(content_oid) for content_oid in content_oids]
+
+    try:
+        # record deletions so references to this content get cleaned up
+        reffing_cts = corpus.get_referencing_content_type_fields(content_type)
+        deletions = []
+        for content in contents:
+            if reffing_cts or content.path:
+                deletion = ContentDeletion()
+                if reffing_cts:
+                    deletion.uri = content.uri
+                if content.path:
+                    deletion.path = content.path
+                deletions.append(deletion)
+
+        if deletions:
+            ContentDeletion.objects.insert(deletions, load_bulk=False)
+
+        # what the deleted content was linked to is kept for maintaining content views
+        unlinked = run_neo(
+            '''
+                UNWIND $content_uris AS content_uri
+                MATCH (d:{content_type} {{ uri: content_uri }})
+                OPTIONAL MATCH (d) -- (neighbor)
+                WITH d, d.uri AS uri, collect(distinct neighbor.uri) AS neighbors
+                DETACH DELETE d
+                RETURN uri, neighbors
+            '''.format(content_type=content_type),
+            {
+                'content_uris': [content.uri for content in contents if content.uri]
+            }
+        )
+        corpus.bump_graph_version()
+        neighbors = {res['uri']: [uri for uri in res['neighbors'] if uri] for res in unlinked or []}
+
+        get_connection().delete_by_query(
+            index="corpus-{0}-{1}".format(corpus.id, content_type.lower()),
+            body={'query': {'ids': {'values': content_ids}}},
+            conflicts='proceed',
+            refresh=True
+        )
+        index_suggestions(corpus.id, make_suggestion_deletions(corpus.id, corpus.content_types[content_type], content_ids))
+        corpus.bump_content_version(content_type)
+
+        ct_class.delete_auxiliary_content(content_oids)
+        ct_class._get_collection().delete_many({'_id': {'$in': content_oids}})
+        delete_provenance(corpus, content_type, content_ids)
+
+        ContentView.queue_changes(corpus, content_type, [{
+            'id': str(content.id),
+            'uri': content.uri,
+            'ordinal': content.ordinal,
+            'action': 'delete',
+            'neighbors': neighbors.get(content.uri, [])
+        } for content in contents])
+    except:
+        job.report("Error deleting a batch of {0}:\n{1}".format(content_type, traceback.format_exc()))
+        return 0
+
+    return len(contents)
+
+
+def record_bulk_deletion_progress(job, deleted_count, percent_complete):
+    job.configuration['parameters']['deleted_count']['value'] = deleted_count
+    job.set_status('running', percent_complete=min(percent_complete, 99))
+
+
 @db_periodic_task(crontab(minute='*'), priority=4)
 def check_jobs():
     # the bool below is for preventing race conditions when django app is replicated in a cluster
@@ -595,6 +776,14 @@ def check_jobs():
                         else:
                             job.complete(status='complete')
 
+                    # pick resumable jobs back up if their worker likely died
+                    elif datetime.now().timestamp() - job.status_time.timestamp() > settings.JOB_TIMEOUT_SECS and \
+                            job.jobsite.task_registry[job.task.name].get('resumable', False) and \
+                            job.tries < settings.JOB_MAX_RESUME_TRIES:
+                        job.tries += 1
+                        job.set_status('enqueued')
+                        run_job(job.id)
+
                     # clean up timed out (likely errored out) jobs
                     elif datetime.now().timestamp() - job.status_time.timestamp() > settings.JOB_TIMEOUT_SECS:
                         if job.report_path:
@@ -705,7 +894,7 @@ def adjust_content(job_id):
     job.complete(status='complete')
 
 
-def adjust_content_slice(corpus, content_type, start, end, reindex, relabel, resave, relink, scrub_provenance=False):
+def adjust_content_slice(corpus, content_type, start, end, reindex, relabel, resave, relink):
     errors = []
     max_errors = 10
     contents = corpus.get_content(content_type, all=True).no_cache()
@@ -715,9 +904,6 @@ def adjust_content_slice(corpus, content_type, start, end, reindex, relabel, res
 
     for content in contents:
         try:
-            if scrub_provenance:
-                content.provenance = []
-
             if relabel:
                 content.label = ''
 
@@ -750,15 +936,11 @@ def adjust_content_slice(corpus, content_type, start, end, reindex, relabel, res
 def scrub_all_provenance():
     corpora = Corpus.objects()
     for corpus in corpora:
-        corpus.provenance = []
-        corpus.save()
+        drop_provenance_collection(corpus)
 
-        for content_type in corpus.content_types.keys():
-            contents = corpus.get_content(content_type, {"provenance__exists": True, "provenance__not__size": 0}).no_cache()
-            contents = contents.batch_size(10)
-            for content in contents:
-                content.provenance = []
-                content.save()
+        # any provenance still embedded in documents from before it had its own collection is removed in place
+        for content_type in ['Corpus'] + list(corpus.content_types.keys()):
+            migrate_embedded_provenance(corpus, content_type, keep=False)
 
 
 @db_task(priority=5)
@@ -1080,13 +1262,69 @@ def content_view_lifecycle(job_id):
         job.complete(status='error')
 
 
+@db_periodic_task(crontab(minute='*/5'), priority=3)
+def refill_captcha_pool():
+    try:
+        captchas_added = fill_captcha_pool()
+        if captchas_added:
+            print(f"Added {captchas_added} captchas to the captcha pool.")
+    except:
+        print("Error refilling the captcha pool:")
+        print(traceback.format_exc())
+
+
+@db_task(priority=4)
+def process_content_view_changes():
+    try:
+        ContentView.process_changes()
+    except:
+        print("Error processing content view changes:")
+        print(traceback.format_exc())
+
+
+@db_task(priority=4)
+def settle_content_version(corpus_id, content_type):
+    try:
+        corpus = get_corpus(corpus_id)
+        if corpus:
+            corpus.settle_content_version(content_type)
+    except:
+        print("Error settling content version for {0} in corpus {1}:".format(content_type, corpus_id))
+        print(traceback.format_exc())
+
+
+@db_task(priority=4)
+def flush_scholar_preferences(scholar_id):
+    try:
+        if Scholar.flush_preferences(scholar_id):
+            # the scholar's other sessions cache a copy of the scholar without the saved preferences
+            scholar = Scholar.objects(id=scholar_id).only('username').first()
+            user = User.objects.filter(username=scholar.username).first() if scholar else None
+            if user:
+                clear_cached_session_scholar(user.id)
+    except:
+        print("Error saving preferences for scholar {0}:".format(scholar_id))
+        print(traceback.format_exc())
+
+
+@db_task(priority=4)
+def count_graph_pattern(corpus_id, target_ct, graph_steps):
+    corpus = get_corpus(corpus_id)
+    if corpus:
+        run_pattern_count(corpus, target_ct, graph_steps)
+
+
 @db_periodic_task(crontab(minute=1, hour='*/12'), priority=4)
 def audit_content_views():
+    # content views are kept current by process_content_view_changes, so this only catches changes made without
+    # saving or deleting content through the Corpus API (i.e. bulk writes straight to the database)
     print('Auditing content views...')
+    ContentView.process_changes()
     cvs = ContentView.objects(status='populated')
 
     for cv in cvs:
         print(cv.name)
+        cv.register_relevant_cts()
         needs_refresh = False
         for relevant_ct in cv.relevant_cts:
             if relevant_ct in cv.corpus.content_types:
@@ -1109,78 +1347,31 @@ def audit_content_views():
 
 @db_periodic_task(crontab(minute=1, hour='*'), priority=4)
 def content_deletion_cleanup():
-    corpora = {}
-    reindex_cts = []
-    deletions = ContentDeletion.objects()
-    for deletion in deletions:
-        deletion_handled = True
-
-        if deletion.uri:
-
-            del_corpus_id = deletion.corpus_id
-            del_content_type = deletion.content_type
-            del_content_id = deletion.content_id
-            refs_deleted = 0
-
-            if del_corpus_id not in corpora:
-                corpora[del_corpus_id] = {
-                    'instance': get_corpus(del_corpus_id),
-                    'ct_ref_fields': {}
-                }
-
-            if corpora[del_corpus_id]['instance']:
-                if del_content_type not in corpora[del_corpus_id]['ct_ref_fields']:
-                    corpora[del_corpus_id]['ct_ref_fields'][del_content_type] = corpora[del_corpus_id]['instance'].get_referencing_content_type_fields(del_content_type)
-
-                for reffing_ct in corpora[del_corpus_id]['ct_ref_fields'][del_content_type].keys():
-                    for reffing_field in corpora[del_corpus_id]['ct_ref_fields'][del_content_type][reffing_ct]:
-                        criteria = {reffing_field.name: del_content_id}
-                        if reffing_field.multiple:
-                            criteria = {"{0}__contains".format(reffing_field.name): del_content_id}
-
-                        reffing_contents = corpora[del_corpus_id]['instance'].get_content(reffing_ct, criteria).no_cache()
-                        reffing_contents = reffing_contents.batch_size(100)
-                        for reffing_content in reffing_contents:
-                            new_value = None
-                            if reffing_field.multiple:
-                                new_value = getattr(reffing_content, reffing_field.name)
-                                new_value = [ref for ref in new_value if not str(ref.id) == del_content_id]
-                            setattr(reffing_content, reffing_field.name, new_value)
-
-                            try:
-                                reffing_content.save(do_indexing=False, do_linking=False)
-                                refs_deleted += 1
-
-                                reindex_ct = f"{del_corpus_id}_{reffing_ct}"
-                                if reindex_ct not in reindex_cts:
-                                    reindex_cts.append(reindex_ct)
-                            except:
-                                caught_error = traceback.format_exc()
-                                if "Tried to save duplicate unique keys" in caught_error:
-                                    reffing_content.delete()
-                                    refs_deleted += 1
-                                else:
-                                    print(caught_error)
-                                    deletion_handled = False
-
-                print('Removed {0} references to deleted content {1}'.format(refs_deleted, deletion.uri))
+    # group deletions by corpus and content type so that references to all deleted content of a given type can be
+    # removed with one update per referencing content type and field
+    deletions_by_corpus = {}
+    handled_deletions = []
+    for deletion in ContentDeletion.objects():
+        if deletion.uri and deletion.corpus_id:
+            if deletion.corpus_id not in deletions_by_corpus:
+                deletions_by_corpus[deletion.corpus_id] = {}
+            if deletion.content_type not in deletions_by_corpus[deletion.corpus_id]:
+                deletions_by_corpus[deletion.corpus_id][deletion.content_type] = []
+            deletions_by_corpus[deletion.corpus_id][deletion.content_type].append(deletion)
+        else:
+            handled_deletions.append(deletion)
 
-        if deletion_handled:
-            if deletion.path and os.path.exists(deletion.path):
-                shutil.rmtree(deletion.path)
+    for del_corpus_id, del_content_types in deletions_by_corpus.items():
+        corpus = get_corpus(del_corpus_id)
+        for del_content_type, deletions in del_content_types.items():
+            if not corpus or remove_content_references(corpus, del_content_type, [d.content_id for d in deletions]):
+                handled_deletions += deletions
 
-            deletion.delete()
+    for deletion in handled_deletions:
+        if deletion.path and os.path.exists(deletion.path):
+            shutil.rmtree(deletion.path)
 
-    for reindex_ct in reindex_cts:
-        reindex_ct_parts = reindex_ct.split('_')
-        if reindex_ct_parts[0] in corpora:
-            corpora[reindex_ct_parts[0]]['instance'].queue_local_job(task_name="Adjust Content", parameters={
-                'content_type': reindex_ct_parts[1],
-                'reindex': True,
-                'relabel': True,
-                'resave': False,
-                'related_content_types': ''
-            })
+        deletion.delete()
 
     # sweep for "expired" temporary uploads
     expired_uploads = TemporaryUpload.objects.filter(uploaded__lte=datetime.now()-timedelta(days=1))
@@ -1188,6 +1379,115 @@ def content_deletion_cleanup():
         upload.delete()
 
 
+def remove_content_references(corpus, content_type, content_ids):
+    handled = True
+    content_oids = [ObjectId(content_id) for content_id in content_ids]
+    reffing_cts = corpus.get_referencing_content_type_fields(content_type)
+
+    for reffing_ct, reffing_fields in reffing_cts.items():
+        affected_ids = set()
+        deleted_ids = set()
+
+        for reffing_field in reffing_fields:
+            criteria = {'__raw__': {reffing_field.name: {'$in': content_oids}}}
+            if reffing_field.multiple:
+                update = {'$pull': {reffing_field.name: {'$in': content_oids}}}
+            else:
+                update = {'$unset': {reffing_field.name: 1}}
+
+            field_affected_ids = set(corpus.get_content(reffing_ct, criteria).scalar('id'))
+            if not field_affected_ids:
+                continue
+
+            try:
+                corpus.get_content(reffing_ct, criteria).update(__raw__=update)
+            except NotUniqueError:
+                # removing the reference would make some content duplicate other content on a unique field, so
+                # clear references one at a time and delete content that can't be saved without its reference
+                for reffing_content in corpus.get_content(reffing_ct, criteria).no_cache():
+                    try:
+                        reffing_content.update(__raw__=update)
+                    except NotUniqueError:
+                        deleted_ids.add(reffing_content.id)
+                        reffing_content.delete()
+            except:
+                print(traceback.format_exc())
+                handled = False
+
+            affected_ids.update(field_affected_ids)
+
+        affected_ids = affected_ids - deleted_ids
+        if affected_ids:
+            errors = reindex_content(corpus, reffing_ct, list(affected_ids), relabel=True)
+            if errors:
+                print("\n\n".join(errors))
+
+        print('Removed references from {0} {1} content to deleted {2} content in corpus {3}'.format(
+            len(affected_ids) + len(deleted_ids),
+            reffing_ct,
+            content_type,
+            corpus.id
+        ))
+
+    # the graph nodes for deleted content are normally removed when the content is deleted, but remove any left behind
+    run_neo(
+        '''
+            UNWIND $content_uris AS content_uri
+            MATCH (d:{content_type} {{ uri: content_uri }})
+            DETACH DELETE d
+        '''.format(content_type=content_type),
+        {
+            'content_uris': ["/corpus/{0}/{1}/{2}".format(corpus.id, content_type, content_id) for content_id in content_ids]
+        }
+    )
+    corpus.bump_graph_version()
+
+    return handled
+
+
+def reindex_content(corpus, content_type, content_ids, relabel=False, batch_size=500):
+    errors = []
+    es_index = "corpus-{0}-{1}".format(corpus.id, content_type.lower())
+    collection = corpus.content_types[content_type].get_mongoengine_class(corpus)._get_collection()
+
+    for start in range(0, len(content_ids), batch_size):
+        label_updates = []
+        index_actions = []
+        suggestion_actions = []
+
+        contents = corpus.get_content(content_type, {'id__in': content_ids[start:start + batch_size]}).no_cache()
+        for content in contents:
+            try:
+                if relabel:
+                    old_label = content.label
+                    content._make_label()
+                    if content.label != old_label:
+                        label_updates.append(UpdateOne({'_id': content.id}, {'$set': {'label': content.label}}))
+
+                index_obj = content._make_index_obj()
+                index_actions.append({
+                    '_index': es_index,
+                    '_id': str(content.id),
+                    '_source': index_obj
+                })
+                suggestion_actions += make_suggestion_actions(corpus.id, corpus.content_types[content_type], str(content.id), index_obj)
+            except:
+                errors.append("Error reindexing {0} with ID {1}:\n{2}".format(content_type, content.id, traceback.format_exc()))
+
+        if label_updates:
+            collection.bulk_write(label_updates, ordered=False)
+
+        if index_actions:
+            indexed, index_errors = bulk(get_connection(), index_actions, raise_on_error=False)
+            for index_error in index_errors:
+                errors.append("Error reindexing {0}: {1}".format(content_type, json.dumps(index_error, default=str)))
+            for suggestion_error in index_suggestions(corpus.id, suggestion_actions):
+                errors.append("Error indexing {0} suggestions: {1}".format(content_type, json.dumps(suggestion_error, default=str)))
+            corpus.bump_content_version(content_type)
+
+    return errors
+
+
 @db_task(priority=3)
 def backup_corpus(job_id):
     job = Job(job_id)
@@ -1246,13 +1546,20 @@ def backup_corpus(job_id):
 
         mongodb_uri = make_mongo_uri()
 
-        # Create MongoDB dump files for each content type collection
+        # Create MongoDB dump files for each content type collection (and any auxiliary collections), and for the
+        # corpus' provenance
+        db = corpus._get_db()
+        collection_names = []
         for ct_name, ct in corpus.content_types.items():
-            collection_name = "corpus_{0}_{1}".format(corpus.id, ct.name)
+            collection_names.append("corpus_{0}_{1}".format(corpus.id, ct.name))
+            collection_names += ct.get_mongoengine_class(corpus).get_auxiliary_collections()
+        collection_names.append(get_provenance_collection_name(corpus.id))
+
+        for collection_name in collection_names:
             collection_backup_file = backup_directory + '/' + collection_name
 
             # Ensure we have data in these collections
-            if corpus.get_content(ct_name, all=True).count() > 0:
+            if db[collection_name].estimated_document_count() > 0:
 
                 # Build mongodump command
                 command = [
@@ -1389,13 +1696,14 @@ def restore_corpus(backup_id):
 
                                 # todo: backup and restore content views
 
-                                if not foreign_import:
-                                    for prov_info in corpus_dict['provenance']:
-                                        prov = CompletedTask.from_dict(prov_info)
-                                        if prov:
-                                            corpus.provenance.append(prov)
-
                                 corpus.save()
+
+                                # backups made before provenance had its own collection have the corpus' provenance
+                                # in the corpus JSON
+                                if not foreign_import and corpus_dict.get('provenance'):
+                                    record_provenance_batch(corpus, 'Corpus', [
+                                        (corpus.id, CompletedTask.from_dict(prov_info)) for prov_info in corpus_dict['provenance']
+                                    ])
                                 if corpus.open_access:
                                     get_open_access_corpora(False)
 
@@ -1409,6 +1717,22 @@ def restore_corpus(backup_id):
 
                                 mongodb_uri = make_mongo_uri()
 
+                                # provenance isn't carried over from other instances of Corpora
+                                provenance_collection = get_provenance_collection_name(corpus.id)
+                                if not foreign_import:
+                                    try:
+                                        tar.extract(tar.getmember(provenance_collection), path=backup_directory)
+                                        if call([
+                                            'mongorestore',
+                                            '--uri="{0}"'.format(mongodb_uri),
+                                            '--archive={0}/{1}'.format(backup_directory, provenance_collection),
+                                        ]) == 0:
+                                            print("Collection {0} successfully restored :)".format(provenance_collection))
+                                        else:
+                                            print("Error restoring collection {0}!".format(provenance_collection))
+                                    except KeyError:
+                                        pass
+
                                 content_schema = []
                                 for ct_name, ct in corpus_dict['content_types'].items():
                                     content_schema.append(ct)
@@ -1420,6 +1744,22 @@ def restore_corpus(backup_id):
                                     collection = "corpus_{0}_{1}".format(corpus.id, ct_name)
                                     collection_dump_file = backup_directory + '/' + collection
 
+                                    # restore any auxiliary collections first so they're in place when content is resaved
+                                    auxiliary_collections = corpus.content_types[ct_name].get_mongoengine_class(corpus).get_auxiliary_collections()
+                                    for auxiliary_collection in auxiliary_collections:
+                                        try:
+                                            tar.extract(tar.getmember(auxiliary_collection), path=backup_directory)
+                                            if call([
+                                                'mongorestore',
+                                                '--uri="{0}"'.format(mongodb_uri),
+                                                '--archive={0}/{1}'.format(backup_directory, auxiliary_collection),
+                                            ]) == 0:
+                                                print("Collection {0} successfully restored :)".format(auxiliary_collection))
+                                            else:
+                                                print("Error restoring collection {0}!".format(auxiliary_collection))
+                                        except KeyError:
+                                            pass
+
                                     try:
                                         collection_dump_file_info = tar.getmember(collection)
                                         tar.extract(collection_dump_file_info, path=backup_directory)
@@ -1434,11 +1774,9 @@ def restore_corpus(backup_id):
                                         # Execute command and check return code
                                         if call(command) == 0:
                                             print("Collection {0} successfully restored :)".format(collection))
-                                            if foreign_import:
-                                                db = corpus._get_db()
-                                                db[collection].update_many({}, {'$set': {'provenance': []}})
+                                            migrate_embedded_provenance(corpus, ct_name, keep=not foreign_import)
 
-                                            adjust_content_slice(corpus, ct_name, None, None, True, True, True, True, foreign_import)
+                                            adjust_content_slice(corpus, ct_name, None, None, True, True, True, True)
                                         else:
                                             print("Error restoring collection {0}! Halting restore.".format(collection))
                                             run_job(corpus.queue_local_job(task_name="Delete Corpus", parameters={}))
@@ -1467,6 +1805,67 @@ def restore_corpus(backup_id):
         print("Error retrieving backup object for restore!")
 
 
+def export_content_type_data(corpus, ct_name, json_path, csv_path, export_csv):
+    ct_schema = corpus.content_types[ct_name].to_dict()
+
+    ct_json_file = f"{json_path}/{ct_name}.json"
+    ct_csv_file = f"{csv_path}/{ct_name}.csv"
+    with open(ct_json_file, 'w', encoding='utf-8') as ct_json_out:
+        with open(ct_csv_file, 'w', encoding='utf-8') as ct_csv_out:
+            contents = corpus.get_content(ct_name, all=True)
+            contents = contents.order_by('id')
+            contents = contents.no_cache()
+            contents = contents.batch_size(10)
+
+            content_count = contents.count()
+            ct_schema['total_content'] = content_count
+
+            chunk_size = 1000
+            chunk_byte_sizes = []
+            chunks = math.ceil(content_count / chunk_size)
+
+            for chunk in range(0, chunks):
+                start = chunk * chunk_size
+                end = start + chunk_size
+
+                content_slice = contents[start:end]
+                content_json = delimit_content_json(content_slice)
+
+                if chunks > 1:
+                    if chunk == 0:
+                        content_json = '[' + content_json + ', '
+                    elif chunk == chunks - 1:
+                        content_json = content_json + ']'
+                    else:
+                        content_json = content_json + ', '
+                else:
+                    content_json = '[' + content_json + ']'
+
+                chunk_byte_sizes.append(len(content_json.encode('utf-8')) / content_slice.count())
+                ct_json_out.write(content_json)
+
+                if export_csv:
+                    content_csv = create_content_csv_rows(content_slice)
+
+                    if chunks == 1 or chunk == 0:
+                        header_fields = [field.name for field in corpus.content_types[ct_name].fields]
+                        header_fields = ['id', 'label', 'uri'] + header_fields
+                        header_row = f"{','.join(header_fields)}\n"
+                        content_csv = f"{header_row}{content_csv}"
+
+                    else:
+                        content_csv = f"\n{content_csv}"
+
+                    ct_csv_out.write(content_csv)
+
+            if chunks and chunk_byte_sizes:
+                ct_schema['average_byte_size'] = math.ceil(sum(chunk_byte_sizes) / chunks)
+            else:
+                ct_schema['average_byte_size'] = 0
+
+    return ct_schema
+
+
 @db_task(priority=3)
 def export_corpus(job_id):
     from django.template.autoreload import reset_loaders
@@ -1508,63 +1907,9 @@ def export_corpus(job_id):
     os.makedirs(csv_path, exist_ok=True)
 
     for ct_name in corpus.content_types.keys():
-        schema.append(corpus.content_types[ct_name].to_dict())
-
-        ct_json_file = f"{json_path}/{ct_name}.json"
-        ct_csv_file = f"{csv_path}/{ct_name}.csv"
-        with open(ct_json_file, 'w', encoding='utf-8') as ct_json_out:
-            with open(ct_csv_file, 'w', encoding='utf-8') as ct_csv_out:
-                contents = corpus.get_content(ct_name, all=True)
-                contents = contents.order_by('id')
-                contents = contents.no_cache()
-                contents = contents.batch_size(10)
-
-                content_count = contents.count()
-                schema[-1]['total_content'] = content_count
-                total_content_count += content_count
-
-                chunk_size = 1000
-                chunk_byte_sizes = []
-                chunks = math.ceil(content_count / chunk_size)
-
-                for chunk in range(0, chunks):
-                    start = chunk * chunk_size
-                    end = start + chunk_size
-
-                    content_slice = contents[start:end]
-                    content_json = delimit_content_json(content_slice)
-
-                    if chunks > 1:
-                        if chunk == 0:
-                            content_json = '[' + content_json + ', '
-                        elif chunk == chunks - 1:
-                            content_json = content_json + ']'
-                        else:
-                            content_json = content_json + ', '
-                    else:
-                        content_json = '[' + content_json + ']'
-
-                    chunk_byte_sizes.append(len(content_json.encode('utf-8')) / content_slice.count())
-                    ct_json_out.write(content_json)
-
-                    if export_csv:
-                        content_csv = create_content_csv_rows(content_slice)
-
-                        if chunks == 1 or chunk == 0:
-                            header_fields = [field.name for field in corpus.content_types[ct_name].fields]
-                            header_fields = ['id', 'label', 'uri'] + header_fields
-                            header_row = f"{','.join(header_fields)}\n"
-                            content_csv = f"{header_row}{content_csv}"
-
-                        else:
-                            content_csv = f"\n{content_csv}"
-
-                        ct_csv_out.write(content_csv)
-
-                if chunks and chunk_byte_sizes:
-                    schema[-1]['average_byte_size'] = math.ceil(sum(chunk_byte_sizes) / chunks)
-                else:
-                    schema[-1]['average_byte_size'] = 0
+        ct_schema = export_content_type_data(corpus, ct_name, json_path, csv_path, export_csv)
+        total_content_count += ct_schema['total_content']
+        schema.append(ct_schema)
 
     if schema:
         with open(f"{json_path}/schema.json", 'w', encoding='utf-8') as schema_out:
@@ -2,22 +2,30 @@ import os
 import re
 import json
 import uuid
+import time
 import redis
+import hashlib
 import traceback
 import tarfile
 from copy import deepcopy
+from bson.objectid import ObjectId
 from mongoengine.queryset.visitor import Q
 from django.utils.html import escape
+from elasticsearch_dsl.connections import get_connection
 from django.conf import settings
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from urllib.parse import unquote
 from django_eventstream import send_event
 from django_drf_filepond.models import TemporaryUpload
+from rest_framework.authtoken.models import Token
 from corpus import (
     Corpus, CorpusBackup, Scholar,
     JobSite, Task,
     File, GitRepo, Timespan,
     get_corpus, parse_date_string
 )
+from corpus.utilities import get_async_mongo, get_async_redis
 
 
 # for use by the fix_mongo_json function:
@@ -152,9 +160,245 @@ def _get_context(req):
         else:
             req.session.set_expiry(0)
 
+    set_search_profiling(req, context)
     return context
 
 
+async def _aget_context(req):
+    """
+    The async views' counterpart to _get_context. Since DRF can't serve async views, API tokens are checked here, and
+    both the token's user and their scholar record are cached in Redis so that authenticating a request is usually a
+    single round trip. Session-authenticated requests use the scholar already stored in the session.
+    """
+
+    context = {
+        'errors': [],
+        'messages': [],
+        'scholar': {},
+        'url': req.build_absolute_uri(req.get_full_path()),
+        'only': [],
+        'search': build_search_params_from_dict(req.GET)
+    }
+
+    if 'msg' in req.GET:
+        context['messages'].append(req.GET['msg'])
+    elif 'only' in req.GET:
+        context['only'] = req.GET['only'].split(',')
+        if context['search']:
+            context['search']['only'] = context['only']
+
+    scholar = None
+    authorization = req.META.get('HTTP_AUTHORIZATION', '')
+    try:
+        if authorization.startswith('Token '):
+            api_user = await aget_api_user(authorization[6:].strip())
+            if api_user:
+                scholar = await aget_scholar(api_user['id'], api_user['username'])
+
+                # as with _get_context, tokens may only be used from the scholar's registered IPs
+                if scholar and req.META.get('HTTP_X_REAL_IP') not in scholar.auth_token_ips:
+                    scholar = None
+        else:
+            user = await req.auser()
+            if user.is_authenticated:
+                scholar_json = await req.session.aget('scholar_json', None)
+                if scholar_json:
+                    scholar = Scholar.from_json(scholar_json)
+                else:
+                    scholar = await aget_scholar(user.id, user.username)
+    except:
+        print(traceback.format_exc())
+        scholar = None
+
+    context['scholar'] = scholar or {}
+    set_search_profiling(req, context)
+    return context
+
+
+def set_search_profiling(req, context):
+    # as with the slow query log, profiling searches is only for admins
+    if context['search'] and 'profile' in req.GET and context['scholar'] and context['scholar'].is_admin:
+        context['search']['profile'] = True
+
+
+async def aget_api_user(token_key):
+    cache = get_async_redis()
+    # the token itself is never used as part of a cache key
+    cache_key = "/api_token/{0}".format(hashlib.sha256(token_key.encode('utf-8')).hexdigest())
+    api_user = await cache.get(cache_key)
+
+    if api_user:
+        return json.loads(api_user)
+
+    try:
+        token = await Token.objects.select_related('user').aget(key=token_key)
+    except Token.DoesNotExist:
+        return None
+
+    if not token.user.is_active:
+        return None
+
+    api_user = {'id': token.user.id, 'username': token.user.username}
+    await cache.set(cache_key, json.dumps(api_user), ex=settings.API_AUTH_CACHE_SECONDS)
+    return api_user
+
+
+async def aget_scholar(user_id, username):
+    cache = get_async_redis()
+    cache_key = "/api_scholar/{0}".format(user_id)
+    scholar_json = await cache.get(cache_key)
+
+    if scholar_json:
+        return Scholar.from_json(scholar_json)
+
+    scholar_doc = await get_async_mongo()[Scholar._get_collection_name()].find_one({'username': username})
+    if not scholar_doc:
+        return None
+
+    scholar = Scholar._from_son(scholar_doc)
+    await cache.set(cache_key, scholar.to_json(), ex=settings.API_AUTH_CACHE_SECONDS)
+    return scholar
+
+
+# corpus ID -> (schema version, expiry time, Corpus)
+corpus_cache = {}
+
+
+async def aget_corpus(corpus_id):
+    """
+    Corpus documents are kept in memory for up to CORPUS_CACHE_SECONDS. Saving or deleting a corpus bumps its schema
+    version in Redis, and any cached copy with an older version is reloaded.
+    """
+
+    version = await get_async_redis().get("/corpus/{0}/schema_version".format(corpus_id)) or '0'
+    cached = corpus_cache.get(corpus_id)
+    if cached and cached[0] == version and cached[1] > time.time():
+        return cached[2]
+
+    corpus = None
+    if ObjectId.is_valid(corpus_id):
+        corpus_doc = await get_async_mongo()[Corpus._get_collection_name()].find_one({'_id': ObjectId(corpus_id)})
+        if corpus_doc:
+            corpus = Corpus._from_son(corpus_doc)
+            corpus_cache[corpus_id] = (version, time.time() + settings.CORPUS_CACHE_SECONDS, corpus)
+        else:
+            corpus_cache.pop(corpus_id, None)
+
+    return corpus
+
+
+async def aget_scholar_corpus(corpus_id, scholar):
+    corpus = None
+    role = 'Viewer'
+
+    if (scholar and scholar.is_admin) or \
+            (scholar and corpus_id in scholar.available_corpora.keys()) or \
+            corpus_id in await aget_open_access_corpora():
+
+        corpus = await aget_corpus(corpus_id)
+        if scholar and scholar.is_admin:
+            role = 'Admin'
+        elif scholar and corpus_id in scholar.available_corpora.keys():
+            role = scholar.available_corpora[corpus_id]
+
+    return corpus, role
+
+
+async def aget_open_access_corpora():
+    cache = get_async_redis()
+    oa_corpora_list = await cache.get('/open_access_corpora')
+    if oa_corpora_list is None:
+        corpora = get_async_mongo()[Corpus._get_collection_name()].find({'open_access': True}, {'_id': 1})
+        oa_corpora_list = ",".join([str(corpus['_id']) async for corpus in corpora])
+        await cache.set('/open_access_corpora', oa_corpora_list, ex=3600)
+
+    return [corpus_id for corpus_id in oa_corpora_list.split(',') if corpus_id]
+
+
+# API responses carry an ETag built from the versions of everything that goes into them (see Corpus.get_versions),
+# and for single pieces of content, a Last-Modified date from their last_updated timestamp. Both are looked up without
+# loading anything, so that a conditional request for something unchanged can be answered with a 304 straight away.
+def make_etag(*parts):
+    return quote_etag(hashlib.sha1(json.dumps(parts, default=str).encode('utf-8')).hexdigest())
+
+
+def get_xref_content_types(corpus, content_type):
+    # the labels of cross-referenced content are part of a piece of content's representation
+    return sorted(set(
+        field.cross_reference_type for field in corpus.content_types[content_type].fields if field.cross_reference_type
+    ))
+
+
+def make_content_validators(corpus, content_type, content_id, last_updated, versions, req):
+    if content_id:
+        if not last_updated:
+            return None, None
+        etag = make_etag(
+            str(corpus.id), content_type, content_id, last_updated.timestamp(), versions, sorted(req.GET.lists())
+        )
+        # the content's last_updated timestamp covers neither the labels of the content it references nor its
+        # provenance, which recording provenance doesn't update
+        if get_xref_content_types(corpus, content_type) or 'include-provenance' in req.GET:
+            return etag, None
+        return etag, int(last_updated.timestamp())
+
+    # search results change when content of the content type is indexed (and again once its index has refreshed; see
+    # Corpus.bump_content_version), or the content views they're filtered by change
+    return make_etag(str(corpus.id), content_type, versions, sorted(req.GET.lists())), None
+
+
+def get_content_validators(corpus, content_type, content_id, req):
+    """
+    Get the ETag and Last-Modified timestamp for a content API response: either a single piece of content, or, with no
+    content_id, a page of search results. Only content of content types without cross-reference fields gets a
+    Last-Modified timestamp.
+    """
+
+    if content_id:
+        last_updated = corpus.get_content_last_updated(content_type, content_id)
+        versions = corpus.get_versions(
+            get_xref_content_types(corpus, content_type),
+            provenance='include-provenance' in req.GET
+        ) if last_updated else []
+    else:
+        last_updated = None
+        versions = corpus.get_versions([content_type], content_views=True)
+    return make_content_validators(corpus, content_type, content_id, last_updated, versions, req)
+
+
+async def aget_content_validators(corpus, content_type, content_id, req):
+    if content_id:
+        last_updated = await corpus.aget_content_last_updated(content_type, content_id)
+        versions = await corpus.aget_versions(
+            get_xref_content_types(corpus, content_type),
+            provenance='include-provenance' in req.GET
+        ) if last_updated else []
+    else:
+        last_updated = None
+        versions = await corpus.aget_versions([content_type], content_views=True)
+    return make_content_validators(corpus, content_type, content_id, last_updated, versions, req)
+
+
+def get_not_modified_response(req, etag, last_modified=None):
+    """
+    Return a 304 (or for a failed If-Match, a 412) response if the request's conditions call for one, otherwise None.
+    """
+
+    if etag or last_modified:
+        response = get_conditional_response(req, etag=etag, last_modified=last_modified)
+        if response:
+            return set_validators(response, etag, last_modified)
+    return None
+
+
+def set_validators(response, etag, last_modified=None):
+    if etag:
+        response.headers['ETag'] = etag
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(last_modified)
+    return response
+
+
 def build_search_params_from_dict(params):
     search = {}
     grouped_params = {}
@@ -199,6 +443,7 @@ def build_search_params_from_dict(params):
             'highlight_fragment_size',
             'only_highlights',
             'page-token',
+            'page_query',
             'es_debug',
             'es_debug_query'
         ] or param[:2] in ['q_', 't_', 'p_', 's_', 'f_', 'r_', 'w_', 'e_', 'a_', '1_', '2_', '3_', '4_', '5_', '6_', '7_', '8_', '9_']):
@@ -216,6 +461,8 @@ def build_search_params_from_dict(params):
             search['content_view'] = value
         elif param == 'page-token':
             search['next_page_token'] = value
+        elif param == 'page_query':
+            search['page_query'] = value
         elif param == 'q':
             search['general_query'] = value
         elif param.startswith('q_'):
@@ -381,6 +628,8 @@ def clear_cached_session_scholar(user_id):
                 session.pop('scholar_json')
                 session.save()
 
+    redis.Redis(host=settings.REDIS_HOST).delete("/api_scholar/{0}".format(user_id))
+
 
 def get_open_access_corpora(use_cache=True):
     oa_corpora = []
@@ -763,3 +1012,110 @@ def convert_content_to_csv_row(content):
 
 def create_content_csv_rows(contents):
     return '\n'.join([convert_content_to_csv_row(c) for c in contents])
+
+
+def iterate_search_id_batches(corpus, content_type, search, batch_size=1000, keep_alive='2m'):
+    # walk every match for the search using a point in time so results stay consistent and no deep paging is needed
+    search = deepcopy(search)
+    for paging_param in ['page', 'page_size', 'only', 'next_page_token', 'aggregations']:
+        search.pop(paging_param, None)
+
+    # the search's own sort and min_score are kept so that the batches hold the same results in the same order, with
+    # the point in time's _shard_doc breaking any ties
+    search_body = corpus.search_content(content_type, generate_sorted_query_only=True, **search)
+    search_body['sort'] = search_body.get('sort', []) + [{'_shard_doc': 'asc'}]
+    es = get_connection()
+    pit_id = es.open_point_in_time(
+        index="corpus-{0}-{1}".format(corpus.id, content_type.lower()),
+        keep_alive=keep_alive
+    )['id']
+
+    try:
+        search_after = None
+        while True:
+            body = dict(search_body, size=batch_size, _source=False, pit={'id': pit_id, 'keep_alive': keep_alive})
+            if search_after:
+                body['search_after'] = search_after
+
+            results = es.search(body=body)
+            hits = results['hits']['hits']
+            if not hits:
+                break
+
+            pit_id = results.get('pit_id', pit_id)
+            search_after = hits[-1]['sort']
+            yield [hit['_id'] for hit in hits]
+    finally:
+        es.close_point_in_time(body={'id': pit_id})
+
+
+def iterate_content_batches(corpus, content_type, id_batches=None, only=[], batch_size=1000, start_after=None):
+    # with no id batches, walk all content for the content type by _id rather than skipping through it
+    if id_batches is None:
+        last_id = ObjectId(start_after) if start_after else None
+        while True:
+            query = {'id__gt': last_id} if last_id else {}
+            contents = corpus.get_content(content_type, query, only=only, all=True).order_by('id').limit(batch_size)
+            contents = [content for content in contents.no_cache()]
+            if not contents:
+                break
+
+            last_id = contents[-1].id
+            yield contents
+    else:
+        # each batch is kept in the order of its ids (i.e. a search's order)
+        for content_ids in id_batches:
+            contents = corpus.get_content(content_type, {'id__in': content_ids}, only=only)
+            contents_by_id = {str(content.id): content for content in contents.no_cache()}
+            yield [contents_by_id[str(content_id)] for content_id in content_ids if str(content_id) in contents_by_id]
+
+
+def stream_content_export(corpus, content_type, csv_format=False, search=None, content_ids=None, batch_size=1000):
+    """
+    Generate an export of content in chunks, holding only one batch of content in memory at a time.
+
+    Args:
+        corpus: The Corpus the content belongs to.
+        content_type (str): The name of the Content Type to export.
+        csv_format (bool): Whether to export CSV rows rather than a JSON array.
+        search (dict): Search parameters (as passed to search_content) for selecting content to export.
+        content_ids (list): Specific content IDs to export. If neither this nor search is given, all content is exported.
+        batch_size (int): How many pieces of content to read and serialize per chunk.
+
+    Yields:
+        Strings which, concatenated, form the export.
+    """
+
+    id_batches = None
+    if search is not None:
+        id_batches = iterate_search_id_batches(corpus, content_type, search, batch_size)
+    elif content_ids is not None:
+        id_batches = (content_ids[start:start + batch_size] for start in range(0, len(content_ids), batch_size))
+
+    only = []
+    field_names = [field.name for field in corpus.content_types[content_type].fields]
+    if csv_format:
+        only = ['label', 'uri'] + field_names
+        yield "{0}\n".format(','.join(['id', 'label', 'uri'] + field_names))
+    else:
+        yield '['
+
+    first_batch = True
+    for contents in iterate_content_batches(corpus, content_type, id_batches, only, batch_size):
+        if not contents:
+            continue
+
+        if csv_format:
+            exported_content = create_content_csv_rows(contents)
+            delimiter = '\n'
+        else:
+            exported_content = delimit_content_json(contents)
+            delimiter = ', '
+
+        if not first_batch:
+            exported_content = delimiter + exported_content
+        first_batch = False
+        yield exported_content
+
+    if not csv_format:
+        yield ']'
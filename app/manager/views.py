@@ -1,6 +1,5 @@
 import subprocess
 import mimetypes
-import asyncio
 from copy import deepcopy
 from ipaddress import ip_address
 from asgiref.sync import sync_to_async
@@ -9,6 +8,7 @@ from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.template import Context, Template
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_GET
 from django.contrib.auth.models import User
 from mongoengine.errors import NotUniqueError
 from rest_framework.decorators import api_view
@@ -19,21 +19,33 @@ from types import SimpleNamespace
 from html import unescape
 from time import sleep
 from corpus import (
-    Scholar, Task,
+    Scholar, Task, SlowQuery, Content,
     ContentTypeGroupMember, FieldRenderer,
-    run_neo, get_network_json, search_corpora, search_scholars,
+    run_neo, search_corpora, search_scholars,
     FIELD_LANGUAGES
 )
-from corpus.utilities import parse_graph_steps, build_cypher_from_graph_steps
+from corpus.utilities import parse_graph_steps
+from corpus.network import get_network, aget_network
+from corpus.patterns import count_pattern, acount_pattern
+from corpus.provenance import get_provenance, aget_provenance, get_completed_task, delete_provenance
 from .captcha import generate_captcha, validate_captcha
+from .metrics import render_metrics
+from .serialization import json_response
 from .tasks import *
 from .utilities import (
     _get_context,
+    _aget_context,
     _clean,
     _contains,
     build_search_params_from_dict,
     get_scholar_corpora,
     get_scholar_corpus,
+    aget_scholar_corpus,
+    get_content_validators,
+    aget_content_validators,
+    get_not_modified_response,
+    make_etag,
+    set_validators,
     scholar_has_privilege,
     get_open_access_corpora,
     parse_uri,
@@ -44,8 +56,7 @@ from .utilities import (
     process_content_bundle,
     process_corpus_backup_file,
     fix_mongo_json,
-    delimit_content_json,
-    create_content_csv_rows,
+    stream_content_export,
     send_alert
 )
 
@@ -139,22 +150,18 @@ def corpus(request, corpus_id):
                         ))
                     else:
                         deletion_ids = [d_id for d_id in deletion_ids.split(',') if d_id]
-                        deleted = []
-                        for deletion_id in deletion_ids:
-                            try:
-                                to_delete = corpus.get_content(deletion_ct, deletion_id)
-                                to_delete.delete()
-                                deleted.append(deletion_id)
-                            except:
-                                response['errors'].append(
-                                    "An error occurred when attempting to delete {0} with ID {1}!".format(deletion_ct,
-                                                                                                          deletion_id))
-                                print(traceback.format_exc())
-
-                        if deleted:
-                            response['messages'].append("The following {0} were successfully deleted:<br><br>{1}".format(
-                                corpus.content_types[deletion_ct].plural_name,
-                                '<br>'.join(deleted)
+                        if deletion_ids:
+                            run_job(corpus.queue_local_job(
+                                task_name="Bulk Delete Content",
+                                scholar_id=response['scholar'].id,
+                                parameters={
+                                    'content_type': deletion_ct,
+                                    'content_ids': ','.join(deletion_ids)
+                                }
+                            ))
+                            response['messages'].append("{0} {1} are being deleted. You can monitor the progress of this deletion in the Jobs tab.".format(
+                                len(deletion_ids),
+                                corpus.content_types[deletion_ct].plural_name
                             ))
 
             # EDITOR OR HIGHER POST REQUESTS
@@ -960,13 +967,13 @@ async def export(request, corpus_id, content_type):
     export_file_extension = 'json'
     csv_format = 'csv-format' in request.GET
     export_all = False
+    export_search = None
     export_ids = []
-    contents = None
 
     if csv_format:
         export_file_extension = 'csv'
 
-    if corpus:
+    if corpus and content_type in corpus.content_types:
         if context['search']:
             has_filtering_query = False
             filtering_parameters = [
@@ -985,22 +992,7 @@ async def export(request, corpus_id, content_type):
                     has_filtering_query = True
 
             if has_filtering_query:
-                context['search']['page_size'] = 1000
-                context['search']['page'] = 1
-                context['search']['only'] = ['id']
-                collect_results = True
-                while collect_results:
-                    results = await sync_to_async(corpus.search_content)(content_type, **context['search'])
-                    if _contains(results, ['records', 'meta']):
-                        export_ids += [r['id'] for r in results['records']]
-                        if results['meta']['has_next_page']:
-                            context['search']['page'] += 1
-                            if results['meta']['next_page_token']:
-                                context['search']['next_page_token'] = results['meta']['next_page_token']
-                        else:
-                            collect_results = False
-                    else:
-                        collect_results = False
+                export_search = context['search']
             else:
                 export_all = True
 
@@ -1008,63 +1000,28 @@ async def export(request, corpus_id, content_type):
             export_ids = request.GET['content-ids']
             export_ids = [export_id for export_id in export_ids.split(',') if export_id]
 
-        if export_all:
-            contents = await sync_to_async(corpus.get_content)(content_type, all=True)
-            print('exporting all')
-        elif export_ids:
-            contents = await sync_to_async(corpus.get_content)(content_type, {'id__in': export_ids})
-            print(f'exporting ids: {export_ids}')
-
-        if contents:
-            async def async_range(count):
-                for i in range(count):
-                    yield (i)
-                    await asyncio.sleep(0.0)
+        if export_all or export_search or export_ids:
+            export_stream = stream_content_export(
+                corpus,
+                content_type,
+                csv_format=csv_format,
+                search=export_search,
+                content_ids=export_ids if export_ids else None
+            )
 
-            async def stream_exports(contents):
+            async def stream_exports():
+                # each chunk is read and serialized in a single trip to the sync thread, which also keeps the export
+                # generator (and any Elasticsearch point in time it holds open) on the same thread
                 try:
-                    contents = await sync_to_async(contents.no_cache)()
-                    contents = await sync_to_async(contents.batch_size)(10)
-                    chunk_size = 1000
-                    chunks = math.ceil(await sync_to_async(contents.count)() / chunk_size)
-                    async for chunk in async_range(chunks):
-                        start = chunk * chunk_size
-                        end = start + chunk_size
-
-                        content_slice = contents[start:end]
-                        exported_content = ''
-
-                        if csv_format:
-                            exported_content = await sync_to_async(create_content_csv_rows)(content_slice)
-
-                            if chunks == 1 or chunk == 0:
-                                header_fields = [field.name for field in corpus.content_types[content_type].fields]
-                                header_fields = ['id', 'label', 'uri'] + header_fields
-                                header_row = f"{','.join(header_fields)}\n"
-                                exported_content = f"{header_row}{exported_content}"
-
-                            else:
-                                exported_content = f"\n{exported_content}"
-
-                        else:
-                            exported_content = await sync_to_async(delimit_content_json)(content_slice)
-
-                            if chunks > 1:
-                                if chunk == 0:
-                                    exported_content = '[' + exported_content + ', '
-                                elif chunk == chunks - 1:
-                                    exported_content = exported_content + ']'
-                                else:
-                                    exported_content = exported_content + ', '
-                            else:
-                                exported_content = '[' + exported_content + ']'
-
-                        # asyncio.sleep(0)
+                    while True:
+                        exported_content = await sync_to_async(next)(export_stream, None)
+                        if exported_content is None:
+                            break
                         yield exported_content
-                except asyncio.CancelledError:
-                    raise
+                finally:
+                    await sync_to_async(export_stream.close)()
 
-            response = StreamingHttpResponse(stream_exports(contents))
+            response = StreamingHttpResponse(stream_exports())
             response['Content-Type'] = 'application/octet-stream'
             response['X-Accel-Buffering'] = 'no'
             response['Cache-Control'] = 'no-cache'
@@ -1211,6 +1168,35 @@ def backups(request):
         raise Http404("You are not authorized to view this page.")
 
 
+@login_required
+def slow_queries(request):
+    response = _get_context(request)
+
+    if response['scholar'].is_admin:
+        if request.method == 'POST' and 'clear-slow-queries' in request.POST:
+            # capped collections can't have documents removed from them, so the collection is dropped instead
+            SlowQuery.drop_collection()
+            response['messages'].append('Slow query log cleared.')
+
+        corpus_id = _clean(request.GET, 'corpus-id', None)
+        query_shapes = SlowQuery.summarize(corpus_id=corpus_id)
+        for query_shape in query_shapes:
+            query_shape['shape'] = json.dumps(json.loads(query_shape['shape']), indent=4)
+            query_shape['body'] = json.dumps(json.loads(query_shape['body']), indent=4)
+
+        return render(
+            request,
+            'slow_queries.html',
+            {
+                'response': response,
+                'query_shapes': query_shapes,
+                'slow_query_ms': settings.SLOW_QUERY_MS,
+            }
+        )
+    else:
+        raise Http404("You are not authorized to view this page.")
+
+
 @login_required
 def download_backup(request, backup_id):
     response = _get_context(request)
@@ -1601,6 +1587,7 @@ def get_image(
     image_uri = image_uri.replace('|', '/')
     uri_dict = parse_uri(image_uri)
     file_path = None
+    iiif_path = None
     is_external = False
 
     req_type = request.META.get('HTTP_ACCEPT', 'none')
@@ -1610,7 +1597,7 @@ def get_image(
             results = run_neo(
                 '''
                     MATCH (f:_File { uri: $image_uri, is_image: true })
-                    return f.path as file_path, f.external as external
+                    return f.path as file_path, f.iiif_path as iiif_path, f.external as external
                 ''',
                 {
                     'image_uri': image_uri
@@ -1619,6 +1606,7 @@ def get_image(
 
             if results and _contains(results[0].keys(), ['file_path', 'external']):
                 file_path = results[0]['file_path']
+                iiif_path = results[0]['iiif_path'] or file_path
                 is_external = results[0]['external']
 
     if file_path:
@@ -1635,14 +1623,14 @@ def get_image(
         elif req_type == '*/*' or request.build_absolute_uri().endswith('/info.json'):
             response = HttpResponse(content_type='application/json')
             response['X-Accel-Redirect'] = "/media/{identifier}/info.json".format(
-                identifier=file_path[1:].replace('/', '$!$'),
+                identifier=iiif_path[1:].replace('/', '$!$'),
             )
             return response
         else:
             mime_type, encoding = mimetypes.guess_type(file_path)
             response = HttpResponse(content_type=mime_type)
             response['X-Accel-Redirect'] = "/media/{identifier}/{region}/{size}/{rotation}/{quality}.{format}".format(
-                identifier=file_path[1:].replace('/', '$!$'),
+                identifier=iiif_path[1:].replace('/', '$!$'),
                 region=region,
                 size=size,
                 rotation=rotation,
@@ -1681,6 +1669,20 @@ def iiif_passthrough(request, req_path):
     return response
 
 
+def metrics(request):
+    authorized = False
+    if settings.METRICS_TOKEN:
+        authorized = request.headers.get('Authorization') == "Bearer {0}".format(settings.METRICS_TOKEN)
+
+    if not authorized:
+        context = _get_context(request)
+        authorized = context['scholar'] and context['scholar'].is_admin
+
+    if authorized:
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    return HttpResponse(status=403)
+
+
 @api_view(['GET'])
 def api_corpora(request):
     context = _get_context(request)
@@ -1701,10 +1703,7 @@ def api_corpora(request):
 
     corpora = search_corpora(context['search'], ids=ids, open_access_only=open_access_only)
 
-    return HttpResponse(
-        json.dumps(corpora),
-        content_type='application/json'
-    )
+    return json_response(corpora)
 
 
 @api_view(['GET'])
@@ -1722,23 +1721,14 @@ def api_scholar(request, scholar_id=None):
         if scholar_id:
             scholar = Scholar.objects(id=scholar_id)[0]
 
-            return HttpResponse(
-                json.dumps(scholar.to_dict()),
-                content_type='application/json'
-            )
+            return json_response(scholar.to_dict())
 
         else:
             scholars = search_scholars(context['search'])
 
-            return HttpResponse(
-                json.dumps(scholars),
-                content_type='application/json'
-            )
+            return json_response(scholars)
     elif context['scholar'] and str(context['scholar'].id) == scholar_id:
-        return HttpResponse(
-            json.dumps(context['scholar'].to_dict()),
-            content_type='application/json'
-        )
+        return json_response(context['scholar'].to_dict())
     else:
         raise Http404("You are not authorized to access this endpoint.")
 
@@ -1750,14 +1740,22 @@ def api_corpus(request, corpus_id):
 
     if corpus:
         include_views = 'include-views' in request.GET
+        include_provenance = 'include-provenance' in request.GET
+        etag = make_etag(
+            str(corpus.id), role, include_views, include_provenance,
+            corpus.get_versions(content_views=include_views, provenance=include_provenance)
+        )
+        not_modified = get_not_modified_response(request, etag)
+        if not_modified:
+            return not_modified
+
         corpus_dict = corpus.to_dict(include_views)
+        if include_provenance:
+            corpus_dict['provenance'] = [prov.to_dict() for prov in get_provenance(corpus, 'Corpus', corpus.id)]
         corpus_dict['scholar_role'] = role
         corpus_dict['available_synonyms'] = settings.ES_SYNONYM_OPTIONS
 
-        return HttpResponse(
-            json.dumps(corpus_dict),
-            content_type='application/json'
-        )
+        return set_validators(json_response(corpus_dict), etag)
     else:
         return JsonResponse({
             'error_message': "Corpus not found!"
@@ -1770,9 +1768,17 @@ def api_content(request, corpus_id, content_type, content_id=None):
     content = {}
     render_template = _clean(request.GET, 'render_template', None)
 
+    etag = None
+    last_modified = None
+
     corpus, role = get_scholar_corpus(corpus_id, context['scholar'])
 
     if corpus and content_type in corpus.content_types:
+        etag, last_modified = get_content_validators(corpus, content_type, content_id, request)
+        not_modified = get_not_modified_response(request, etag, last_modified)
+        if not_modified:
+            return not_modified
+
         if content_id:
             content = corpus.get_content(content_type, content_id, context['only'])
 
@@ -1781,22 +1787,21 @@ def api_content(request, corpus_id, content_type, content_id=None):
                     django_template = Template(corpus.content_types[content_type].templates[render_template].template)
                     context = Context({content_type: content})
 
-                    return HttpResponse(
+                    return set_validators(HttpResponse(
                         django_template.render(context),
                         content_type=corpus.content_types[content_type].templates[render_template].mime_type
-                    )
+                    ), etag, last_modified)
 
             content = content.to_dict()
+            if 'include-provenance' in request.GET:
+                content['provenance'] = [prov.to_dict() for prov in get_provenance(corpus, content_type, content_id)]
         else:
             if context['search']:
                 content = corpus.search_content(content_type=content_type, **context['search'])
             else:
                 content = corpus.search_content(content_type=content_type, general_query="*")
 
-    return HttpResponse(
-        json.dumps(content),
-        content_type='application/json'
-    )
+    return set_validators(json_response(content), etag, last_modified)
 
 
 @api_view(['GET'])
@@ -1823,10 +1828,7 @@ def api_suggest(request, corpus_id, content_type):
         if corpus and content_type in corpus.content_types and max_per_field.isdigit():
             suggestions = corpus.suggest_content(content_type, query, fields, int(max_per_field), filters, es_debug)
 
-    return HttpResponse(
-        json.dumps(suggestions),
-        content_type='application/json'
-    )
+    return json_response(suggestions)
 
 
 @api_view(['GET', 'POST'])
@@ -1837,6 +1839,13 @@ def api_content_view(request, corpus_id, content_view_id=None):
 
     if corpus:
         cv_dict = {}
+        etag = None
+        if content_view_id and request.method == 'GET':
+            etag = make_etag(str(corpus.id), content_view_id, corpus.get_versions(content_views=True))
+            not_modified = get_not_modified_response(request, etag)
+            if not_modified:
+                return not_modified
+
         if content_view_id:
             cv = ContentView.objects.get(id=content_view_id)
             cv_dict = cv.to_dict()
@@ -1874,10 +1883,7 @@ def api_content_view(request, corpus_id, content_view_id=None):
                         'stage': 'refresh',
                     }))
 
-        return HttpResponse(
-            json.dumps(cv_dict),
-            content_type='application/json'
-        )
+        return set_validators(json_response(cv_dict), etag)
 
 
 @api_view(['GET', 'POST'])
@@ -1901,10 +1907,7 @@ def api_content_group(request, corpus_id):
                 if content_group_dict['title'] and content_group_dict['title'] not in existing_titles:
                     for member in content_group_dict['members']:
                         if member['name'] in existing_members:
-                            return HttpResponse(
-                                json.dumps({'success': False, 'message': 'Content types can only belong to one content group at a time.'}),
-                                content_type='application/json'
-                            )
+                            return json_response({'success': False, 'message': 'Content types can only belong to one content group at a time.'})
 
                     ct_group = ContentTypeGroup()
                     ct_group.title = content_group_dict['title']
@@ -1920,10 +1923,7 @@ def api_content_group(request, corpus_id):
                     corpus.content_type_groups.append(ct_group)
                     corpus.save()
                 else:
-                    return HttpResponse(
-                        json.dumps({'success': False, 'message': 'Title blank or not unique.'}),
-                        content_type='application/json'
-                    )
+                    return json_response({'success': False, 'message': 'Title blank or not unique.'})
 
             elif action in ['edit', 'delete']:
                 ct_group_index = -1
@@ -1951,10 +1951,7 @@ def api_content_group(request, corpus_id):
                     corpus.save()
 
 
-    return HttpResponse(
-        json.dumps({'success': True}),
-        content_type='application/json'
-    )
+    return json_response({'success': True})
 
 
 @api_view(['GET'])
@@ -1974,289 +1971,227 @@ def api_plugin_schema(request):
                         'content_types': getattr(content_module, 'REGISTRY')
                     })
 
-    return HttpResponse(
-        json.dumps(schema),
-        content_type='application/json'
-    )
+    return json_response(schema)
 
 
-@api_view(['GET'])
-def api_network_json(request, corpus_id, content_type, content_id):
-    context = _get_context(request)
-    per_type_limit = int(request.GET.get('per_type_limit', '20'))
-    per_type_skip = int(request.GET.get('per_type_skip', '0'))
-    meta_only = 'meta-only' in request.GET
-    is_seed = 'is-seed' in request.GET
-    target_ct = request.GET.get('target-ct', '')
-    network_json = {
-        'nodes': [],
-        'edges': [],
-        'meta': {}
-    }
-    filters = {}
-    collapses = []
-    excluded_cts = []
+def _get_network_params(request, content_type):
+    params = SimpleNamespace(
+        per_type_limit=int(request.GET.get('per_type_limit', '20')),
+        per_type_skip=int(request.GET.get('per_type_skip', '0')),
+        meta_only='meta-only' in request.GET,
+        is_seed='is-seed' in request.GET,
+        target_ct=request.GET.get('target-ct', ''),
+        filters={},
+        collapses=[],
+        excluded_cts=[]
+    )
 
     if 'filters' in request.GET:
         filter_specs = request.GET['filters'].split(',')
         for filter_spec in filter_specs:
             if ':' in filter_spec:
-                filters[filter_spec.split(':')[0]] = filter_spec.split(':')[1]
+                params.filters[filter_spec.split(':')[0]] = filter_spec.split(':')[1]
 
     if 'collapses' in request.GET:
         collapse_params = request.GET['collapses'].split(',')
         for collapse_param in collapse_params:
             collapse_parts = collapse_param.split('-')
+            if len(collapse_parts) != 3:
+                continue
+
             from_ct = collapse_parts[0]
             proxy_ct = collapse_parts[1]
             to_ct = collapse_parts[2]
 
-            if '.' in proxy_ct:
-                proxy_cts = proxy_ct.split('.')
-                for p in proxy_cts:
-                    excluded_cts.append(p)
-            else:
-                excluded_cts.append(proxy_ct)
+            params.excluded_cts += proxy_ct.split('.')
 
             if from_ct == content_type:
-                collapses.append({
+                params.collapses.append({
                     'from_ct': from_ct,
                     'proxy_ct': proxy_ct,
                     'to_ct': to_ct
                 })
             elif to_ct == content_type:
-                collapses.append({
+                params.collapses.append({
                     'from_ct': to_ct,
                     'proxy_ct': proxy_ct,
                     'to_ct': from_ct
                 })
 
     if 'hidden' in request.GET:
-        excluded_cts += request.GET['hidden'].split(',')
+        params.excluded_cts += request.GET['hidden'].split(',')
 
-    excluded_cts = list(set(excluded_cts))
+    params.excluded_cts = list(set(params.excluded_cts))
 
-    exclusion_clause = ""
-    for excluded_ct in excluded_cts:
-        exclusion_clause += '''
-            AND NOT a:{0}
-            AND NOT c:{0}
-        '''.format(excluded_ct)
+    return params
+
+
+@api_view(['GET'])
+def api_network_json(request, corpus_id, content_type, content_id):
+    context = _get_context(request)
+    params = _get_network_params(request, content_type)
+    network_json = {
+        'nodes': [],
+        'edges': [],
+        'meta': {}
+    }
 
     corpus, role = get_scholar_corpus(corpus_id, context['scholar'])
 
     if corpus and content_type in corpus.content_types:
-        content_uri = '/corpus/{0}/{1}/{2}'.format(
-            corpus_id,
-            content_type,
-            content_id
-        )
+        network_json = get_network(corpus, content_type, content_id, params)
 
-        distinct_relationships = run_neo(
-            '''
-                MATCH (a:{origin}) -[b]- (c)
-                WHERE a.uri = '{uri}'
-                AND ANY(l in labels(c) WHERE NOT l STARTS WITH '_') {exclusions}
-                RETURN distinct type(b) as REL, labels(c) as CT, count(labels(c)) as COUNT
-            '''.format(
-                    origin=content_type,
-                    uri=content_uri,
-                    exclusions=exclusion_clause
-                 )
-            , {}
-        )
+    return json_response(network_json)
 
-        for relationship in distinct_relationships:
-            if not meta_only and (not target_ct or target_ct == relationship.get('CT')[0]):
-                filter_clause = ''
-                if content_type in filters:
-                    filter_clause += " AND (a) <-[:hasContent]- (:`_ContentView` {{ uri: '{0}' }})".format(filters[content_type])
-                if relationship.get('CT')[0] in filters:
-                    filter_clause += " AND (c) <-[:hasContent]- (:`_ContentView` {{ uri: '{0}' }})".format(filters[relationship.get('CT')[0]])
-
-                rel_net_json = get_network_json(
-                    '''
-                        MATCH path = (a:{origin}) -[b:{relationship}]- (c:{destination})
-                        WHERE a.uri = '{uri}' {exclusions}{filters} 
-                        RETURN path
-                        SKIP {skip}
-                        LIMIT {limit}
-                    '''.format(
-                        origin=content_type,
-                        relationship=relationship.get('REL'),
-                        destination=relationship.get('CT')[0],
-                        uri=content_uri,
-                        exclusions=exclusion_clause,
-                        filters=filter_clause,
-                        skip=per_type_skip,
-                        limit=per_type_limit
-                    )
-                )
+@api_view(['GET'])
+def api_pattern_count(request, corpus_id, content_type):
+    context = _get_context(request)
+    corpus, role = get_scholar_corpus(corpus_id, context['scholar'])
+    perform_terms_aggregation = 'terms-aggregation' in request.GET
+    response_data = {} if perform_terms_aggregation else {'count': 0}
+
+    if corpus and content_type in corpus.content_types and 'pattern' in request.GET:
+        graph_steps = parse_graph_steps(corpus, request.GET['pattern'])
+        if graph_steps:
+            response_data = count_pattern(corpus, content_type, graph_steps, perform_terms_aggregation)
 
-                node_uris = [n['id'] for n in network_json['nodes']]
-                network_json['nodes'] += [n for n in rel_net_json['nodes'] if n['id'] not in node_uris]
-                network_json['edges'] += rel_net_json['edges']
+    return json_response(response_data)
 
-            path_key = "{0}-{1}".format(relationship.get('REL'), relationship.get('CT')[0])
-            network_json['meta'][path_key] = {
-                'count': relationship.get('COUNT'),
-                'skip': per_type_skip,
-                'limit': per_type_limit,
-                'collapsed': False
-            }
+@api_view(['GET'])
+def api_last_updated(request, corpus_id, content_type):
+    last_updated = 0
+    context = _get_context(request)
+    corpus, role = get_scholar_corpus(corpus_id, context['scholar'])
 
-        node_uris = [n['id'] for n in network_json['nodes']]
+    if corpus and content_type in corpus.content_types:
+        latest_content = corpus.get_content(content_type, all=True).only('last_updated').order_by('-last_updated').limit(1)
+        if latest_content:
+            last_updated = int(latest_content[0].last_updated.timestamp())
 
-        for collapse in collapses:
-            filter_clause = ''
-            if collapse['from_ct'] in filters:
-                filter_clause += " AND (a) <-[:hasContent]- (:`_ContentView` {{ uri: '{0}' }})".format(filters[collapse['from_ct']])
-            if collapse['to_ct'] in filters:
-                filter_clause += " AND (c) <-[:hasContent]- (:`_ContentView` {{ uri: '{0}' }})".format(filters[collapse['to_ct']])
+    return json_response({'last_updated': last_updated})
 
-            path_key = "{0}-{1}-{2}".format(
-                collapse['from_ct'],
-                collapse['proxy_ct'],
-                collapse['to_ct']
-            )
-            proxy_path = []
-            proxy_cts = collapse['proxy_ct'].split('.')
-            for proxy_index in range(0, len(proxy_cts)):
-                proxy_path.append("(b{0}:{1})".format(proxy_index, proxy_cts[proxy_index]))
-            proxy_path = " -- ".join(proxy_path)
-
-            proxied_cypher = '''
-                MATCH path = (a:{origin}) -- {proxy_path} -- (c:{destination})
-                WHERE a.uri = '{uri}' {exclusions}{filters}
-            '''.format(
-                origin=collapse['from_ct'],
-                proxy_path=proxy_path,
-                destination=collapse['to_ct'],
-                uri=content_uri,
-                exclusions=exclusion_clause,
-                filters=filter_clause
-            )
+# The following are async versions of the read-only API views above. They make their MongoDB, Elasticsearch, and
+# Neo4J calls with async clients so that, under daphne, a request waiting on those services doesn't hold a thread.
+# Since DRF doesn't support async views, they authenticate requests themselves via _aget_context. They're served under
+# /api/async/, and in place of the views above when CRP_ASYNC_API is "yes."
+@require_GET
+async def api_content_async(request, corpus_id, content_type, content_id=None):
+    context = await _aget_context(request)
+    content = {}
+    render_template = _clean(request.GET, 'render_template', None)
 
-            proxied_count = run_neo('''
-                {proxied_cypher}
-                RETURN count(path) as COUNT
-            '''.format(proxied_cypher=proxied_cypher), {})
+    etag = None
+    last_modified = None
 
-            network_json['meta'][path_key] = {
-                'count': proxied_count[0].get('COUNT'),
-                'skip': per_type_skip,
-                'limit': per_type_limit,
-                'collapsed': True
-            }
+    corpus, role = await aget_scholar_corpus(corpus_id, context['scholar'])
 
-            if not meta_only and (not target_ct or target_ct == collapse['to_ct']):
-                proxied_content = run_neo('''
-                    {proxied_cypher}
-                    RETURN distinct c, count(path) as freq
-                    SKIP {skip}
-                    LIMIT {limit}
-                '''.format(
-                    proxied_cypher=proxied_cypher,
-                    skip=per_type_skip,
-                    limit=per_type_limit
-                ), {})
-
-                for result in proxied_content:
-                    uri = result.get('c').get('uri')
-                    freq = result.get('freq')
-                    if uri not in node_uris:
-                        network_json['nodes'].append({
-                            'group': collapse['to_ct'],
-                            'id': uri,
-                            'label': result.get('c').get('label')
-                        })
-                        node_uris.append(uri)
-                        network_json['edges'].append(
-                            {
-                                'from': content_uri,
-                                'id': content_uri + '-' + uri,
-                                'title': 'has{0}via{1}'.format(collapse['to_ct'], collapse['proxy_ct']),
-                                'to': uri,
-                                'freq': freq
-                            }
-                        )
-
-        if is_seed and content_uri not in node_uris:
-            seed = run_neo('''
-                MATCH (a:{content_type})
-                WHERE a.uri = '{uri}'
-                RETURN a
-            '''.format(content_type=content_type, uri=content_uri), {})
-            if seed:
-                network_json['nodes'].append({
-                    'id': content_uri,
-                    'group': content_type,
-                    'label': seed[0].get('a').get('label')
-                })
+    if corpus and content_type in corpus.content_types:
+        etag, last_modified = await aget_content_validators(corpus, content_type, content_id, request)
+        not_modified = get_not_modified_response(request, etag, last_modified)
+        if not_modified:
+            return not_modified
 
-    return HttpResponse(
-        json.dumps(network_json),
-        content_type='application/json'
-    )
+        if content_id:
+            content = await corpus.aget_content(content_type, content_id, context['only'])
 
-@api_view(['GET'])
-def api_pattern_count(request, corpus_id, content_type):
-    context = _get_context(request)
-    corpus, role = get_scholar_corpus(corpus_id, context['scholar'])
-    perform_terms_aggregation = False
-    response_data = { 'count': 0 }
+            if content and render_template and render_template in corpus.content_types[content_type].templates:
+                content_template = corpus.content_types[content_type].templates[render_template]
+                django_template = Template(content_template.template)
 
-    if 'terms-aggregation' in request.GET:
-        perform_terms_aggregation = True
-        response_data = {}
+                # templates may traverse fields that make blocking queries, so they're rendered from a thread
+                rendered = await sync_to_async(django_template.render, thread_sensitive=False)(
+                    Context({content_type: content})
+                )
+                return set_validators(HttpResponse(rendered, content_type=content_template.mime_type), etag, last_modified)
 
-    if corpus and 'pattern' in request.GET:
-        pattern = request.GET['pattern']
-        graph_steps = parse_graph_steps(corpus, pattern)
-        if graph_steps:
-            cypher = build_cypher_from_graph_steps(corpus_id, content_type, graph_steps)
-
-            if perform_terms_aggregation:
-                last_ct = list(graph_steps.keys())[-1]
-                cypher += f'''
-                    RETURN target.id AS rootID,
-                    COUNT(DISTINCT ct{last_ct}.id) as leafCount,
-                    COLLECT(DISTINCT ct{last_ct}.id) AS leafIDs
-                    ORDER BY leafCount DESC
-                '''
+            if content and type(content).to_dict is not Content.to_dict:
+                # plugin content types (like Document) may make blocking queries to serialize their content, so they're
+                # serialized from a thread
+                content = await sync_to_async(content.to_dict, thread_sensitive=False)()
             else:
-                cypher += "\nRETURN count(distinct target)"
+                content = content.to_dict() if content else {}
 
-            count_results = run_neo(cypher, {})
+            if content and 'include-provenance' in request.GET:
+                content['provenance'] = [prov.to_dict() for prov in await aget_provenance(corpus, content_type, content_id)]
+        else:
+            # building the search and processing its results is synchronous, so searches are run from a thread
+            search = context['search'] if context['search'] else {'general_query': "*"}
+            content = await sync_to_async(corpus.search_content, thread_sensitive=False)(content_type=content_type, **search)
 
-            if perform_terms_aggregation:
-                for result in count_results:
-                    response_data[result['rootID']] = result['leafIDs']
-            else:
-                response_data['count'] = count_results[0].value()
+    return set_validators(json_response(content), etag, last_modified)
 
-            print(cypher)
 
-    return HttpResponse(
-        json.dumps(response_data),
-        content_type='application/json'
-    )
+@require_GET
+async def api_suggest_async(request, corpus_id, content_type):
+    context = await _aget_context(request)
+    suggestions = {}
+    query = _clean(request.GET, 'q', None)
 
-@api_view(['GET'])
-def api_last_updated(request, corpus_id, content_type):
+    if query:
+        corpus, role = await aget_scholar_corpus(corpus_id, context['scholar'])
+        fields = _clean(request.GET, 'fields', [])
+        max_per_field = _clean(request.GET, 'max_per_field', '5')
+
+        if fields:
+            fields = fields.split(',')
+
+        filters = {}
+        filter_params = [param for param in request.GET if param.startswith('f_')]
+        if filter_params:
+            for filter_param in filter_params:
+                filters[filter_param[2:]] = _clean(request.GET, filter_param)
+
+        if corpus and content_type in corpus.content_types and max_per_field.isdigit():
+            suggestions = await corpus.asuggest_content(content_type, query, fields, int(max_per_field), filters)
+
+    return json_response(suggestions)
+
+
+@require_GET
+async def api_network_json_async(request, corpus_id, content_type, content_id):
+    context = await _aget_context(request)
+    params = _get_network_params(request, content_type)
+    network_json = {
+        'nodes': [],
+        'edges': [],
+        'meta': {}
+    }
+
+    corpus, role = await aget_scholar_corpus(corpus_id, context['scholar'])
+
+    if corpus and content_type in corpus.content_types:
+        network_json = await aget_network(corpus, content_type, content_id, params)
+
+    return json_response(network_json)
+
+
+@require_GET
+async def api_pattern_count_async(request, corpus_id, content_type):
+    context = await _aget_context(request)
+    corpus, role = await aget_scholar_corpus(corpus_id, context['scholar'])
+    perform_terms_aggregation = 'terms-aggregation' in request.GET
+    response_data = {} if perform_terms_aggregation else {'count': 0}
+
+    if corpus and content_type in corpus.content_types and 'pattern' in request.GET:
+        graph_steps = parse_graph_steps(corpus, request.GET['pattern'])
+        if graph_steps:
+            response_data = await acount_pattern(corpus, content_type, graph_steps, perform_terms_aggregation)
+
+    return json_response(response_data)
+
+
+@require_GET
+async def api_last_updated_async(request, corpus_id, content_type):
     last_updated = 0
-    context = _get_context(request)
-    corpus, role = get_scholar_corpus(corpus_id, context['scholar'])
+    context = await _aget_context(request)
+    corpus, role = await aget_scholar_corpus(corpus_id, context['scholar'])
 
     if corpus and content_type in corpus.content_types:
-        latest_content = corpus.get_content(content_type, all=True).only('last_updated').order_by('-last_updated').limit(1)
-        if latest_content:
-            last_updated = int(latest_content[0].last_updated.timestamp())
+        latest = await corpus.aget_last_updated(content_type)
+        if latest:
+            last_updated = int(latest.timestamp())
 
-    return HttpResponse(
-        json.dumps({'last_updated': last_updated}),
-        content_type='application/json'
-    )
+    return json_response({'last_updated': last_updated})
 
 @api_view(['GET', 'POST'])
 def api_content_files(request, corpus_id, content_type=None, content_id=None):
@@ -2330,10 +2265,7 @@ def api_content_files(request, corpus_id, content_type=None, content_id=None):
                                 'filename': filename
                             })
 
-    return HttpResponse(
-        json.dumps(files),
-        content_type='application/json'
-    )
+    return json_response(files)
 
 
 @api_view(['GET'])
@@ -2371,10 +2303,7 @@ def api_job(request, corpus_id=None, job_id=None):
         if corpus:
             job = Job(job_id)
             if job:
-                return HttpResponse(
-                    json.dumps(job.to_dict()),
-                    content_type='application/json'
-                )
+                return json_response(job.to_dict())
 
     return Http404("Job not found.")
 
@@ -2442,10 +2371,7 @@ def api_jobs(request, corpus_id=None, content_type=None, content_id=None):
 
         payload['records'].append(job_dict)
 
-    return HttpResponse(
-        json.dumps(payload),
-        content_type='application/json'
-    )
+    return json_response(payload)
 
 
 @api_view(['POST'])
@@ -2495,13 +2421,13 @@ def api_submit_jobs(request, corpus_id):
                 content = corpus.get_content(content_type, content_id.strip())
 
             if content:
-                for prov in content.provenance:
-                    if prov.job_id == job_id:
-                        job = Job.setup_retry_for_completed_task(corpus, context['scholar'], content_type, content_id, prov)
-                        content.modify(pull__provenance=prov)
-                        run_job(job.id)
-                        send_alert(corpus_id, 'success', f'Task {prov.task_name} successfully retried.')
-                        retried = True
+                prov = get_completed_task(corpus, content_type, str(content.id), job_id)
+                if prov:
+                    job = Job.setup_retry_for_completed_task(corpus, context['scholar'], content_type, content_id, prov)
+                    delete_provenance(corpus, content_type, [content.id], job_id)
+                    run_job(job.id)
+                    send_alert(corpus_id, 'success', f'Task {prov.task_name} successfully retried.')
+                    retried = True
 
             if not retried:
                 send_alert(corpus_id, 'error', "Error retrying job!")
@@ -2514,26 +2440,28 @@ def api_scholar_preference(request, content_type, preference):
     context = _get_context(request)
     value = None
 
-    if request.method == 'GET' and 'content_uri' in request.GET:
+    # preferences are read from (and written to) the scholar cached in the session, and saved in batches
+    if context['scholar'] and request.method == 'GET' and 'content_uri' in request.GET:
         value = context['scholar'].get_preference(
             content_type,
             request.GET['content_uri'],
             preference
         )
 
-    elif request.method == 'POST' and _contains(request.POST, ['content_uri', 'value']):
+    elif context['scholar'] and request.method == 'POST' and _contains(request.POST, ['content_uri', 'value']):
         value = request.POST['value']
-        context['scholar'].set_preference(
+        if context['scholar'].set_preference(
             content_type,
             request.POST['content_uri'],
             preference,
             value
-        )
+        ):
+            if 'scholar_json' in request.session:
+                request.session['scholar_json'] = context['scholar'].to_json()
+        else:
+            value = None
 
-    return HttpResponse(
-        json.dumps(value),
-        content_type='application/json'
-    )
+    return json_response(value)
 
 
 @api_view(['GET'])
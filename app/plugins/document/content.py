@@ -5,6 +5,9 @@ import html
 import os
 import shutil
 import mongoengine
+from pymongo import UpdateOne
+from elasticsearch.helpers import scan, streaming_bulk
+from elasticsearch_dsl.connections import get_connection
 from corpus import Content, File, run_neo, get_corpus, FieldRenderer
 from manager.utilities import _contains
 from natsort import natsorted
@@ -451,30 +454,9 @@ class Page(mongoengine.EmbeddedDocument):
         return self._text
 
     def _do_linking(self, content_type, content_uri):
-        uri_parts = [part for part in content_uri.split('/') if part]
-        if uri_parts[0] == 'corpus' and len(uri_parts) > 1:
-            corpus_id = uri_parts[1]
-            page_uri = "{0}/page/{1}".format(content_uri, self.ref_no)
-        
-            run_neo('''
-                    MATCH (d:{content_type} {{ uri: $doc_uri }})
-                    MERGE (p:_Page {{ uri: $page_uri }})
-                    SET p.label = $page_label
-                    SET p.corpus_id = $corpus_id
-                    SET p.ref_no = $page_ref_no
-                    MERGE (d) -[rel:hasPage]-> (p) 
-                '''.format(content_type=content_type),
-                {
-                    'doc_uri': content_uri,
-                    'page_uri': page_uri,
-                    'corpus_id': corpus_id,
-                    'page_label': self.label if self.label else self.ref_no,
-                    'page_ref_no': self.ref_no
-                }
-            )
-
-            for file_key, file in self.files.items():
-                file._do_linking(content_type='_Page', content_uri=page_uri)
+        linker = PageLinker(content_type, content_uri)
+        linker.add_page(self)
+        linker.flush()
 
     def _make_path(self, parent_path):
         page_path = "{0}/pages/{1}".format(parent_path, self.ref_no)
@@ -495,25 +477,216 @@ class Page(mongoengine.EmbeddedDocument):
         return self_dict
 
 
+def page_sort_key(ref_no):
+    # zero-pad any runs of digits so that page ref_nos sort naturally as plain strings in MongoDB
+    return re.sub(r'\d+', lambda match: match.group(0).zfill(12), str(ref_no).lower())
+
+
+class DocumentPage(mongoengine.Document):
+    document_id = mongoengine.ObjectIdField(required=True)
+    ref_no = mongoengine.StringField(required=True)
+    sort_key = mongoengine.StringField(required=True)
+    instance = mongoengine.StringField()
+    label = mongoengine.StringField()
+    kvp = mongoengine.DictField()
+    files = mongoengine.MapField(mongoengine.EmbeddedDocumentField(File))
+
+    def to_page(self):
+        return Page(
+            instance=self.instance,
+            label=self.label,
+            ref_no=self.ref_no,
+            kvp=self.kvp,
+            files=self.files
+        )
+
+    meta = {
+        'abstract': True
+    }
+
+
+page_collection_classes = {}
+
+
+def get_page_collection(corpus_id):
+    corpus_id = str(corpus_id)
+    if corpus_id not in page_collection_classes:
+        page_collection_classes[corpus_id] = type(
+            'CorpusDocumentPage',
+            (DocumentPage,),
+            {
+                'meta': {
+                    'collection': "corpus_{0}_Document_pages".format(corpus_id),
+                    'indexes': [
+                        {'fields': ['document_id', 'ref_no'], 'unique': True},
+                        {'fields': ['document_id', 'sort_key']}
+                    ]
+                }
+            }
+        )
+    return page_collection_classes[corpus_id]
+
+
+def get_page_index_name(corpus_id):
+    return "corpus-{0}-document-pages".format(corpus_id)
+
+
+def ensure_page_index(corpus_id):
+    es = get_connection()
+    index_name = get_page_index_name(corpus_id)
+    if not es.indices.exists(index=index_name):
+        es.indices.create(index=index_name, mappings={
+            'properties': {
+                'document_id': {'type': 'keyword'},
+                'ref_no': {'type': 'keyword'},
+                'sort_key': {'type': 'keyword'},
+                'file_key': {'type': 'keyword'},
+                'fingerprint': {'type': 'keyword', 'index': False},
+                'text': {'type': 'text'},
+            }
+        })
+    return index_name
+
+
+class PageLinker(object):
+    """
+    Collects page and page file node specs for a document and writes them to Neo4J in batches.
+
+    Each flush issues one parameterized UNWIND query for the batch's pages and another for its files, rather than a
+    separate MERGE per page and per file.
+    """
+
+    def __init__(self, content_type, content_uri, batch_size=500):
+        self.content_type = content_type
+        self.content_uri = content_uri
+        self.corpus_id = None
+        self.batch_size = batch_size
+        self.pages = []
+        self.files = []
+
+        uri_parts = [part for part in content_uri.split('/') if part]
+        if uri_parts[0] == 'corpus' and len(uri_parts) > 1:
+            self.corpus_id = uri_parts[1]
+
+    def page_uri(self, ref_no):
+        return "{0}/page/{1}".format(self.content_uri, ref_no)
+
+    def add_page(self, page, include_files=True):
+        self.pages.append({
+            'uri': self.page_uri(page.ref_no),
+            'label': page.label if page.label else page.ref_no,
+            'ref_no': page.ref_no
+        })
+
+        if include_files:
+            for file_key, file in page.files.items():
+                self.add_file(page.ref_no, file, check_batch=False)
+
+        self.check_batch()
+
+    def add_file(self, ref_no, file, check_batch=True):
+        page_uri = self.page_uri(ref_no)
+        self.files.append({
+            'page_uri': page_uri,
+            'uri': "{0}/file/{1}".format(page_uri, file.key),
+            'path': file.path,
+            'is_image': file.is_image,
+            'external': bool(file.iiif_info),
+            'iiif_path': file.iiif_path
+        })
+
+        if check_batch:
+            self.check_batch()
+
+    def check_batch(self):
+        if len(self.pages) + len(self.files) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.corpus_id:
+            if self.pages:
+                run_neo(
+                    '''
+                        MATCH (d:{content_type} {{ uri: $doc_uri }})
+                        UNWIND $pages AS page
+                        MERGE (p:_Page {{ uri: page.uri }})
+                        SET p.label = page.label
+                        SET p.corpus_id = $corpus_id
+                        SET p.ref_no = page.ref_no
+                        MERGE (d) -[rel:hasPage]-> (p)
+                    '''.format(content_type=self.content_type),
+                    {
+                        'doc_uri': self.content_uri,
+                        'corpus_id': self.corpus_id,
+                        'pages': self.pages
+                    }
+                )
+
+            if self.files:
+                run_neo(
+                    '''
+                        UNWIND $files AS file
+                        MATCH (p:_Page { uri: file.page_uri })
+                        MERGE (f:_File { uri: file.uri })
+                        SET f.path = file.path
+                        SET f.corpus_id = $corpus_id
+                        SET f.is_image = file.is_image
+                        SET f.external = file.external
+                        SET f.iiif_path = file.iiif_path
+                        MERGE (p) -[rel:hasFile]-> (f)
+                    ''',
+                    {
+                        'corpus_id': self.corpus_id,
+                        'files': self.files
+                    }
+                )
+
+        self.pages = []
+        self.files = []
+
+
 class PageNavigator(object):
-    def __init__(self, page_dict, page_set=None):
+    def __init__(self, page_dict=None, page_set=None, document=None, window_size=100):
         self.page_dict = page_dict
-        if not page_set:
-            self.ordered_ref_nos = natsorted(list(page_dict.keys()))
-        else:
+        self.document = document
+        self.window_size = window_size
+
+        if page_set:
             self.ordered_ref_nos = page_set.ref_nos
+        elif document:
+            self.ordered_ref_nos = document.page_ref_nos()
+        else:
+            self.ordered_ref_nos = natsorted(list(page_dict.keys()))
+
         self.bookmark = 0
+        self.window = []
+
+    def get_window(self, start=0, size=None):
+        if not size:
+            size = self.window_size
+
+        ref_nos = self.ordered_ref_nos[start:start + size]
+        if self.document:
+            pages = self.document.get_pages(ref_nos)
+        else:
+            pages = self.page_dict
+
+        return [(ref_no, pages[ref_no]) for ref_no in ref_nos if ref_no in pages]
 
     def __iter__(self):
         self.bookmark = 0
+        self.window = []
         return self
 
     def __next__(self):
-        if self.bookmark < len(self.ordered_ref_nos):
-            self.bookmark += 1
-            return self.ordered_ref_nos[self.bookmark - 1], self.page_dict[self.ordered_ref_nos[self.bookmark - 1]]
-        else:
-            raise StopIteration
+        while not self.window:
+            if self.bookmark >= len(self.ordered_ref_nos):
+                raise StopIteration
+
+            self.window = self.get_window(self.bookmark)
+            self.bookmark += self.window_size
+
+        return self.window.pop(0)
 
 
 class PageSet(mongoengine.EmbeddedDocument):
@@ -558,50 +731,98 @@ class Document(Content):
     pub_date = mongoengine.StringField()
     kvp = mongoengine.DictField()
     files = mongoengine.MapField(mongoengine.EmbeddedDocumentField(File))
+    # legacy storage for pages; pages now live in the corpus' page collection (see get_page_collection)
     pages = mongoengine.MapField(mongoengine.EmbeddedDocumentField(Page))
     page_sets = mongoengine.MapField(mongoengine.EmbeddedDocumentField(PageSet))
 
+    @property
+    def page_collection(self):
+        return get_page_collection(self.corpus_id)
+
     @property
     def page_file_collections(self):
         if not hasattr(self, '_page_file_collections'):
-            self._page_file_collections = {}
-
-            if not self._page_file_collections:
-                for ref_no, page in self.ordered_pages():
-                    for file_key, file in self.pages[ref_no].files.items():
-                        slug = slugify(file.collection_label)
-                        if slug not in self._page_file_collections:
-                            self._page_file_collections[slug] = {
-                                'label': file.collection_label,
-                                'page_files': {}
-                            }
-                        self._page_file_collections[slug]['page_files'][ref_no] = file.to_dict(self.uri + '/page/{0}'.format(ref_no))
+            self._page_file_collections = self.collect_page_file_collections(self.ordered_pages())
+        return self._page_file_collections
 
-                for slug in self._page_file_collections:
-                    self._page_file_collections[slug]['page_files'] = PageNavigator(self._page_file_collections[slug]['page_files'])
+    def collect_page_file_collections(self, ordered_pages):
+        page_file_collections = {}
+        for ref_no, page in ordered_pages:
+            for file_key, file in page.files.items():
+                slug = slugify(file.collection_label)
+                if slug not in page_file_collections:
+                    page_file_collections[slug] = {
+                        'label': file.collection_label,
+                        'page_files': {}
+                    }
+                page_file_collections[slug]['page_files'][ref_no] = file.to_dict(self.uri + '/page/{0}'.format(ref_no))
 
-        return self._page_file_collections
+        for slug in page_file_collections:
+            page_file_collections[slug]['page_files'] = PageNavigator(page_file_collections[slug]['page_files'])
+        return page_file_collections
 
     @property
     def has_primary_text(self):
-        for ref_no, page in self.pages.items():
-            for file_key, file in page.files.items():
+        for page_record in self.page_records(only=['files']).no_cache():
+            for file_key, file in page_record.files.items():
                 if file.extension == 'txt' and file.primary_witness:
                     return True
         return False
 
-    def ordered_pages(self, pageset=None):
+    @property
+    def page_count(self):
+        return self.page_records().count()
+
+    def page_records(self, ref_nos=None, only=[]):
+        # pages still embedded in a document that predates the page collection get moved over on first access
+        if self.pages:
+            self.migrate_pages()
+
+        records = self.page_collection.objects(document_id=self.id)
+        if ref_nos is not None:
+            records = records.filter(ref_no__in=ref_nos)
+        if only:
+            records = records.only(*only)
+        return records.order_by('sort_key')
+
+    def page_ref_nos(self):
+        return list(self.page_records(only=['ref_no']).scalar('ref_no'))
+
+    def has_page(self, ref_no):
+        return self.page_records([ref_no]).count() > 0
+
+    def get_page(self, ref_no):
+        page_record = self.page_records([ref_no]).first()
+        if page_record:
+            return page_record.to_page()
+        return None
+
+    def get_pages(self, ref_nos=None, start_ref_no=None, limit=None):
+        page_records = self.page_records(ref_nos)
+        if start_ref_no:
+            page_records = page_records.filter(sort_key__gte=page_sort_key(start_ref_no))
+        if limit:
+            page_records = page_records.limit(limit)
+
+        return {page_record.ref_no: page_record.to_page() for page_record in page_records}
+
+    def ordered_pages(self, pageset=None, page_dict=None):
+        # given pages already read (in ref_no order), the pages are ordered without reading them again
+        page_source = {'document': self} if page_dict is None else {'page_dict': page_dict}
+
         if pageset and pageset in self.page_sets:
-            return PageNavigator(self.pages, self.page_sets[pageset])
+            return PageNavigator(page_set=self.page_sets[pageset], **page_source)
         elif '_default_pageset' in self.kvp and self.kvp['_default_pageset'] in self.page_sets:
-            return PageNavigator(self.pages, self.page_sets[self.kvp['_default_pageset']])
+            return PageNavigator(page_set=self.page_sets[self.kvp['_default_pageset']], **page_source)
+        elif page_dict is not None:
+            return page_dict.items()
         else:
-            return PageNavigator(self.pages)
+            return PageNavigator(document=self)
 
     def get_page_file_collection(self, slug, pageset=None):
         pfc = {}
         for ref_no, page in self.ordered_pages(pageset):
-            for file_key, file in self.pages[ref_no].files.items():
+            for file_key, file in page.files.items():
                 collection_slug = slugify(file.collection_label)
                 if collection_slug == slug:
                     if 'label' not in pfc:
@@ -612,29 +833,276 @@ class Document(Content):
         return pfc
 
     def save_file(self, file):
-        self.modify(**{'set__files__{0}'.format(file.key): file})
+        self.modify(**{'set__files__{0}'.format(file.key): file}, set__last_updated=datetime.now())
         file._do_linking(content_type='Document', content_uri=self.uri)
 
-    def save_page(self, page):
-        self.modify(**{'set__pages__{0}'.format(page.ref_no): page})
-        page._do_linking(content_type='Document', content_uri=self.uri)
+    def touch(self):
+        # pages are written to the page collection rather than by saving the document, so the document's
+        # last_updated timestamp (which the content API's validators are made from) is bumped here instead
+        self.last_updated = datetime.now()
+        self.update(set__last_updated=self.last_updated)
+
+    def ensure_pages(self, ref_nos, linker=None):
+        existing_ref_nos = set(self.page_records(ref_nos, only=['ref_no']).scalar('ref_no'))
+        new_pages = [
+            self.page_collection(document_id=self.id, ref_no=ref_no, sort_key=page_sort_key(ref_no))
+            for ref_no in ref_nos if ref_no not in existing_ref_nos
+        ]
+        if new_pages:
+            self.page_collection.objects.insert(new_pages, load_bulk=False)
+            self.touch()
+
+            if linker:
+                for new_page in new_pages:
+                    linker.add_page(Page(ref_no=new_page.ref_no))
+
+    def save_page(self, page, do_linking=True):
+        if self.pages:
+            self.migrate_pages()
+
+        self.page_collection.objects(document_id=self.id, ref_no=page.ref_no).update_one(
+            upsert=True,
+            set__sort_key=page_sort_key(page.ref_no),
+            set__instance=page.instance,
+            set__label=page.label,
+            set__kvp=page.kvp,
+            set__files=page.files
+        )
+        self.touch()
+        if do_linking:
+            page._do_linking(content_type=self.content_type, content_uri=self.uri)
+
+    def save_page_file(self, page_ref_no, file, do_linking=True, linker=None):
+        if self.pages:
+            self.migrate_pages()
+
+        self.page_collection.objects(document_id=self.id, ref_no=page_ref_no).update_one(
+            upsert=True,
+            set_on_insert__sort_key=page_sort_key(page_ref_no),
+            **{'set__files__{0}'.format(file.key): file}
+        )
+        self.touch()
+        if linker:
+            linker.add_file(page_ref_no, file)
+        elif do_linking:
+            linker = PageLinker(self.content_type, self.uri)
+            linker.add_file(page_ref_no, file)
+            linker.flush()
+
+    def save_page_files(self, page_files, linker=None):
+        """
+        Save many page files with a single bulk write to the page collection.
+
+        Args:
+            page_files (list): (page ref_no, File) tuples to save.
+            linker (PageLinker): Optional linker to queue the files' Neo4J nodes with. If omitted, the files are
+                linked once the write completes.
+        """
+
+        if self.pages:
+            self.migrate_pages()
+
+        if page_files:
+            self.page_collection._get_collection().bulk_write([UpdateOne(
+                {'document_id': self.id, 'ref_no': ref_no},
+                {
+                    '$setOnInsert': {'sort_key': page_sort_key(ref_no)},
+                    '$set': {'files.{0}'.format(file.key): file.to_mongo()}
+                },
+                upsert=True
+            ) for ref_no, file in page_files], ordered=False)
+            self.touch()
+
+            flush_linker = linker is None
+            if flush_linker:
+                linker = PageLinker(self.content_type, self.uri)
+            for ref_no, file in page_files:
+                linker.add_file(ref_no, file)
+            if flush_linker:
+                linker.flush()
+
+    def delete_pages(self):
+        self.page_records().delete()
+        self.touch()
+        self.unindex_pages()
+
+    def index_pages(self, ref_nos=None, chunk_size=200):
+        """
+        Index the text of this document's pages in the corpus' page index, one Elasticsearch document per page.
+
+        A page's text comes from its primary witness plain text file. Each indexed page stores a fingerprint of that
+        file (its path, size, and modification time), so only pages whose text file has changed since they were last
+        indexed are read and sent, and pages that no longer have a text file are removed. Pages are streamed to
+        Elasticsearch in bulk requests of chunk_size pages.
+
+        Args:
+            ref_nos (list): Only index these pages. Defaults to all of them.
+            chunk_size (int): How many pages to send per bulk request.
+
+        Returns:
+            dict: Counts of the pages indexed and removed, and a list of any errors.
+        """
 
-    def save_page_file(self, page_ref_no, file):
-        self.modify(**{'set__pages__{0}__files__{1}'.format(page_ref_no, file.key): file})
-        file._do_linking(content_type='_Page', content_uri="{0}/page/{1}".format(self.uri, page_ref_no))
+        es = get_connection()
+        index_name = ensure_page_index(self.corpus_id)
+        document_id = str(self.id)
+        results = {'indexed': 0, 'removed': 0, 'errors': []}
+
+        indexed_fingerprints = {}
+        for hit in scan(es, index=index_name, query={'query': {'term': {'document_id': document_id}}}, _source=['ref_no', 'fingerprint']):
+            indexed_fingerprints[hit['_source']['ref_no']] = hit['_source'].get('fingerprint')
+
+        def page_actions():
+            pages_with_text = set()
+
+            for page_record in self.page_records(ref_nos=ref_nos, only=['ref_no', 'files']).no_cache():
+                for file_key, file in page_record.files.items():
+                    if file.extension == 'txt' and file.primary_witness and os.path.exists(file.path):
+                        file_stat = os.stat(file.path)
+                        fingerprint = "{0}:{1}:{2}".format(file.path, file_stat.st_size, file_stat.st_mtime_ns)
+                        pages_with_text.add(page_record.ref_no)
+
+                        if indexed_fingerprints.get(page_record.ref_no) != fingerprint:
+                            try:
+                                with open(file.path, 'r', encoding='utf-8') as file_in:
+                                    text = file_in.read()
+                            except:
+                                results['errors'].append("Error reading file {0} for indexing document {1}:\n{2}".format(file.path, document_id, traceback.format_exc()))
+                                break
+
+                            results['indexed'] += 1
+                            yield {
+                                '_index': index_name,
+                                '_id': "{0}-{1}".format(document_id, page_record.ref_no),
+                                '_source': {
+                                    'document_id': document_id,
+                                    'ref_no': page_record.ref_no,
+                                    'sort_key': page_sort_key(page_record.ref_no),
+                                    'file_key': file_key,
+                                    'fingerprint': fingerprint,
+                                    'text': text
+                                }
+                            }
+                        break
+
+            for ref_no in indexed_fingerprints.keys():
+                if ref_no not in pages_with_text and (ref_nos is None or ref_no in ref_nos):
+                    results['removed'] += 1
+                    yield {
+                        '_op_type': 'delete',
+                        '_index': index_name,
+                        '_id': "{0}-{1}".format(document_id, ref_no)
+                    }
+
+        for ok, result in streaming_bulk(es, page_actions(), chunk_size=chunk_size, max_chunk_bytes=10 * 1024 * 1024, raise_on_error=False):
+            if not ok:
+                results['errors'].append("Error indexing pages for document {0}: {1}".format(document_id, json.dumps(result, default=str)))
+
+        return results
+
+    def unindex_pages(self, ref_nos=None):
+        query = {'bool': {'filter': [{'term': {'document_id': str(self.id)}}]}}
+        if ref_nos is not None:
+            query['bool']['filter'].append({'terms': {'ref_no': ref_nos}})
+
+        get_connection().delete_by_query(
+            index=get_page_index_name(self.corpus_id),
+            query=query,
+            ignore_unavailable=True,
+            conflicts='proceed'
+        )
+
+    def migrate_pages(self, batch_size=500):
+        """
+        Move any pages still embedded in this document's legacy "pages" field into the corpus' page collection.
+
+        Pages are upserted in batches keyed by document id and ref_no, so running this more than once is harmless.
+        Once every page has been copied, the embedded pages are unset from the document.
+
+        Args:
+            batch_size (int): How many pages to write per bulk operation.
+        """
+
+        if self.pages:
+            page_collection = self.page_collection._get_collection()
+            page_updates = []
+
+            for ref_no, page in self.pages.items():
+                page_record = page.to_mongo().to_dict()
+                page_record['ref_no'] = ref_no
+                page_record['sort_key'] = page_sort_key(ref_no)
+
+                page_updates.append(UpdateOne(
+                    {'document_id': self.id, 'ref_no': ref_no},
+                    {'$set': page_record},
+                    upsert=True
+                ))
+
+                if len(page_updates) >= batch_size:
+                    page_collection.bulk_write(page_updates, ordered=False)
+                    page_updates = []
+
+            if page_updates:
+                page_collection.bulk_write(page_updates, ordered=False)
+
+            self.update(unset__pages=1)
+            self.pages = {}
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if self.pages:
+            self.migrate_pages()
+
+    def delete(self, *args, **kwargs):
+        self.delete_pages()
+        super().delete(*args, **kwargs)
+
+    def _do_linking(self):
+        super()._do_linking()
+
+        # the outbound hasPage relationships were cleared by the parent class, so relink any stored pages
+        linker = PageLinker(self.content_type, self.uri)
+        for ref_no, page in PageNavigator(document=self):
+            linker.add_page(page)
+        linker.flush()
+
+    @classmethod
+    def get_auxiliary_collections(cls):
+        return [get_page_collection(cls._corpus.id)._get_collection_name()]
+
+    @classmethod
+    def delete_auxiliary_content(cls, content_ids):
+        get_page_collection(cls._corpus.id).objects(document_id__in=content_ids).delete()
+        get_connection().delete_by_query(
+            index=get_page_index_name(cls._corpus.id),
+            query={'terms': {'document_id': [str(content_id) for content_id in content_ids]}},
+            ignore_unavailable=True,
+            conflicts='proceed'
+        )
 
     def to_dict(self, ref_only=False):
         doc_dict = {}
 
         if not ref_only:
-            doc_dict['has_primary_text'] = self.has_primary_text
-            doc_dict['page_file_collections'] = self.page_file_collections
+            # the pages, their file collections, and whether any has a primary text are all made from one read of the
+            # document's pages
+            pages = {page_record.ref_no: page_record.to_page() for page_record in self.page_records().no_cache()}
+
+            doc_dict['has_primary_text'] = any(
+                file.extension == 'txt' and file.primary_witness for page in pages.values() for file in page.files.values()
+            )
 
-            for slug in doc_dict['page_file_collections'].keys():
-                doc_dict['page_file_collections'][slug]['page_files'] = doc_dict['page_file_collections'][slug]['page_files'].page_dict
+            if not hasattr(self, '_page_file_collections'):
+                self._page_file_collections = self.collect_page_file_collections(self.ordered_pages(page_dict=pages))
+            doc_dict['page_file_collections'] = {
+                slug: dict(pfc, page_files=pfc['page_files'].page_dict) for slug, pfc in self._page_file_collections.items()
+            }
 
         doc_dict.update(super().to_dict(ref_only))
 
+        if not ref_only:
+            doc_dict['pages'] = {ref_no: page.to_dict(self.uri) for ref_no, page in pages.items()}
+
         return doc_dict
 
     def from_dict(self, dict):
@@ -658,6 +1126,7 @@ class Document(Content):
                 if _contains(file_dict, file_fields):
                     for file_field in file_fields:
                         setattr(f, file_field, file_dict[file_field])
+                    f.iiif_path = file_dict.get('iiif_path')
 
                 p.files[file_key] = f
 
@@ -724,6 +1193,7 @@ def reset_page_extraction(corpus_id, document_id):
 
             document.files = []
             document.pages = {}
+            document.delete_pages()
 
             document.save(index_pages=True)
             corpus.save()
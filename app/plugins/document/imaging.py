@@ -0,0 +1,39 @@
+from io import BytesIO
+from PIL import Image
+
+
+def render_page_images(source, page_paths, split=False):
+    """
+    Write the page image(s) for an imported image file as quantized PNGs.
+
+    This is run in a separate worker process by import_page_images, so it only depends on Pillow.
+
+    Args:
+        source (str|bytes): The path of the imported image, or its contents (as when read out of a zip file).
+        page_paths (list): Where to save the page images: one path, or two if the image is being split into a left
+            and right page.
+        split (bool): Whether to split the image down the middle into two pages.
+
+    Returns:
+        list: The paths written.
+    """
+
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+
+    with Image.open(source) as full_image:
+        if split:
+            width, height = full_image.size
+            threshold = width / 2
+            page_images = [
+                full_image.crop((0, 0, threshold, height)),
+                full_image.crop((threshold, 0, width, height))
+            ]
+        else:
+            page_images = [full_image]
+
+        for page_image, page_path in zip(page_images, page_paths):
+            page_image = page_image.quantize(method=2)
+            page_image.save(page_path, compress_type=3)
+
+    return page_paths
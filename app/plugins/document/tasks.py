@@ -1,22 +1,23 @@
 import os
-import glob
 import json
 import traceback
+import multiprocessing
 import fitz
-import shutil
 from PIL import Image
 from copy import deepcopy
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from huey.contrib.djhuey import db_task
 from natsort import natsorted
-from elasticsearch_dsl.connections import get_connection
 from django.utils.text import slugify
 from django.conf import settings
 from manager.utilities import _contains
 from zipfile import ZipFile
 from django_drf_filepond.models import TemporaryUpload
 from corpus import get_corpus, Job, File, run_neo
-from .content import Page
+from .content import Page, PageLinker
+from .imaging import render_page_images
 
 
 REGISTRY = {
@@ -103,6 +104,18 @@ REGISTRY = {
         "module": 'plugins.document.tasks',
         "functions": ['cache_page_file_collections']
     },
+    "Migrate Document Pages": {
+        "version": "0",
+        "jobsite_type": "HUEY",
+        "track_provenance": False,
+        "create_report": True,
+        "content_type": "Corpus",
+        "configuration": {
+            "parameters": {}
+        },
+        "module": 'plugins.document.tasks',
+        "functions": ['migrate_document_pages']
+    },
 }
 
 
@@ -244,6 +257,32 @@ def import_document(corpus_id, document_json_path):
 
 
 
+@db_task(priority=2)
+def migrate_document_pages(job_id):
+    job = Job(job_id)
+    job.set_status('running')
+
+    if 'Document' in job.corpus.content_types:
+        documents = job.corpus.get_content('Document', {'__raw__': {'pages': {'$exists': True, '$ne': {}}}}, only=['id'])
+        document_ids = [document.id for document in documents]
+        num_documents = len(document_ids)
+        migrated = 0
+
+        for document_id in document_ids:
+            try:
+                document = job.corpus.get_content('Document', document_id)
+                document.migrate_pages()
+                migrated += 1
+            except:
+                job.report("Error migrating pages for document {0}:\n{1}".format(document_id, traceback.format_exc()))
+
+            job.set_status('running', percent_complete=int((migrated / num_documents) * 100))
+
+        job.report("Pages for {0} of {1} documents migrated to the page collection.".format(migrated, num_documents))
+
+    job.complete(status='complete')
+
+
 ###############################
 #   PDF PAGE EXTRACTION JOBS
 ###############################
@@ -270,11 +309,8 @@ def extract_pdf_pages(job_id):
         if split_images:
             num_pages = num_pages * 2
 
-        for page_num in range(0, num_pages):
-            ref_no = str(page_num + 1)
-            if ref_no not in job.content.pages:
-                job.content.pages[ref_no] = Page()
-                job.content.pages[ref_no].ref_no = ref_no
+        linker = PageLinker(job.content.content_type, job.content.uri)
+        job.content.ensure_pages([str(page_num + 1) for page_num in range(0, num_pages)], linker=linker)
 
         ref_no = 1
         for pdf_page in pdf_obj:
@@ -292,7 +328,8 @@ def extract_pdf_pages(job_id):
                     page_file_label,
                     str(job.id),
                     primary_witness,
-                    image=img_a
+                    image=img_a,
+                    linker=linker
                 )
 
                 img_b = img.crop((threshold, 0, pix.width, pix.height))
@@ -302,7 +339,8 @@ def extract_pdf_pages(job_id):
                     page_file_label,
                     str(job.id),
                     primary_witness,
-                    image=img_b
+                    image=img_b,
+                    linker=linker
                 )
             else:
                 process_page_file(
@@ -311,7 +349,8 @@ def extract_pdf_pages(job_id):
                     page_file_label,
                     str(job.id),
                     primary_witness,
-                    image=img
+                    image=img,
+                    linker=linker
                 )
 
             if extract_text:
@@ -341,7 +380,8 @@ def extract_pdf_pages(job_id):
                     page_file_label,
                     str(job.id),
                     primary_witness,
-                    text=" ".join(text_a)
+                    text=" ".join(text_a),
+                    linker=linker
                 )
 
                 if split_images:
@@ -351,7 +391,8 @@ def extract_pdf_pages(job_id):
                         page_file_label,
                         str(job.id),
                         primary_witness,
-                        text=" ".join(text_b)
+                        text=" ".join(text_b),
+                        linker=linker
                     )
 
             if split_images:
@@ -360,7 +401,15 @@ def extract_pdf_pages(job_id):
                 ref_no += 1
 
             job.set_status('running', percent_complete=int((ref_no / num_pages) * 100))
-        job.content.save()
+
+        linker.flush()
+        job.content.save(do_linking=False)
+
+        if extract_text:
+            index_document_pages(job.corpus_id, str(job.content.id))
+
+        if settings.IIIF_DERIVATIVES:
+            make_page_image_derivatives(job.corpus_id, str(job.content.id))
     job.complete(status='complete')
 
 
@@ -388,20 +437,20 @@ def import_page_images(job_id):
     elif images_type == 'iiif':
         import_files = json.loads(job.get_param_value('import_files_json'))
 
-    unzip_path = None
+    zip_path = None
     if images_type == 'zip' and len(import_files) == 1 and import_files[0].lower().endswith('.zip') and os.path.exists(import_files[0]):
-        unzip_dir_name = "{job_id}_unzipped_image_import".format(job_id=job_id)
-        unzip_path = os.path.dirname(import_files[0]) + '/' + unzip_dir_name
-
-        if os.path.exists(unzip_path):
-            shutil.rmtree(unzip_path)
-
-        with ZipFile(import_files[0], 'r') as zip_in:
-            zip_in.extractall(unzip_path)
-
-        if os.path.exists(unzip_path):
-            import_files = glob.glob(unzip_path + '/**/*.*', recursive=True)
-            import_files = [img for img in import_files if os.path.splitext(img)[1].replace('.', '').lower() in settings.VALID_IMAGE_EXTENSIONS]
+        # images are streamed out of the zip file as they're needed rather than extracted up front
+        zip_path = import_files[0]
+        with ZipFile(zip_path, 'r') as zip_in:
+            import_files = [
+                member.filename for member in zip_in.infolist()
+                if not member.is_dir()
+                and not member.filename.startswith('__MACOSX/')
+                and not os.path.basename(member.filename).startswith('.')
+                and os.path.splitext(member.filename)[1].replace('.', '').lower() in settings.VALID_IMAGE_EXTENSIONS
+            ]
+    elif images_type in ['file', 'zip']:
+        import_files = [import_file for import_file in import_files if os.path.exists(import_file)]
 
     if import_files:
         if primary_witness:
@@ -412,62 +461,17 @@ def import_page_images(job_id):
         if split_images:
             num_pages = num_pages * 2
 
-        for page_num in range(0, num_pages):
-            ref_no = str(page_num + 1)
-            if ref_no not in job.content.pages:
-                job.content.pages[ref_no] = Page()
-                job.content.pages[ref_no].ref_no = ref_no
+        linker = PageLinker(job.content.content_type, job.content.uri)
+        job.content.ensure_pages([str(page_num + 1) for page_num in range(0, num_pages)], linker=linker)
 
         if images_type in ['file', 'zip']:
-            import_files = natsorted(import_files)
+            import_image_files(job, natsorted(import_files), zip_path, split_images, primary_witness, page_file_label, num_pages, linker)
 
-        ref_no = 1
-
-        for import_file in import_files:
-            if images_type in ['file', 'zip']:
-                if os.path.exists(import_file):
-                    full_image = Image.open(import_file)
-
-                    if split_images:
-                        width, height = full_image.size
-                        threshold = width / 2
-
-                        img_a = full_image.crop((0, 0, threshold, height))
-                        process_page_file(
-                            job.content,
-                            str(ref_no),
-                            page_file_label,
-                            str(job.id),
-                            primary_witness,
-                            image=img_a,
-                            prov_type="Page Image Import Job"
-                        )
-
-                        img_b = full_image.crop((threshold, 0, width, height))
-                        process_page_file(
-                            job.content,
-                            str(ref_no + 1),
-                            page_file_label,
-                            str(job.id),
-                            primary_witness,
-                            image=img_b,
-                            prov_type="Page Image Import Job"
-                        )
+        elif images_type == 'iiif':
+            File.prefetch_iiif_info(import_files)
+            ref_no = 1
 
-                    else:
-                        process_page_file(
-                            job.content,
-                            str(ref_no),
-                            page_file_label,
-                            str(job.id),
-                            primary_witness,
-                            image=full_image,
-                            prov_type="Page Image Import Job"
-                        )
-
-                    os.remove(import_file)
-
-            elif images_type == 'iiif':
+            for import_file in import_files:
                 iiif_file = File.process(
                     import_file,
                     desc="IIIF Image",
@@ -488,7 +492,7 @@ def import_page_images(job_id):
                             'h': iiif_file.height
                         }
                         iiif_file.width = threshold
-                        job.content.pages[str(ref_no)].files[iiif_file.key] = iiif_file
+                        job.content.save_page_file(str(ref_no), iiif_file, linker=linker)
 
                         iiif_file_b = File()
                         iiif_file_b.path = iiif_file.path
@@ -509,34 +513,139 @@ def import_page_images(job_id):
                             'h': iiif_file_b.height
                         }
                         iiif_file_b.width = original_width - threshold
-                        job.content.pages[str(ref_no + 1)].files[iiif_file_b.key] = iiif_file_b
+                        job.content.save_page_file(str(ref_no + 1), iiif_file_b, linker=linker)
 
                     else:
-                        job.content.pages[str(ref_no)].files[iiif_file.key] = iiif_file
+                        job.content.save_page_file(str(ref_no), iiif_file, linker=linker)
 
-            job.set_status('running', percent_complete=int((ref_no / num_pages) * 100))
-            ref_no += 1
-            if split_images:
+                job.set_status('running', percent_complete=int((ref_no / num_pages) * 100))
                 ref_no += 1
+                if split_images:
+                    ref_no += 1
 
-        job.content.save()
+        linker.flush()
+        job.content.save(do_linking=False)
 
-    if unzip_path and os.path.exists(unzip_path):
-        shutil.rmtree(unzip_path)
+        if settings.IIIF_DERIVATIVES:
+            make_page_image_derivatives(job.corpus_id, str(job.content.id))
 
     job.complete(status='complete')
 
 
+def import_image_files(job, import_files, zip_path, split_images, primary_witness, page_file_label, num_pages, linker):
+    """
+    Turn uploaded image files (or the images inside an uploaded zip file) into page images for a document.
+
+    Images are decoded, split, quantized and saved by a pool of worker processes while this process reads source
+    images and saves page records. Results are taken in the order images were submitted (the natural sort order of
+    their file names, which determines their page ref_nos), and page files are saved in bulk batches.
+    """
+
+    doc = job.content
+    num_workers = settings.PAGE_IMPORT_WORKERS
+    max_in_flight = num_workers * 4
+    batch_size = 100
+    pending = deque()
+    page_files = []
+    pages_done = 0
+
+    def collect():
+        nonlocal page_files, pages_done
+
+        import_file, ref_nos, rendering = pending.popleft()
+        try:
+            for ref_no, page_path in zip(ref_nos, rendering.result()):
+                page_files.append((ref_no, File.process(
+                    page_path,
+                    desc="PNG Image",
+                    prov_type="Page Image Import Job",
+                    prov_id=str(job.id),
+                    primary=primary_witness
+                )))
+            if not zip_path:
+                os.remove(import_file)
+        except:
+            print("Error importing page image {0} for document {1}:".format(import_file, doc.id))
+            print(traceback.format_exc())
+
+        pages_done += len(ref_nos)
+        if len(page_files) >= batch_size or not pending:
+            doc.save_page_files(page_files, linker=linker)
+            page_files = []
+            job.set_status('running', percent_complete=int((pages_done / num_pages) * 100))
+
+    zip_in = ZipFile(zip_path, 'r') if zip_path else None
+    try:
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            ref_no = 1
+            for import_file in import_files:
+                ref_nos = [str(ref_no), str(ref_no + 1)] if split_images else [str(ref_no)]
+                ref_no += len(ref_nos)
+
+                page_paths = [make_page_file_path(doc, page_ref_no, page_file_label, 'png') for page_ref_no in ref_nos]
+                source = zip_in.read(import_file) if zip_in else import_file
+                pending.append((import_file, ref_nos, executor.submit(render_page_images, source, page_paths, split_images)))
+
+                # only read ahead a bounded number of images so that large zip files aren't held in memory
+                while len(pending) >= max_in_flight:
+                    collect()
+
+            while pending:
+                collect()
+    finally:
+        if zip_in:
+            zip_in.close()
+
+
+@db_task(priority=3)
+def make_page_image_derivatives(corpus_id, document_id, ref_nos=None):
+    corpus = get_corpus(corpus_id)
+    doc = corpus.get_content('Document', document_id)
+    linker = PageLinker(doc.content_type, doc.uri)
+
+    for page_record in doc.page_records(ref_nos=ref_nos, only=['ref_no', 'files']).no_cache():
+        for file_key, file in page_record.files.items():
+            if file.is_image and not file.iiif_path:
+                try:
+                    if file.make_iiif_derivative():
+                        page_record.update(**{'set__files__{0}__iiif_path'.format(file_key): file.iiif_path})
+                        linker.add_file(page_record.ref_no, file)
+                except:
+                    print("Error making IIIF derivative for {0}:".format(file.path))
+                    print(traceback.format_exc())
+
+    linker.flush()
+
+
 def unset_primary(doc, file_type):
-    page_keys = list(doc.pages.keys())
-    for page_key in page_keys:
-        file_keys = list(doc.pages[page_key].files.keys())
-        for file_key in file_keys:
-            if doc.pages[page_key].files[file_key].primary_witness and file_type.lower() in doc.pages[page_key].files[file_key].description.lower():
-                doc.pages[page_key].files[file_key].primary_witness = False
+    for page_record in doc.page_records(only=['ref_no', 'files']).no_cache():
+        for file_key, file in page_record.files.items():
+            if file.primary_witness and file_type.lower() in file.description.lower():
+                page_record.update(**{'set__files__{0}__primary_witness'.format(file_key): False})
+
+
+def make_page_file_path(doc, ref_no, label, extension):
+    page_path = Page(ref_no=ref_no)._make_path(doc.path)
+    path = "{page_path}/{file_label}_{ref_no}.{extension}".format(
+        page_path=page_path,
+        file_label=label,
+        ref_no=ref_no,
+        extension=extension
+    )
+    label_version = 1
+    while os.path.exists(path):
+        label += str(label_version)
+        label_version += 1
+        path = "{page_path}/{file_label}_{ref_no}.{extension}".format(
+            page_path=page_path,
+            file_label=label,
+            ref_no=ref_no,
+            extension=extension
+        )
+    return path
 
 
-def process_page_file(doc, ref_no, label, job_id, primary_witness, image=None, text=None, prov_type="PDF Page Extraction Job"):
+def process_page_file(doc, ref_no, label, job_id, primary_witness, image=None, text=None, prov_type="PDF Page Extraction Job", linker=None):
     extension = None
     description = None
 
@@ -548,23 +657,7 @@ def process_page_file(doc, ref_no, label, job_id, primary_witness, image=None, t
         description = "Plain Text"
 
     if extension and description:
-        page_path = doc.pages[ref_no]._make_path(doc.path)
-        path = "{page_path}/{file_label}_{ref_no}.{extension}".format(
-            page_path=page_path,
-            file_label=label,
-            ref_no=ref_no,
-            extension=extension
-        )
-        label_version = 1
-        while os.path.exists(path):
-            label += str(label_version)
-            label_version += 1
-            path = "{page_path}/{file_label}_{ref_no}.{extension}".format(
-                page_path=page_path,
-                file_label=label,
-                ref_no=ref_no,
-                extension=extension
-            )
+        path = make_page_file_path(doc, ref_no, label, extension)
 
         if image:
             image = image.quantize(method=2)
@@ -580,36 +673,16 @@ def process_page_file(doc, ref_no, label, job_id, primary_witness, image=None, t
             prov_id=job_id,
             primary=primary_witness
         )
-        doc.pages[ref_no].files[file_obj.key] = file_obj
+        doc.save_page_file(ref_no, file_obj, do_linking=False, linker=linker)
 
 
 @db_task(priority=0)
-def index_document_pages(corpus_id, document_id, pages={}):
-    body = { 'pages': [] }
-    ref_nos = natsorted(list(pages.keys()))
-    for ref_no in ref_nos:
-        for file in pages[ref_no]['files']:
-            if file['extension'] == 'txt' and file['primary_witness'] and os.path.exists(file['path']):
-                contents = ""
-
-                try:
-                    with open(file['path'], 'r', encoding='utf-8') as file_in:
-                        contents = file_in.read()
-                except:
-                    print("Error reading file {0} for indexing document {1}:".format(file['path'], document_id))
-                    print(traceback.format_exc())
-
-                body['pages'].append({
-                    'ref_no': ref_no,
-                    'contents': contents
-                })
-
-    get_connection().update(
-        index='corpus-{0}-documents'.format(corpus_id),
-        id=document_id,
-        body={ 'doc': body },
-    )
-    # TODO: trigger upstream indexing of document if it belongs to a CorpusSet; use to_dict() to pass to task
+def index_document_pages(corpus_id, document_id, ref_nos=None):
+    corpus = get_corpus(corpus_id)
+    doc = corpus.get_content('Document', document_id)
+    results = doc.index_pages(ref_nos=ref_nos)
+    if results['errors']:
+        print("\n\n".join(results['errors']))
 
 
 @db_task(priority=0)
@@ -10,7 +10,7 @@ from .content import PageSet
 from manager.utilities import _get_context, get_scholar_corpus, _contains, _clean, scholar_has_privilege
 from manager.tasks import run_job
 from manager.views import view_content
-from natsort import natsorted
+from corpus.provenance import get_completed_task, delete_provenance
 from rest_framework.decorators import api_view
 from bs4 import BeautifulSoup
 from django_drf_filepond.models import TemporaryUpload
@@ -191,11 +191,11 @@ def document(request, corpus_id, document_id):
                 # HANDLE JOB RETRIES
                 elif _contains(request.POST, ['retry-job-id']):
                     retry_job_id = _clean(request.POST, 'retry-job-id')
-                    for completed_task in document.provenance:
-                        if completed_task.job_id == retry_job_id:
-                            job = Job.setup_retry_for_completed_task(corpus_id, 'Document', document_id, completed_task)
-                            document.modify(pull__provenance=completed_task)
-                            run_job(job.id)
+                    completed_task = get_completed_task(corpus, 'Document', document_id, retry_job_id)
+                    if completed_task:
+                        job = Job.setup_retry_for_completed_task(corpus, response['scholar'], 'Document', document_id, completed_task)
+                        delete_provenance(corpus, 'Document', [document_id], retry_job_id)
+                        run_job(job.id)
 
                 # HANDLE PAGE SET CREATION
                 elif _contains(request.POST, ['pageset-name', 'pageset-start', 'pageset-end']):
@@ -205,8 +205,8 @@ def document(request, corpus_id, document_id):
                     ps_end = _clean(request.POST, 'pageset-end')
 
                     if ps_key not in document.page_sets:
-                        if ps_start in document.pages and ps_end in document.pages:
-                            page_ref_nos = natsorted(document.pages.keys())
+                        if document.has_page(ps_start) and document.has_page(ps_end):
+                            page_ref_nos = document.page_ref_nos()
                             ps = PageSet()
                             ps.label = ps_label
                             start_found = False
@@ -218,6 +218,7 @@ def document(request, corpus_id, document_id):
                                     if ref_no == ps_end:
                                         break
                             document.modify(**{'set__page_sets__{0}'.format(ps_key): ps})
+                            document.touch()
                             response['messages'].append(f"Page set {ps_label} successfully created.")
                         else:
                             response['errors'].append("Start and end pages must be existing page numbers!")
@@ -474,9 +475,10 @@ def transcribe(request, corpus_id, document_id, project_id, ref_no=None):
 
                     # handle image rotation if necessary
                     if new_image_rotation is not None:
-                        if ref_no in document.pages:
-                            if image_file['key'] in document.pages[ref_no].files:
-                                modified_file = document.pages[ref_no].files[image_file['key']]
+                        page = document.get_page(ref_no)
+                        if page:
+                            if image_file['key'] in page.files:
+                                modified_file = page.files[image_file['key']]
                                 if modified_file.iiif_info:
                                     modified_file.iiif_info['fixed_rotation'] = new_image_rotation
                                     document.save_page_file(ref_no, modified_file)
@@ -555,8 +557,8 @@ def draw_page_regions(request, corpus_id, document_id, ref_no):
         page_regions = []
         ocr_file = request.GET.get('ocrfile', None)
 
-        if document and ref_no in document.pages:
-            page = document.pages[ref_no]
+        if document:
+            page = document.get_page(ref_no)
             if page:
                 if ocr_file and os.path.exists(ocr_file):
                     if ocr_file.lower().endswith('.json'):
@@ -619,8 +621,8 @@ def api_page_region_content(request, corpus_id, document_id, ref_no, x, y, width
         content = ""
         ocr_file = request.GET.get('ocrfile', None)
 
-        if document and ref_no in document.pages:
-            page = document.pages[ref_no]
+        if document:
+            page = document.get_page(ref_no)
             if page:
                 if ocr_file and os.path.exists(ocr_file):
                     if ocr_file.lower().endswith('.json'):
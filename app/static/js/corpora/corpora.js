@@ -104,11 +104,14 @@ class Corpora {
         )
     }
 
-    get_corpus(id, callback, include_views=false) {
+    get_corpus(id, callback, include_views=false, include_provenance=false) {
         let params = {}
         if (include_views) {
             params['include-views'] = true
         }
+        if (include_provenance) {
+            params['include-provenance'] = true
+        }
 
         this.make_request(
             `/api/corpus/${id}/`,
@@ -246,11 +249,11 @@ class Corpora {
         )
     }
 
-    get_content(corpus_id, content_type, content_id, callback) {
+    get_content(corpus_id, content_type, content_id, callback, include_provenance=false) {
         return this.make_request(
             `/api/corpus/${corpus_id}/${content_type}/${content_id}/`,
             "GET",
-            {},
+            include_provenance ? {'include-provenance': true} : {},
             callback
         )
     }
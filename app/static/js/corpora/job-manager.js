@@ -524,7 +524,7 @@ class JobManager {
                                     )
                                 })
                             }
-                        })
+                        }, true)
                     }
                     stale_job_div.remove()
 